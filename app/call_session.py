@@ -0,0 +1,685 @@
+import asyncio
+import base64
+import itertools
+import json
+import os
+import random
+import time
+from typing import Iterator, Optional
+
+import websockets
+from fastapi import WebSocket, WebSocketDisconnect
+
+from app.reply_stream import ReplyStream
+from app.speculation import Speculation
+from services.analytics import get_analytics
+from services.conversation_memory import estimate_tokens
+from services.model_router import CANNED
+from services.streaming_stt import PARTIAL, StreamingSTTSession
+from services.tts_cache import ACKNOWLEDGEMENT_PHRASES
+from services.twilio_service import GREETING
+from utils.audio import FRAME_BYTES, FRAME_MS, MULAW_SILENCE, SAMPLE_RATE, comfort_noise, wav_seconds
+from utils.executor import get_audio_executor
+from utils.metrics import metrics
+from utils.recording import CallRecorder
+from utils.ring_buffer import AudioRingBuffer
+from utils.stt_upload import get_stt_upload
+from utils.vad import SPEECH_PAUSE, SPEECH_START, UTTERANCE, VoiceActivityDetector
+
+# Looped under filler clips while a slow reply is prepared
+COMFORT_NOISE = comfort_noise(1.0, float(os.getenv("FILLER_NOISE_DBFS", "-60")))
+# Recent turns needed before the expected reply latency is trusted; until then fillers are armed
+FILLER_MIN_SAMPLES = 5
+
+
+class CallSession:
+    """Per-call media pipeline split into receiver, processor and sender tasks.
+
+    The receiver only reads Twilio events, decodes audio into a fixed-size ring
+    buffer and runs VAD over it, so frames keep flowing while a reply is
+    generated. Complete utterances, as ranges into the ring, go to the
+    processor through a bounded queue; when it is full the oldest pending
+    utterance is dropped rather than stalling the socket. Outbound mu-law
+    audio is queued for the sender, which slices it into 20 ms frames, paces
+    them at real-time rate and follows each reply with a Twilio `mark` so we
+    learn when playback actually finished.
+
+    When replies are expected to be slow, a turn whose reply has produced no
+    audio shortly after the caller stopped talking gets a cached
+    acknowledgement clip followed by comfort noise, so the caller does not
+    hear dead air. The filler stops as soon as reply audio is queued.
+
+    If the caller starts talking while a reply is generating or playing, the
+    turn is cancelled (aborting in-flight LLM and TTS requests), Twilio's
+    buffered audio is cleared and the conversation history is cut back to
+    what the caller actually heard.
+    """
+
+    def __init__(self, websocket: WebSocket, call_sid: str, openai_service, elevenlabs_service,
+                 recorder: Optional[CallRecorder] = None):
+        self.websocket = websocket
+        self.call_sid = call_sid
+        self.openai_service = openai_service
+        self.elevenlabs_service = elevenlabs_service
+        self.stream_sid: Optional[str] = None
+        # Inbound events and turn latencies go to the call's recording, when it is recorded
+        self.recorder = recorder
+
+        # Bounded per-call inbound audio; utterances are zero-copy views into it
+        self.audio = AudioRingBuffer(int(float(os.getenv("AUDIO_BUFFER_SECONDS", "30")) * SAMPLE_RATE))
+        self.vad = VoiceActivityDetector()
+        # Utterance-sized encoding runs on the worker pool; per-frame decoding and VAD stay inline
+        self.audio_executor = get_audio_executor()
+        # Trims silence, skips noise-only utterances and picks the upload format for batch STT
+        self.stt_upload = get_stt_upload()
+
+        self.utterances: asyncio.Queue = asyncio.Queue(maxsize=int(os.getenv("UTTERANCE_QUEUE_SIZE", "4")))
+        self.outbound: asyncio.Queue = asyncio.Queue(maxsize=int(os.getenv("OUTBOUND_QUEUE_SIZE", "8")))
+        self.dropped_utterances = 0
+
+        # Stream LLM tokens into sentence-chunked TTS instead of waiting for each stage
+        self.streaming = os.getenv("STREAMING_RESPONSES", "true").lower() != "false"
+        self.turn_count = 0
+        self.first_audio_latencies: list = []
+        # Start the LLM on a partial transcript when the caller pauses mid-utterance
+        self.speculative = self.streaming and os.getenv("SPECULATIVE_RESPONSES", "false").lower() == "true"
+        self.speculation: Optional[Speculation] = None
+
+        # Realtime STT: audio is pushed as it arrives and each utterance is committed at end of speech,
+        # so only the tail is left to transcribe; falls back to batch uploads if the stream fails
+        self.streaming_stt = os.getenv("STREAMING_STT", "false").lower() == "true"
+        self.stt: Optional[StreamingSTTSession] = None
+        self.stt_task: Optional[asyncio.Task] = None
+        self.stt_finals: asyncio.Queue = asyncio.Queue()
+        self.stt_chunk_bytes = int(os.getenv("STT_CHUNK_MS", "100")) // FRAME_MS * FRAME_BYTES
+        self.stt_final_timeout = float(os.getenv("STT_FINAL_TIMEOUT", "5"))
+        self.partial_transcript = ""
+        self._stt_sent = 0
+        self._stt_commits = 0
+        self._stt_skip = 0
+        self._stt_wake = asyncio.Event()
+
+        # Outbound pacing: frames may run `playback_lead` ahead of real time
+        self.frame_seconds = FRAME_MS / 1000
+        self.playback_lead = int(os.getenv("PLAYBACK_LEAD_MS", "100")) / 1000
+        self._next_frame_at: Optional[float] = None
+        self._last_frame_at: Optional[float] = None
+        # End of the caller speech the next reply frame answers, for the first-frame latency
+        self._awaiting_first_frame: Optional[float] = None
+        # Same, for the first frame the caller hears at all, filler included (perceived latency)
+        self._awaiting_audible_frame: Optional[float] = None
+        # mark name -> (time the last frame before it was sent, end of caller speech)
+        self.pending_marks: dict = {}
+        self.playback_latencies: list = []
+
+        # Barge-in state: the reply being spoken and when each of its chunks started playing
+        self.processor_task: Optional[asyncio.Task] = None
+        self.sender_task: Optional[asyncio.Task] = None
+        self.turn_task: Optional[asyncio.Task] = None
+        self.greeting_task: Optional[asyncio.Task] = None
+        self.stream_greeting = os.getenv("STREAM_GREETING", "true").lower() != "false"
+        self.replying = False
+        self.current_reply: Optional[ReplyStream] = None
+        self.reply_chunks: list = []
+        self.reply_chunk_bytes: list = []
+        self.chunk_started_at: dict = {}
+        self.barge_in_enabled = os.getenv("BARGE_IN_ENABLED", "true").lower() != "false"
+        self.barge_ins = 0
+        self.tts_chars_wasted = 0
+        self.tts_chars_saved = 0
+
+        # Filler audio for slow turns: armed when the expected reply latency exceeds the threshold,
+        # started after `filler_delay` without reply audio
+        self.fillers_enabled = os.getenv("FILLER_AUDIO", "true").lower() != "false"
+        self.filler_threshold = int(os.getenv("FILLER_THRESHOLD_MS", "1000")) / 1000
+        self.filler_delay = int(os.getenv("FILLER_DELAY_MS", "300")) / 1000
+        self.filler: Optional[Iterator[bytes]] = None
+        self._filler_timer: Optional[asyncio.TimerHandle] = None
+        self._last_acknowledgement: Optional[str] = None
+        self.fillers_played = 0
+        self.perceived_latencies: list = []
+        self._filler_heard_after: Optional[float] = None
+
+        # Transcript, stage timings and usage of the latest turn, handed to analytics when the next
+        # turn starts or the call ends, once its first frame and any barge-in are known
+        self.analytics = get_analytics()
+        self.started_at = time.time()
+        self.turn_record: Optional[dict] = None
+        self.usage = {"prompt_tokens": 0, "completion_tokens": 0, "llm_cost": 0.0, "tts_chars": 0, "stt_seconds": 0.0}
+
+    async def run(self):
+        """Run the call until Twilio sends `stop` or the socket disconnects"""
+        self.processor_task = asyncio.create_task(self.process_loop(), name=f"process-{self.call_sid}")
+        self.sender_task = asyncio.create_task(self.send_loop(), name=f"send-{self.call_sid}")
+        if self.streaming_stt:
+            self.stt_task = asyncio.create_task(self.transcribe_loop(), name=f"stt-{self.call_sid}")
+        metrics.increment("calls")
+        try:
+            await self.receive_loop()
+        finally:
+            if self.speculation:
+                self.speculation.cancel()
+            tasks = [task for task in (self.processor_task, self.sender_task, self.greeting_task, self.stt_task)
+                     if task]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.finish_turn()
+
+    def finish_turn(self):
+        """Add the latest turn to the call's usage and hand it to analytics"""
+        record, self.turn_record = self.turn_record, None
+        if record is None:
+            return
+        for key in self.usage:
+            self.usage[key] += record.get(key) or 0
+        if self.analytics:
+            self.analytics.record_turn(record)
+
+    def call_record(self) -> dict:
+        """The call's analytics row, without the metadata the session store holds"""
+        return {"call_sid": self.call_sid, "started_at": self.started_at, "ended_at": time.time(),
+                "turns": self.turn_count, "barge_ins": self.barge_ins, **self.usage}
+
+    async def receive_loop(self):
+        try:
+            while True:
+                data = await self.websocket.receive_text()
+                message = json.loads(data)
+                event = message.get("event")
+                if self.recorder:
+                    self.recorder.inbound(message)
+
+                if event == "media":
+                    if not self.stream_sid:
+                        self.stream_sid = message.get("streamSid")
+                    await self.handle_media(message["media"]["payload"])
+
+                elif event == "start":
+                    # Call started
+                    self.stream_sid = message.get("streamSid") or message.get("start", {}).get("streamSid")
+                    print(f"Call {self.call_sid} started")
+                    if self.stream_greeting:
+                        self.greeting_task = asyncio.create_task(self.play_greeting())
+
+                elif event == "mark":
+                    self.handle_mark(message.get("mark", {}).get("name"))
+
+                elif event == "stop":
+                    # Call ended
+                    print(f"Call {self.call_sid} ended")
+                    break
+        except WebSocketDisconnect:
+            print(f"WebSocket disconnected for call {self.call_sid}")
+
+    async def handle_media(self, audio_payload: str):
+        """Run an inbound frame through VAD, handling barge-in and completed utterances"""
+        with metrics.span("frame_ingest"):
+            self.audio.write_base64(audio_payload)
+            events = self.vad.feed(self.audio.view(self.vad.position, self.audio.write_position))
+        if self.streaming_stt and self.audio.write_position - self._stt_sent >= self.stt_chunk_bytes:
+            self._stt_wake.set()
+        for event, utterance in events:
+            if event == SPEECH_START and self.barge_in_enabled and self.agent_speaking():
+                await self.barge_in()
+            elif event == SPEECH_PAUSE and self.speculative:
+                self.speculate(utterance)
+            elif event == UTTERANCE:
+                if self.streaming_stt:
+                    self._stt_commits += 1
+                    self._stt_wake.set()
+                self.enqueue_utterance(utterance)
+
+    def speculate(self, span: tuple):
+        """Start a reply on the speech so far, replacing any older speculation"""
+        if self.speculation:
+            self.speculation.discard()
+        start, end = span
+        if self.streaming_stt and self.partial_transcript:
+            # The realtime STT partial is already the transcript so far
+            self.speculation = Speculation(self.openai_service, self.elevenlabs_service, self.call_sid,
+                                           start, transcript=self.partial_transcript)
+        else:
+            self.speculation = Speculation(self.openai_service, self.elevenlabs_service, self.call_sid,
+                                           start, audio=self.audio.view(start, end).tobytes(),
+                                           threshold_db=self.vad.speech_threshold_db())
+
+    async def transcribe_loop(self):
+        """Push inbound audio from the ring buffer to the realtime STT connection as it arrives"""
+        self.stt = await self.elevenlabs_service.open_transcription_stream()
+        if not self.stt:
+            self.fall_back_to_batch_stt("could not connect")
+            return
+        reader = asyncio.create_task(self.read_transcripts())
+        try:
+            while True:
+                await self._stt_wake.wait()
+                self._stt_wake.clear()
+                end = self.audio.write_position
+                start = max(self._stt_sent, self.audio.oldest_position)
+                commits, self._stt_commits = self._stt_commits, 0
+                await self.stt.send_audio(self.audio.view(start, end), commit=commits > 0)
+                for _ in range(commits - 1):
+                    await self.stt.send_audio(b"", commit=True)
+                self._stt_sent = end
+        except websockets.WebSocketException as e:
+            self.fall_back_to_batch_stt(str(e))
+        finally:
+            reader.cancel()
+            await asyncio.gather(reader, return_exceptions=True)
+            await self.stt.close()
+
+    async def read_transcripts(self):
+        try:
+            async for kind, text in self.stt.transcripts():
+                if kind == PARTIAL:
+                    self.partial_transcript = text
+                else:
+                    self.partial_transcript = ""
+                    self.stt_finals.put_nowait(text)
+        except websockets.WebSocketException as e:
+            self.fall_back_to_batch_stt(str(e))
+        else:
+            self.fall_back_to_batch_stt("connection closed")
+
+    def fall_back_to_batch_stt(self, reason: str):
+        if self.streaming_stt:
+            print(f"⚠️ Call {self.call_sid}: streaming STT unavailable ({reason}), using batch uploads")
+            # Wake a turn waiting on a final that will never come
+            self.stt_finals.put_nowait(None)
+        self.streaming_stt = False
+        # Nothing feeds the realtime socket any more: stop transcribe_loop so it closes it.
+        # When the loop itself falls back it is already on its way out
+        if self.stt_task and self.stt_task is not asyncio.current_task():
+            self.stt_task.cancel()
+
+    async def final_transcript(self) -> Optional[str]:
+        """Committed transcript of the next utterance, or None if the stream stalled or failed"""
+        try:
+            while True:
+                text = await asyncio.wait_for(self.stt_finals.get(), self.stt_final_timeout)
+                if text is None or not self._stt_skip:
+                    return text
+                # Belongs to an utterance that was dropped from the queue
+                self._stt_skip -= 1
+        except asyncio.TimeoutError:
+            self.fall_back_to_batch_stt("final transcript timed out")
+            return None
+
+    async def play_greeting(self):
+        """Queue the greeting, normally straight from the warmed TTS cache"""
+        audio = await self.elevenlabs_service.text_to_speech(GREETING, self.call_sid)
+        if audio:
+            await self.queue_audio(audio)
+        else:
+            print(f"⚠️ Call {self.call_sid}: greeting audio unavailable")
+
+    def agent_speaking(self) -> bool:
+        """True while a reply is being generated or its audio is still playing"""
+        return self.replying or self.agent_audio_playing()
+
+    def agent_audio_playing(self) -> bool:
+        """True while frames already sent to Twilio are still due to play"""
+        now = asyncio.get_event_loop().time()
+        return self._next_frame_at is not None and self._next_frame_at > now
+
+    def spoken_text(self) -> str:
+        """Estimate how much of the current reply has been played, from the pacing clock"""
+        now = asyncio.get_event_loop().time()
+        spoken = []
+        for index, chunk in enumerate(self.reply_chunks):
+            started = self.chunk_started_at.get(index)
+            if started is None or index >= len(self.reply_chunk_bytes):
+                break
+            duration = self.reply_chunk_bytes[index] / SAMPLE_RATE
+            played = now - started
+            if played >= duration:
+                spoken.append(chunk)
+                continue
+            words = chunk.split()
+            spoken.append(" ".join(words[:int(len(words) * max(0.0, played) / duration)]))
+            break
+        return " ".join(part for part in spoken if part)
+
+    async def barge_in(self):
+        """Stop the agent mid-reply because the caller started talking"""
+        spoken = self.spoken_text()
+        dispatched = sum(len(chunk) for chunk in self.reply_chunks)
+        pending = len(self.current_reply.chunker.buffer.strip()) if self.current_reply else 0
+        # Only chunks of the turn in progress; a fallback apology or a turn not yet replying has none
+        replied = bool(self.reply_chunks or pending)
+        if self.turn_record and replied:
+            self.turn_record.update(assistant_text=spoken, interrupted=True)
+
+        # Abort in-flight LLM / TTS requests and drop queued audio
+        tasks = [task for task in (self.turn_task, self.greeting_task, self.sender_task) if task and not task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.stop_filler()
+        while not self.outbound.empty():
+            self.outbound.get_nowait()
+
+        # Flush whatever Twilio has buffered but not played yet
+        await self.websocket.send_text(json.dumps({"event": "clear", "streamSid": self.stream_sid}))
+        self._next_frame_at = None
+        self._awaiting_first_frame = None
+        self._awaiting_audible_frame = None
+        self.pending_marks.clear()
+        self.sender_task = asyncio.create_task(self.send_loop(), name=f"send-{self.call_sid}")
+
+        if replied:
+            self.openai_service.truncate_response(self.call_sid, spoken)
+        self.barge_ins += 1
+        self.tts_chars_wasted += max(0, dispatched - len(spoken))
+        self.tts_chars_saved += pending
+        metrics.increment("barge_ins")
+        metrics.increment("tts_chars_wasted", max(0, dispatched - len(spoken)))
+        metrics.increment("tts_chars_saved", pending)
+        print(f"✋ Call {self.call_sid}: barge-in, {len(spoken)}/{dispatched} synthesized characters heard, "
+              f"{pending} characters never sent to TTS")
+        self.replying = False
+        self.reset_reply()
+
+    def reset_reply(self):
+        """Forget the previous reply's chunks, so barge-in only sees what this turn has sent"""
+        self.current_reply = None
+        self.reply_chunks = []
+        self.reply_chunk_bytes = []
+        self.chunk_started_at = {}
+
+    def handle_mark(self, name: Optional[str]):
+        """Twilio echoes a mark once all audio sent before it has been played"""
+        if name not in self.pending_marks:
+            return
+        last_frame_at, ended_at = self.pending_marks.pop(name)
+        now = asyncio.get_event_loop().time()
+        self.playback_latencies.append(now - ended_at)
+        metrics.observe("playback", now - ended_at)
+        print(f"🔈 Call {self.call_sid} {name}: playback finished {(now - last_frame_at) * 1000:.0f} ms "
+              f"after the last frame, {now - ended_at:.2f} s after end of speech")
+
+    def enqueue_utterance(self, span: tuple):
+        """Queue an utterance without blocking, dropping the oldest one when full"""
+        if self.utterances.full():
+            self.utterances.get_nowait()
+            if self.streaming_stt:
+                self._stt_skip += 1
+            self.dropped_utterances += 1
+            metrics.increment("dropped_utterances")
+            print(f"⚠️ Call {self.call_sid}: processing behind, dropped oldest utterance "
+                  f"({self.dropped_utterances} total)")
+        self.utterances.put_nowait((span, asyncio.get_event_loop().time()))
+
+    async def process_loop(self):
+        while True:
+            span, ended_at = await self.utterances.get()
+            metrics.observe("endpoint_queue", asyncio.get_event_loop().time() - ended_at)
+            # Each turn runs as its own task so barge-in can cancel it alone
+            self.turn_task = asyncio.create_task(self.process_utterance(span, ended_at))
+            try:
+                await self.turn_task
+            except asyncio.CancelledError:
+                if asyncio.current_task().cancelling():
+                    raise
+            except Exception as e:
+                print(f"Error processing utterance for call {self.call_sid}: {e}")
+            finally:
+                self.turn_task = None
+
+    async def process_utterance(self, span: tuple, ended_at: float):
+        start, end = span
+        self.reset_reply()
+        text = await self.final_transcript() if self.streaming_stt else None
+        stt_seconds = (end - start) / SAMPLE_RATE
+        if text is None:
+            if not self.audio.holds(start):
+                print(f"⚠️ Call {self.call_sid}: utterance overwritten before processing, "
+                      f"raise AUDIO_BUFFER_SECONDS")
+                return
+
+            # Trim and encode from the ring buffer, on the audio worker pool for long utterances
+            upload = await self.audio_executor.run(self.stt_upload.prepare, self.audio.view(start, end),
+                                                   self.vad.speech_threshold_db())
+            if upload is None:
+                metrics.increment("stt_skipped_utterances")
+                print(f"🔇 Call {self.call_sid}: utterance is only noise, not sent to STT")
+                text = ""
+                stt_seconds = 0.0
+            else:
+                # Convert speech to text
+                stt_seconds = wav_seconds(upload)
+                text = await self.elevenlabs_service.speech_to_text(upload, self.call_sid)
+                if text is None:
+                    # STT failed: apologize from the cache rather than leave the caller in silence
+                    audio = await self.elevenlabs_service.fallback_audio()
+                    self.reset_reply()
+                    if audio:
+                        await self.queue_audio(audio)
+
+        speculation = self.speculation if self.speculation and self.speculation.start == start else None
+        if speculation:
+            self.speculation = None
+            if text and speculation.matches(start, text):
+                saved = speculation.commit()
+                print(f"🔮 Call {self.call_sid}: speculative reply committed, {saved * 1000:.0f} ms of LLM time saved")
+            else:
+                speculation.discard()
+                # The real reply's request must not queue behind the discarded completion
+                await speculation.aclose()
+                speculation = None
+        if not text or not text.strip():
+            return
+
+        self.turn_count += 1
+        metrics.increment("turns")
+        self.finish_turn()
+        loop = asyncio.get_event_loop()
+        # Wall-clock time of the end of speech; `stt` runs from there until the transcript was ready
+        record = self.turn_record = {
+            "call_sid": self.call_sid, "turn": self.turn_count, "started_at": time.time() - (loop.time() - ended_at),
+            "user_text": text, "interrupted": False, "speculative": speculation is not None,
+            "stt": loop.time() - ended_at, "stt_seconds": stt_seconds,
+            "prompt_tokens": self.openai_service.prompt_tokens(text, self.call_sid),
+        }
+        chunks: list = []
+        self.replying = True
+        self._awaiting_first_frame = ended_at
+        self._awaiting_audible_frame = ended_at
+        try:
+            await self.arm_filler(ended_at)
+            if self.streaming:
+                reply = ReplyStream(self.openai_service, self.elevenlabs_service, self.call_sid, self.queue_audio)
+                self.current_reply = reply
+                self.reply_chunks = chunks = reply.chunks
+                self.reply_chunk_bytes = reply.chunk_audio_bytes
+                if speculation:
+                    # The caller's turn enters the history now; barge-in trims the reply as usual
+                    self.openai_service.add_user_message(text, self.call_sid)
+                    await reply.run(text, tokens=speculation.stream())
+                    self.openai_service.add_assistant_message(speculation.reply_text(), self.call_sid)
+                else:
+                    await reply.run(text)
+                first_audio_at = reply.first_audio_at
+                if reply.first_token_at is not None:
+                    record["llm_first_token"] = reply.first_token_at - reply.started_at
+            else:
+                # Get response from OpenAI
+                requested_at = loop.time()
+                response = await self.openai_service.get_response(text, self.call_sid)
+                record["llm_first_token"] = loop.time() - requested_at
+                self.reply_chunks = chunks = [response]
+
+                # Convert response to speech
+                audio_response = await self.elevenlabs_service.text_to_speech(response, self.call_sid, fallback=True)
+                self.reply_chunk_bytes = [len(audio_response)]
+                first_audio_at = asyncio.get_event_loop().time() if audio_response else None
+                if audio_response:
+                    await self.queue_audio(audio_response, 0)
+        finally:
+            self.replying = False
+            self.stop_filler()
+            if speculation:
+                speculation.cancel()
+            # Barge-in has already put in what the caller heard
+            generated = " ".join(chunk.strip() for chunk in chunks)
+            record.setdefault("assistant_text", generated)
+            route = self.openai_service.reply_route(self.call_sid)
+            record["route"] = route.name if route else None
+            record["completion_tokens"] = estimate_tokens(generated)
+            record["tts_chars"] = sum(len(chunk) for chunk in chunks)
+            if record["route"] == CANNED:
+                # Answered without the LLM
+                record["prompt_tokens"] = record["completion_tokens"] = 0
+            if route:
+                # At the route's own prices, so small-model turns are not charged as full-model ones
+                record["llm_cost"] = route.cost(record["prompt_tokens"], record["completion_tokens"])
+
+        if first_audio_at is not None:
+            await self.queue_mark(f"turn-{self.turn_count}", ended_at)
+            latency = first_audio_at - ended_at
+            record["first_audio"] = latency
+            self.first_audio_latencies.append(latency)
+            metrics.observe("first_audio", latency)
+            print(f"⏱️ Call {self.call_sid} turn {self.turn_count}: first audio byte "
+                  f"{latency * 1000:.0f} ms after end of speech")
+
+    async def queue_audio(self, audio: bytes, chunk_index: Optional[int] = None):
+        # Waits here if the sender is behind
+        await self.outbound.put(("audio", (audio, chunk_index)))
+
+    async def queue_mark(self, name: str, ended_at: float):
+        await self.outbound.put(("mark", (name, ended_at)))
+
+    def expected_latency(self) -> Optional[float]:
+        """Recent median from end of speech to the first reply audio, across this worker's calls"""
+        histogram = metrics.histograms["first_audio"]
+        if histogram.count < FILLER_MIN_SAMPLES:
+            return None
+        return histogram.quantiles((0.5,))[0.5]
+
+    async def arm_filler(self, ended_at: float):
+        """Schedule filler audio for this turn if replies have lately been slower than the threshold"""
+        if not self.fillers_enabled:
+            return
+        expected = self.expected_latency()
+        if expected is not None and expected < self.filler_threshold:
+            return
+        # Only clips already in the TTS cache; synthesizing one would take as long as the reply
+        phrases = [phrase for phrase in ACKNOWLEDGEMENT_PHRASES if phrase != self._last_acknowledgement]
+        phrase = random.choice(phrases) if phrases else None
+        clip = await self.elevenlabs_service.cached_speech(phrase) if phrase else None
+        delay = max(0.0, ended_at + self.filler_delay - asyncio.get_event_loop().time())
+        self._filler_timer = asyncio.get_event_loop().call_later(delay, self.start_filler, phrase, clip)
+
+    def start_filler(self, phrase: Optional[str], clip: Optional[bytes]):
+        self._filler_timer = None
+        # Reply audio already started, or something else (a fallback apology) is queued or playing
+        if self._awaiting_first_frame is None or not self.outbound.empty() or self.agent_audio_playing():
+            return
+        if clip:
+            self._last_acknowledgement = phrase
+            clip = clip + MULAW_SILENCE * (-len(clip) % FRAME_BYTES)
+        noise = itertools.cycle(COMFORT_NOISE[offset:offset + FRAME_BYTES]
+                                for offset in range(0, len(COMFORT_NOISE), FRAME_BYTES))
+        clip_frames = (clip[offset:offset + FRAME_BYTES] for offset in range(0, len(clip or b""), FRAME_BYTES))
+        self.filler = itertools.chain(clip_frames, noise)
+        self.fillers_played += 1
+        metrics.increment("fillers", kind="clip" if clip else "noise")
+        self.outbound.put_nowait(("filler", None))
+
+    def stop_filler(self):
+        if self._filler_timer:
+            self._filler_timer.cancel()
+            self._filler_timer = None
+        self.filler = None
+
+    async def play_filler(self):
+        """Send filler frames until reply audio is queued, then cut the filler short"""
+        filler = self.filler
+        sent = False
+        while filler is not None and self.filler is filler and self.outbound.empty():
+            await self.send_frame(next(filler), filler=True)
+            sent = True
+        self.filler = None
+        if sent and self.agent_audio_playing():
+            # Drop the filler Twilio has buffered so the reply starts right away
+            await self.websocket.send_text(json.dumps({"event": "clear", "streamSid": self.stream_sid}))
+            self._next_frame_at = None
+
+    async def send_loop(self):
+        remainder = b""
+        while True:
+            kind, item = await self.outbound.get()
+            if kind == "filler":
+                await self.play_filler()
+                continue
+            if kind == "mark":
+                if remainder:
+                    # Pad the last partial frame with silence
+                    await self.send_frame(remainder.ljust(FRAME_BYTES, MULAW_SILENCE))
+                    remainder = b""
+                await self.send_mark(*item)
+                continue
+
+            audio, chunk_index = item
+            data = remainder + audio if remainder else audio
+            whole = len(data) - len(data) % FRAME_BYTES
+            remainder = data[whole:]
+            for offset in range(0, whole, FRAME_BYTES):
+                await self.send_frame(data[offset:offset + FRAME_BYTES])
+                if chunk_index is not None and chunk_index not in self.chunk_started_at:
+                    # Scheduled playback time of the chunk's first frame
+                    self.chunk_started_at[chunk_index] = self._next_frame_at - self.frame_seconds
+
+    async def send_frame(self, frame: bytes, filler: bool = False):
+        """Send one 20 ms frame, waiting so playback never runs far ahead of real time"""
+        loop = asyncio.get_event_loop()
+        now = loop.time()
+        if self._next_frame_at is None or self._next_frame_at < now - self.frame_seconds:
+            # Idle or fell behind: restart the clock instead of bursting to catch up
+            self._next_frame_at = now
+        delay = self._next_frame_at - self.playback_lead - now
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self._next_frame_at += self.frame_seconds
+
+        media_message = {
+            "event": "media",
+            "streamSid": self.stream_sid,
+            "media": {
+                "payload": base64.b64encode(frame).decode("utf-8")
+            }
+        }
+        await self.websocket.send_text(json.dumps(media_message))
+        self._last_frame_at = loop.time()
+        if self._awaiting_audible_frame is not None:
+            perceived = self._last_frame_at - self._awaiting_audible_frame
+            self.perceived_latencies.append(perceived)
+            metrics.observe("perceived_first_frame", perceived)
+            if self.turn_record:
+                self.turn_record["perceived_first_frame"] = perceived
+            self._awaiting_audible_frame = None
+            self._filler_heard_after = perceived if filler else None
+        if self._awaiting_first_frame is not None and not filler:
+            latency = self._last_frame_at - self._awaiting_first_frame
+            metrics.observe("first_frame", latency)
+            if self.turn_record:
+                self.turn_record["first_frame"] = latency
+            if self.recorder:
+                self.recorder.turn(turn=self.turn_count, ended_at=self.recorder.offset(self._awaiting_first_frame),
+                                   first_frame=round(latency, 4),
+                                   perceived=round(self.perceived_latencies[-1], 4) if self.perceived_latencies else None)
+            self._awaiting_first_frame = None
+            if self._filler_heard_after is not None:
+                print(f"🫧 Call {self.call_sid}: filler heard {self._filler_heard_after * 1000:.0f} ms after end "
+                      f"of speech, reply {latency * 1000:.0f} ms")
+                self._filler_heard_after = None
+
+    async def send_mark(self, name: str, ended_at: float):
+        self.pending_marks[name] = (self._last_frame_at or asyncio.get_event_loop().time(), ended_at)
+        await self.websocket.send_text(json.dumps({
+            "event": "mark",
+            "streamSid": self.stream_sid,
+            "mark": {"name": name}
+        }))
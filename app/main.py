@@ -1,25 +1,33 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Form
+from fastapi import FastAPI, WebSocket, Form, File, Request, UploadFile
 from fastapi.responses import HTMLResponse, Response
 from fastapi.staticfiles import StaticFiles
-import json
-import base64
+from starlette.websockets import WebSocketState
 import asyncio
+import socket
 import sys
 import os
-import audioop
-import wave
-import io
-from typing import Dict, Any
+import time
+from typing import Dict, Any, Optional
 from pathlib import Path
+from urllib.parse import parse_qsl
 
 # Add parent directory to Python path so we can import services and utils
 parent_dir = Path(__file__).parent.parent
 sys.path.insert(0, str(parent_dir))
 
-from services.twilio_service import TwilioService
-from services.openai_service import OpenAIService
+from services.twilio_service import GREETING, TwilioService
+from services.openai_service import FALLBACK_RESPONSE, OpenAIService
 from services.elevenlabs_service import ElevenLabsService
+from services.analytics import close_analytics, get_analytics
+from services.dialer import CampaignDialer, numbers_from_csv, parse_numbers
+from services.http_client import close_provider_clients
+from services.session_store import close_session_store, get_session_store
+from utils.executor import get_audio_executor, shutdown_audio_executor
+from services.tts_cache import FILLER_PHRASES
 from utils.env_loader import load_env
+from utils.metrics import metrics, monitor_event_loop
+from utils.recording import current_recording, open_call_recording
+from app.call_session import CallSession
 
 load_env(override=True)
 
@@ -28,129 +36,154 @@ app = FastAPI()
 # Initialize services
 twilio_service = TwilioService()
 openai_service = OpenAIService()
-elevenlabs_service = ElevenLabsService()
+elevenlabs_service = ElevenLabsService(fallback_phrase=FALLBACK_RESPONSE)
+session_store = get_session_store()
+# Transcripts, turn timings and usage, written in batches off the event loop
+analytics = get_analytics()
+# Outbound campaigns, dialed under calls-per-second and concurrent-call caps
+dialer = CampaignDialer(twilio_service)
 
-# Store active connections and audio buffers
+# Identifies this process in call metadata when several workers share the session store
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# Live sockets and media pipelines of this worker's calls; shared state lives in the session store
 active_connections: Dict[str, WebSocket] = {}
-audio_buffers: Dict[str, list] = {}
-last_activity: Dict[str, float] = {}
+active_sessions: Dict[str, CallSession] = {}
+
+@app.on_event("startup")
+async def startup():
+    # Background event-loop lag probe, reported as a /metrics stage
+    interval = int(os.getenv("LOOP_LAG_INTERVAL_MS", "100")) / 1000
+    app.state.loop_monitor = asyncio.create_task(monitor_event_loop(interval))
+    # Spawn audio workers before the first utterance needs one
+    get_audio_executor().warm()
+    # Greeting, error fallback and fillers are synthesized once, in the background
+    app.state.cache_warmer = asyncio.create_task(
+        elevenlabs_service.warm_cache([GREETING, FALLBACK_RESPONSE, *FILLER_PHRASES]))
+
+@app.on_event("shutdown")
+async def shutdown():
+    app.state.loop_monitor.cancel()
+    app.state.cache_warmer.cancel()
+    await dialer.close()
+    # Close pooled provider connections
+    await close_provider_clients()
+    await close_session_store()
+    await close_analytics()
+    shutdown_audio_executor()
+
+async def record_call(call_sid: str, **fields):
+    """Merge call metadata into the session store; a store outage must not fail the call"""
+    try:
+        await session_store.update_call(call_sid, fields)
+    except Exception as e:
+        print(f"Session store error for call {call_sid}: {e}")
+        metrics.increment("session_store_errors", operation="update_call")
+
+async def record_call_analytics(session: CallSession):
+    """Queue the call's analytics row, with the caller details from the session store"""
+    row = session.call_record()
+    try:
+        call = await session_store.get_call(session.call_sid) or {}
+    except Exception as e:
+        print(f"Session store error for call {session.call_sid}: {e}")
+        metrics.increment("session_store_errors", operation="get_call")
+        call = {}
+    row.update({field: call.get(field) for field in ("caller", "called", "direction", "worker")})
+    analytics.record_call(row)
+
+async def twilio_form(request: Request) -> Optional[Dict[str, str]]:
+    """Fields of a Twilio webhook, or None when TWILIO_VALIDATE_SIGNATURE is on and the signature does not match.
+
+    Twilio posts urlencoded forms; parse_qsl reads them far faster than the generic form parser.
+    """
+    params = parse_qsl((await request.body()).decode("utf-8", errors="replace"), keep_blank_values=True)
+    if twilio_service.validate_signatures:
+        # Twilio signs the public URL it called, not the one this process sees behind a tunnel or proxy
+        url = f"{twilio_service.webhook_url}{request.url.path}"
+        if request.url.query:
+            url = f"{url}?{request.url.query}"
+        if not twilio_service.signature_valid(url, params, request.headers.get("X-Twilio-Signature")):
+            print(f"🚫 Rejected webhook with a bad Twilio signature: {request.url.path}")
+            metrics.increment("twilio_signature_rejected", endpoint=request.url.path)
+            return None
+    return dict(params)
 
 @app.get("/")
 async def get():
     return {"message": "RealTime Voice Agent API"}
 
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Per-stage latency histograms and call counters in Prometheus text format"""
+    metrics.set_gauge("active_calls", len(active_sessions))
+    try:
+        metrics.set_gauge("cluster_active_calls", await session_store.active_calls())
+    except Exception as e:
+        print(f"Session store error: {e}")
+        metrics.increment("session_store_errors", operation="active_calls")
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.post("/twiml")
-async def twiml_endpoint(CallSid: str = Form(...), From: str = Form(None), To: str = Form(None)):
+async def twiml_endpoint(request: Request):
     """Handle Twilio webhook and return TwiML response"""
-    print(f"📞 Received Twilio webhook for call: {CallSid}")
-    print(f"📞 From: {From}, To: {To}")
-    
-    twiml_response = twilio_service.generate_twiml_response(CallSid)
-    print(f"📋 Generated TwiML response: {twiml_response}")
+    form = await twilio_form(request)
+    if form is None:
+        return Response(status_code=403)
+    call_sid = form.get("CallSid")
+    if not call_sid:
+        return Response(content="CallSid is required", status_code=422)
+    From, To = form.get("From"), form.get("To")
+    print(f"📞 Received Twilio webhook for call: {call_sid} (from {From}, to {To})")
+    # The media stream may connect to another worker; it finds the caller details in the store
+    await record_call(call_sid, caller=From, called=To, direction=form.get("Direction"))
     
     return Response(
-        content=twiml_response,
+        content=twilio_service.generate_twiml_response(call_sid),
         media_type="application/xml"
     )
 
 
-def convert_mulaw_to_wav(mulaw_data: bytes) -> bytes:
-    """Convert mu-law audio to WAV format"""
-    try:
-        # Convert mu-law to linear PCM
-        pcm_data = audioop.ulaw2lin(mulaw_data, 2)
-        
-        # Create WAV file in memory
-        wav_buffer = io.BytesIO()
-        with wave.open(wav_buffer, 'wb') as wav_file:
-            wav_file.setnchannels(1)  # Mono
-            wav_file.setsampwidth(2)  # 16-bit
-            wav_file.setframerate(8000)  # 8kHz sample rate
-            wav_file.writeframes(pcm_data)
-        
-        wav_buffer.seek(0)
-        return wav_buffer.read()
-    except Exception as e:
-        print(f"Error converting audio: {e}")
-        return b""
-
 @app.websocket("/ws/{call_sid}")
 async def websocket_endpoint(websocket: WebSocket, call_sid: str):
     await websocket.accept()
     active_connections[call_sid] = websocket
-    audio_buffers[call_sid] = []
-    last_activity[call_sid] = asyncio.get_event_loop().time()
+    recorder = open_call_recording(call_sid)
+    # Tasks of the call inherit this, so its provider requests land in its recording
+    recording = current_recording.set(recorder)
+    session = CallSession(websocket, call_sid, openai_service, elevenlabs_service, recorder)
+    active_sessions[call_sid] = session
+    dialer.session_started(call_sid)
+    await record_call(call_sid, worker=WORKER_ID, connected_at=time.time())
     
     try:
-        while True:
-            data = await websocket.receive_text()
-            message = json.loads(data)
-            
-            if message.get("event") == "media":
-                # Handle incoming audio data
-                audio_payload = message["media"]["payload"]
-                audio_data = base64.b64decode(audio_payload)
-                
-                # Store audio chunk in buffer
-                audio_buffers[call_sid].append(audio_data)
-                last_activity[call_sid] = asyncio.get_event_loop().time()
-                
-                # Process accumulated audio if we have enough data or after silence
-                current_time = asyncio.get_event_loop().time()
-                if (len(audio_buffers[call_sid]) >= 20 or 
-                    current_time - last_activity[call_sid] > 1.0):
-                    
-                    # Combine all audio chunks
-                    combined_audio = b"".join(audio_buffers[call_sid])
-                    audio_buffers[call_sid] = []
-                    
-                    if len(combined_audio) > 0:
-                        # Convert mu-law to WAV
-                        wav_data = convert_mulaw_to_wav(combined_audio)
-                        
-                        if wav_data:
-                            # Convert speech to text
-                            text = await elevenlabs_service.speech_to_text(wav_data)
-                            
-                            if text and text.strip():
-                                # Get response from OpenAI
-                                response = await openai_service.get_response(text, call_sid)
-                                
-                                # Convert response to speech
-                                audio_response = await elevenlabs_service.text_to_speech(response)
-                                
-                                if audio_response:
-                                    # Send audio back through WebSocket
-                                    audio_b64 = base64.b64encode(audio_response).decode("utf-8")
-                                    media_message = {
-                                        "event": "media",
-                                        "streamSid": message.get("streamSid"),
-                                        "media": {
-                                            "payload": audio_b64
-                                        }
-                                    }
-                                    await websocket.send_text(json.dumps(media_message))
-            
-            elif message.get("event") == "start":
-                # Call started
-                print(f"Call {call_sid} started")
-                
-            elif message.get("event") == "stop":
-                # Call ended
-                print(f"Call {call_sid} ended")
-                break
-                
-    except WebSocketDisconnect:
-        print(f"WebSocket disconnected for call {call_sid}")
+        await session.run()
     except Exception as e:
         print(f"Error in WebSocket: {e}")
     finally:
         if call_sid in active_connections:
             del active_connections[call_sid]
-        if call_sid in audio_buffers:
-            del audio_buffers[call_sid]
-        if call_sid in last_activity:
-            del last_activity[call_sid]
+        if call_sid in active_sessions:
+            del active_sessions[call_sid]
+        dialer.session_ended(call_sid)
+        current_recording.reset(recording)
+        if recorder:
+            await recorder.close()
+        # Twilio closes after `stop`, but do not rely on every client doing so
+        if websocket.client_state == WebSocketState.CONNECTED:
+            try:
+                await websocket.close()
+            except RuntimeError:
+                pass
+        # The call is over (stop or disconnect): release its chat history and metadata
+        await openai_service.clear_conversation(call_sid)
+        if analytics:
+            await record_call_analytics(session)
+        try:
+            await session_store.end_call(call_sid)
+        except Exception as e:
+            print(f"Session store error for call {call_sid}: {e}")
+            metrics.increment("session_store_errors", operation="end_call")
 
 @app.post("/initiate-call")
 async def initiate_call(phone_data: dict):
@@ -160,10 +193,96 @@ async def initiate_call(phone_data: dict):
     
     try:
         call_sid = await twilio_service.make_call(phone_number)
+        await record_call(call_sid, called=phone_number, direction="outbound")
         return {"success": True, "call_sid": call_sid}
     except Exception as e:
         return {"error": str(e)}
 
+@app.post("/call-status")
+async def call_status_endpoint(request: Request):
+    """Twilio status callback for dialed calls; final statuses free the call's dialer slot"""
+    form = await twilio_form(request)
+    if form is None:
+        return Response(status_code=403)
+    if not form.get("CallSid") or not form.get("CallStatus"):
+        return Response(content="CallSid and CallStatus are required", status_code=422)
+    dialer.call_status(form["CallSid"], form["CallStatus"])
+    return Response(status_code=204)
+
+def start_campaign(numbers: list, invalid: list, name: Optional[str]) -> dict:
+    if not numbers:
+        return {"error": "No valid phone numbers", "invalid": invalid[:100]}
+    campaign = dialer.submit(numbers, name)
+    return {"success": True, "campaign_id": campaign.id, "queued": len(numbers),
+            "invalid": invalid[:100], "invalid_count": len(invalid)}
+
+@app.post("/campaigns")
+async def create_campaign(campaign_data: dict):
+    """Queue an outbound campaign from {"numbers": [...], "name": optional}"""
+    numbers, invalid = parse_numbers(str(number) for number in campaign_data.get("numbers") or [])
+    return start_campaign(numbers, invalid, campaign_data.get("name"))
+
+@app.post("/campaigns/csv")
+async def create_campaign_from_csv(file: UploadFile = File(...), name: Optional[str] = Form(None)):
+    """Queue an outbound campaign from an uploaded CSV of phone numbers"""
+    text = (await file.read()).decode("utf-8-sig", errors="replace")
+    numbers, invalid = numbers_from_csv(text)
+    return start_campaign(numbers, invalid, name or file.filename)
+
+@app.get("/campaigns")
+async def list_campaigns():
+    """Dialer caps, calls in progress and progress of every campaign"""
+    return dialer.stats()
+
+@app.get("/campaigns/{campaign_id}")
+async def get_campaign(campaign_id: str):
+    campaign = dialer.campaigns.get(campaign_id)
+    if not campaign:
+        return {"error": "Campaign not found"}
+    return campaign.stats()
+
+@app.post("/campaigns/{campaign_id}/cancel")
+async def cancel_campaign(campaign_id: str):
+    """Stop dialing the campaign's queued numbers; calls already placed carry on"""
+    campaign = dialer.cancel(campaign_id)
+    if not campaign:
+        return {"error": "Campaign not found"}
+    return campaign.stats()
+
+@app.get("/analytics/slowest-turns")
+async def slowest_turns(stage: str = "first_frame", limit: int = 20, since: float = 0.0):
+    """Slowest turns by a latency stage, with their transcripts; `since` is a Unix time"""
+    if not analytics:
+        return {"error": "Analytics are disabled (ANALYTICS_STORE=none)"}
+    try:
+        return {"stage": stage, "turns": await analytics.slowest_turns(stage, min(limit, 1000), since)}
+    except ValueError as e:
+        return {"error": str(e)}
+
+@app.get("/analytics/calls")
+async def call_costs(limit: int = 50, since: float = 0.0, order: str = "recent"):
+    """Calls with their usage and cost, most recent (`order=recent`) or most expensive (`order=cost`) first"""
+    if not analytics:
+        return {"error": "Analytics are disabled (ANALYTICS_STORE=none)"}
+    try:
+        return {"calls": await analytics.call_costs(min(limit, 1000), since, order)}
+    except ValueError as e:
+        return {"error": str(e)}
+
+@app.get("/analytics/calls/{call_sid}")
+async def call_analytics(call_sid: str):
+    """One call's usage, cost and transcript with per-turn stage timings"""
+    if not analytics:
+        return {"error": "Analytics are disabled (ANALYTICS_STORE=none)"}
+    call = await analytics.call(call_sid)
+    if not call:
+        return {"error": "Call not found"}
+    return call
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # Several workers need SESSION_STORE=redis to share call state; each call's media stream stays on one worker
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    if workers > 1 and os.getenv("SESSION_STORE", "memory").lower() == "memory":
+        print("⚠️ WEB_CONCURRENCY > 1 with SESSION_STORE=memory: workers will not share call state")
+    uvicorn.run("app.main:app" if workers > 1 else app, host="0.0.0.0", port=8000, workers=workers)
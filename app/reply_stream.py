@@ -0,0 +1,100 @@
+import asyncio
+from contextlib import aclosing
+from typing import AsyncIterator, Awaitable, Callable, List, Optional
+
+from utils.text_chunker import SentenceChunker
+
+
+class ReplyStream:
+    """One streamed assistant turn: LLM tokens -> sentence chunks -> concurrent TTS -> ordered playback.
+
+    Each chunk is synthesized as soon as the chunker releases it, while the
+    LLM keeps generating; audio is forwarded to `emit` strictly in chunk order
+    so sentences never overlap, together with the chunk index. Timestamps are
+    event-loop times.
+    """
+
+    def __init__(self, openai_service, elevenlabs_service, call_sid: str,
+                 emit: Callable[[bytes, int], Awaitable[None]]):
+        self.openai_service = openai_service
+        self.elevenlabs_service = elevenlabs_service
+        self.call_sid = call_sid
+        self.emit = emit
+
+        self.chunker = SentenceChunker()
+        self.chunks: List[str] = []
+        self.chunk_audio_bytes: List[int] = []
+        self.started_at: Optional[float] = None
+        self.first_token_at: Optional[float] = None
+        self.first_audio_at: Optional[float] = None
+        self.completed_at: Optional[float] = None
+
+        self._playback_order: asyncio.Queue = asyncio.Queue()
+        self._tts_tasks: List[asyncio.Task] = []
+        # A chunk whose synthesis failed is replaced by the cached fallback phrase, once per reply
+        self.fallback_played = False
+
+    async def run(self, text: str, tokens: Optional[AsyncIterator[str]] = None):
+        """Speak the reply to `text`, from a fresh completion or an already running token stream"""
+        loop = asyncio.get_event_loop()
+        self.started_at = loop.time()
+        if tokens is None:
+            tokens = self.openai_service.stream_response(text, self.call_sid)
+        player = asyncio.create_task(self._playback())
+        try:
+            # aclosing() releases the completion stream promptly if the turn is cancelled
+            async with aclosing(tokens) as tokens:
+                async for token in tokens:
+                    if self.first_token_at is None:
+                        self.first_token_at = loop.time()
+                    for chunk in self.chunker.push(token):
+                        self._dispatch(chunk)
+
+            tail = self.chunker.flush()
+            if tail:
+                self._dispatch(tail)
+            self._playback_order.put_nowait(None)
+            await player
+            self.completed_at = loop.time()
+        finally:
+            for task in self._tts_tasks + [player]:
+                if not task.done():
+                    task.cancel()
+
+    def _dispatch(self, chunk: str):
+        """Start TTS for a chunk right away and queue its audio for in-order playback"""
+        audio_queue: asyncio.Queue = asyncio.Queue()
+        index = len(self.chunks)
+        self.chunks.append(chunk)
+        self.chunk_audio_bytes.append(0)
+        self._tts_tasks.append(asyncio.create_task(self._synthesize(index, chunk, audio_queue)))
+        self._playback_order.put_nowait((index, audio_queue))
+
+    async def _synthesize(self, index: int, chunk: str, audio_queue: asyncio.Queue):
+        try:
+            async with aclosing(self.elevenlabs_service.stream_text_to_speech(chunk, self.call_sid)) as audio_chunks:
+                async for audio in audio_chunks:
+                    self.chunk_audio_bytes[index] += len(audio)
+                    audio_queue.put_nowait(audio)
+            if not self.chunk_audio_bytes[index] and not self.fallback_played:
+                self.fallback_played = True
+                audio = await self.elevenlabs_service.fallback_audio()
+                if audio:
+                    self.chunk_audio_bytes[index] = len(audio)
+                    audio_queue.put_nowait(audio)
+        finally:
+            audio_queue.put_nowait(None)
+
+    async def _playback(self):
+        while True:
+            entry = await self._playback_order.get()
+            if entry is None:
+                return
+            index, audio_queue = entry
+            while True:
+                audio = await audio_queue.get()
+                if audio is None:
+                    break
+                if self.first_audio_at is None:
+                    self.first_audio_at = asyncio.get_event_loop().time()
+                await self.emit(audio, index)
@@ -0,0 +1,122 @@
+import asyncio
+import re
+from contextlib import aclosing
+from typing import AsyncIterator, List, Optional
+
+from utils.executor import get_audio_executor
+from utils.metrics import metrics
+from utils.stt_upload import get_stt_upload
+
+WORDS = re.compile(r"[\w']+")
+
+
+def normalize_transcript(text: str) -> List[str]:
+    """Lowercase words without punctuation, so "Okay." and "okay" compare equal"""
+    return WORDS.findall(text.lower())
+
+
+class Speculation:
+    """A reply started on a partial transcript while the caller may still be talking.
+
+    When the VAD reports a short pause, the speech so far is transcribed (or
+    the realtime STT partial is taken as is) and an LLM completion is
+    streamed for it without touching the call history. Once
+    the final transcript of the utterance arrives the caller either commits
+    the speculation, replaying the buffered tokens and following the rest of
+    the stream, or discards it. Timestamps are event-loop times.
+    """
+
+    def __init__(self, openai_service, elevenlabs_service, call_sid: str, start: int,
+                 audio: Optional[bytes] = None, transcript: Optional[str] = None, threshold_db: float = -42.0):
+        self.openai_service = openai_service
+        self.elevenlabs_service = elevenlabs_service
+        self.call_sid = call_sid
+        # Ring-buffer offset where the utterance began
+        self.start = start
+
+        # Batch-transcribed from the mu-law `audio` (trimmed at the call's speech `threshold_db`),
+        # unless a streaming STT partial is passed in
+        self.transcript = transcript
+        self.tokens: List[str] = []
+        self.started_at = asyncio.get_event_loop().time()
+        self.first_token_at: Optional[float] = None
+        self._stream: Optional[AsyncIterator[str]] = None
+
+        self._changed = asyncio.Event()
+        self.task = asyncio.create_task(self._run(audio, threshold_db))
+        metrics.increment("speculations")
+
+    async def _run(self, audio: Optional[bytes], threshold_db: float):
+        try:
+            if self.transcript is None:
+                upload = await get_audio_executor().run(get_stt_upload().prepare, audio, threshold_db)
+                if upload is None:
+                    return
+                self.transcript = await self.elevenlabs_service.speech_to_text(upload, self.call_sid)
+            if not self.transcript or not self.transcript.strip():
+                return
+            self._changed.set()
+            self._stream = self.openai_service.stream_response(self.transcript, self.call_sid, record=False)
+            async with aclosing(self._stream) as tokens:
+                async for token in tokens:
+                    if self.first_token_at is None:
+                        self.first_token_at = asyncio.get_event_loop().time()
+                    self.tokens.append(token)
+                    self._changed.set()
+        finally:
+            self._changed.set()
+
+    def matches(self, start: int, transcript: str) -> bool:
+        """Whether the final transcript of the utterance at `start` is what was speculated on"""
+        return (start == self.start and self.transcript is not None
+                and normalize_transcript(self.transcript) == normalize_transcript(transcript))
+
+    def commit(self) -> float:
+        """Record a hit and return the LLM time saved, in seconds"""
+        now = asyncio.get_event_loop().time()
+        # The first token arrives this much earlier than a request started now would deliver it
+        saved = min(now, self.first_token_at or now) - self.started_at
+        metrics.increment("speculation_hits")
+        metrics.observe("speculation_saved", saved)
+        self._update_hit_ratio()
+        return saved
+
+    def discard(self):
+        """Cancel the speculation and count what it cost; `aclose` waits for its completion to close"""
+        self.task.cancel()
+        if self.transcript:
+            wasted = len(self.tokens) + self.openai_service.prompt_tokens(self.transcript, self.call_sid)
+            metrics.increment("speculation_wasted_tokens", wasted)
+        metrics.increment("speculation_misses")
+        self._update_hit_ratio()
+
+    def cancel(self):
+        self.task.cancel()
+
+    async def aclose(self):
+        """Cancel the speculation and close its completion stream, freeing the provider slot it holds"""
+        self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+        if self._stream is not None:
+            await self._stream.aclose()
+
+    def reply_text(self) -> str:
+        return "".join(self.tokens)
+
+    async def stream(self) -> AsyncIterator[str]:
+        """Replay the buffered tokens, then follow the completion until it ends"""
+        index = 0
+        while True:
+            while index < len(self.tokens):
+                yield self.tokens[index]
+                index += 1
+            if self.task.done():
+                return
+            self._changed.clear()
+            await self._changed.wait()
+
+    @staticmethod
+    def _update_hit_ratio():
+        hits = metrics.counters.get(("speculation_hits", ()), 0)
+        misses = metrics.counters.get(("speculation_misses", ()), 0)
+        metrics.set_gauge("speculation_hit_ratio", hits / (hits + misses))
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""Event loop cost of persisting call analytics: a write per turn on the loop vs the batching writer.
+
+Turn rows for --calls calls of --turns turns each are recorded at --rate
+rows per second while a probe measures event loop lag every 10 ms, as the
+media pipeline would see it. In `inline` mode each row is inserted and
+committed on the event loop. In `batched` mode rows go through
+`AnalyticsWriter`, which writes them in batches on its own thread. The
+report shows the time each record call holds the loop and the loop lag,
+then times the analytics queries against the filled database.
+
+    python -m benchmarks.bench_analytics --calls 2000 --turns 10 --rate 2000
+"""
+import argparse
+import asyncio
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks.load_test import percentile
+from services.analytics import AnalyticsWriter, SQLiteAnalyticsStore, prices
+
+MODES = ("inline", "batched")
+
+
+def turn_rows(calls: int, turns: int, seed: int = 1):
+    rng = random.Random(seed)
+    now = time.time()
+    for call in range(calls):
+        for turn in range(1, turns + 1):
+            first_audio = rng.lognormvariate(-0.4, 0.4)
+            yield {"call_sid": f"CABENCH{call:08d}", "turn": turn, "started_at": now + call + turn * 10,
+                   "user_text": "Can you tell me when my order is expected to arrive at my address?",
+                   "assistant_text": "Your order should arrive on Thursday, before noon. "
+                                     "I can text you the tracking link if you like.",
+                   "interrupted": rng.random() < 0.1, "speculative": False, "stt": rng.uniform(0.2, 0.6),
+                   "llm_first_token": rng.uniform(0.2, 0.8), "first_audio": first_audio,
+                   "first_frame": first_audio + 0.01, "perceived_first_frame": first_audio + 0.01,
+                   "prompt_tokens": 300 + 40 * turn, "completion_tokens": 25, "tts_chars": 96, "stt_seconds": 3.2}
+
+
+def call_row(call: int, turns: int) -> dict:
+    return {"call_sid": f"CABENCH{call:08d}", "started_at": time.time() + call, "ended_at": time.time() + call + 60,
+            "caller": f"+1415555{call % 10000:04d}", "called": "+15550000000", "direction": "inbound",
+            "turns": turns, "barge_ins": 1, "prompt_tokens": turns * 500, "completion_tokens": turns * 25,
+            "tts_chars": turns * 96, "stt_seconds": turns * 3.2}
+
+
+async def probe_lag(lags: List[float], stop: asyncio.Event):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + 0.01
+        await asyncio.sleep(0.01)
+        lags.append(max(0.0, loop.time() - expected))
+
+
+async def run(mode: str, path: str, args) -> dict:
+    store = SQLiteAnalyticsStore(path)
+    writer = AnalyticsWriter(store, 1.0, 200, 10 ** 7)
+    lags: List[float] = []
+    holds: List[float] = []
+    stop = asyncio.Event()
+    probe = asyncio.create_task(probe_lag(lags, stop))
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    for index, row in enumerate(turn_rows(args.calls, args.turns)):
+        await asyncio.sleep(max(0.0, started + index / args.rate - loop.time()))
+        began = time.perf_counter()
+        if mode == "inline":
+            store.write([], [row])
+        else:
+            writer.record_turn(row)
+        if row["turn"] == args.turns:
+            call = call_row(int(row["call_sid"][7:]), args.turns)
+            if mode == "inline":
+                store.write([call], [])
+            else:
+                writer.record_call(call)
+        holds.append(time.perf_counter() - began)
+    elapsed = loop.time() - started
+    await writer.query(lambda: None)
+    stop.set()
+    await probe
+
+    queries = {}
+    for name, query in (("slowest 20 turns", lambda: writer.slowest_turns("first_frame", 20)),
+                        ("20 most recent calls with cost", lambda: writer.call_costs(20)),
+                        ("20 most expensive calls", lambda: writer.call_costs(20, order="cost")),
+                        ("one call's transcript", lambda: writer.call(f"CABENCH{args.calls // 2:08d}"))):
+        began = time.perf_counter()
+        for _ in range(args.query_repeats):
+            await query()
+        queries[name] = (time.perf_counter() - began) / args.query_repeats
+    await writer.close()
+    return {"holds": holds, "lags": lags, "elapsed": elapsed, "queries": queries}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--turns", type=int, default=10, help="Turns per call")
+    parser.add_argument("--rate", type=float, default=2000.0, help="Turn rows recorded per second")
+    parser.add_argument("--query-repeats", type=int, default=20)
+    parser.add_argument("--db-dir", default=None, help="Directory for the databases (default: a temporary one)")
+    args = parser.parse_args()
+
+    rows = []
+    with tempfile.TemporaryDirectory(dir=args.db_dir) as directory:
+        for mode in args.modes:
+            rows.append((mode, asyncio.run(run(mode, str(Path(directory) / f"{mode}.db"), args))))
+
+    print(f"\n{args.calls * args.turns} turn rows and {args.calls} call rows at {args.rate:g} rows/s; "
+          f"prices {prices()}")
+    print(f"{'mode':<8} {'rows/s':>8} {'hold p50 us':>11} {'hold p99 us':>11} {'hold max ms':>11} "
+          f"{'lag p99 ms':>10} {'lag max ms':>10}")
+    for mode, result in rows:
+        holds, lags = result["holds"], result["lags"]
+        print(f"{mode:<8} {len(holds) / result['elapsed']:>8.0f} {percentile(holds, 0.5) * 1e6:>11.1f} "
+              f"{percentile(holds, 0.99) * 1e6:>11.1f} {max(holds) * 1000:>11.2f} "
+              f"{percentile(lags, 0.99) * 1000:>10.2f} {max(lags) * 1000:>10.2f}")
+    for mode, result in rows:
+        print(f"{mode} queries: " + ", ".join(f"{name} {seconds * 1000:.2f} ms"
+                                              for name, seconds in result["queries"].items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""Micro-benchmarks for utils.audio against the audioop/wave path on synthetic call audio.
+
+Audio is processed in per-utterance chunks (4 s by default), the way the call
+pipeline sees it.
+
+    python -m benchmarks.bench_audio --minutes 60
+"""
+import argparse
+import io
+import sys
+import time
+import wave
+import warnings
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+with warnings.catch_warnings():
+    warnings.simplefilter("ignore", DeprecationWarning)
+    try:
+        import audioop
+    except ImportError:  # Removed in Python 3.13
+        audioop = None
+
+from benchmarks.synthetic_audio import synthesize_call, to_mulaw
+from utils import audio
+
+
+def audioop_wav(mulaw: bytes) -> bytes:
+    """The previous convert_mulaw_to_wav implementation"""
+    pcm_data = audioop.ulaw2lin(mulaw, 2)
+    wav_buffer = io.BytesIO()
+    with wave.open(wav_buffer, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(8000)
+        wav_file.writeframes(pcm_data)
+    wav_buffer.seek(0)
+    return wav_buffer.read()
+
+
+def timed(fn, chunks) -> float:
+    start = time.perf_counter()
+    for chunk in chunks:
+        fn(chunk)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--minutes", type=float, default=60.0)
+    parser.add_argument("--chunk-seconds", type=float, default=4.0)
+    args = parser.parse_args()
+
+    pcm, _ = synthesize_call(args.minutes * 60)
+    mulaw = to_mulaw(pcm)
+    step = int(args.chunk_seconds * audio.SAMPLE_RATE)
+    mulaw_chunks = [mulaw[i:i + step] for i in range(0, len(mulaw), step)]
+    pcm_chunks = [pcm[i:i + step] for i in range(0, len(pcm), step)]
+    pcm_bytes_chunks = [chunk.tobytes() for chunk in pcm_chunks]
+    pcm16k_chunks = [audio.resample(chunk, 8000, 16000) for chunk in pcm_chunks]
+
+    cases = [
+        ("mu-law decode", lambda c: audioop.ulaw2lin(c, 2), audio.mulaw_to_pcm16, mulaw_chunks, mulaw_chunks),
+        ("mu-law encode", lambda c: audioop.lin2ulaw(c, 2), audio.pcm16_to_mulaw, pcm_bytes_chunks, pcm_chunks),
+        ("mu-law -> WAV", audioop_wav, audio.mulaw_to_wav, mulaw_chunks, mulaw_chunks),
+        ("resample 8k->16k", lambda c: audioop.ratecv(c, 2, 1, 8000, 16000, None),
+         lambda c: audio.resample(c, 8000, 16000), pcm_bytes_chunks, pcm_chunks),
+        ("resample 16k->8k", lambda c: audioop.ratecv(c, 2, 1, 16000, 8000, None),
+         lambda c: audio.resample(c, 16000, 8000), [c.tobytes() for c in pcm16k_chunks], pcm16k_chunks),
+        ("resample 8k->24k", lambda c: audioop.ratecv(c, 2, 1, 8000, 24000, None),
+         lambda c: audio.resample(c, 8000, 24000), pcm_bytes_chunks, pcm_chunks),
+        ("RMS", lambda c: audioop.rms(c, 2), audio.rms, pcm_bytes_chunks, pcm_chunks),
+    ]
+
+    print(f"{args.minutes:.0f} min of 8 kHz audio in {len(mulaw_chunks)} chunks of {args.chunk_seconds:.1f} s")
+    print(f"{'operation':<18} {'audioop (ms)':>13} {'utils.audio (ms)':>17} {'speedup':>8}")
+    for name, legacy_fn, numpy_fn, legacy_input, numpy_input in cases:
+        numpy_time = timed(numpy_fn, numpy_input)
+        if audioop is None:
+            print(f"{name:<18} {'n/a':>13} {numpy_time * 1000:>17.1f} {'':>8}")
+            continue
+        legacy_time = timed(legacy_fn, legacy_input)
+        print(f"{name:<18} {legacy_time * 1000:>13.1f} {numpy_time * 1000:>17.1f} "
+              f"{legacy_time / numpy_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
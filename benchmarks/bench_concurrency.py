@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""Benchmark concurrent STT -> LLM -> TTS turns against the local provider stub.
+
+Compares the previous blocking `requests.post` implementation with the pooled
+async services. With blocking calls, turn latency grows linearly with the number
+of concurrent calls; with the async clients it should stay close to the
+single-call latency until the provider concurrency limit is reached. Turn
+latency is measured from the moment all calls submit their utterance.
+
+    python -m benchmarks.bench_concurrency --calls 1 10 30 --latency 0.2
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import requests
+
+from benchmarks.stub_providers import StubServer, create_stub_app
+
+WAV_PAYLOAD = b"RIFF" + b"\x00" * 6400
+
+
+async def legacy_turn(base_url: str, start: float) -> float:
+    """One turn using the old blocking requests calls inside coroutines"""
+    requests.post(f"{base_url}/v1/speech-to-text", files={"audio": ("audio.wav", WAV_PAYLOAD, "audio/wav")},
+                  data={"model_id": "scribe_v1"})
+    requests.post(f"{base_url}/v1/chat/completions",
+                  json={"model": "gpt-3.5-turbo", "messages": [{"role": "user", "content": "hi"}]})
+    requests.post(f"{base_url}/v1/text-to-speech/voice", json={"text": "Sure, I can help with that."})
+    return time.perf_counter() - start
+
+
+async def async_turn(elevenlabs_service, openai_service, call_sid: str, start: float) -> float:
+    """One turn through the pooled async services"""
+    text = await elevenlabs_service.speech_to_text(WAV_PAYLOAD)
+    response = await openai_service.get_response(text, call_sid)
+    await elevenlabs_service.text_to_speech(response)
+    return time.perf_counter() - start
+
+
+async def run_legacy(calls: int, base_url: str):
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(legacy_turn(base_url, start) for _ in range(calls)))
+    return latencies, time.perf_counter() - start
+
+
+async def run_async(calls: int):
+    from services.elevenlabs_service import ElevenLabsService
+    from services.http_client import close_provider_clients
+    from services.openai_service import OpenAIService
+
+    elevenlabs_service = ElevenLabsService()
+    openai_service = OpenAIService()
+    start = time.perf_counter()
+    try:
+        latencies = await asyncio.gather(*(
+            async_turn(elevenlabs_service, openai_service, f"bench-{i}", start) for i in range(calls)
+        ))
+    finally:
+        await close_provider_clients()
+    return latencies, time.perf_counter() - start
+
+
+def summarize(mode: str, calls: int, latencies, wall: float):
+    ordered = sorted(latencies)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    print(f"{mode:<8} {calls:>6} {statistics.mean(latencies):>10.3f} {p95:>10.3f} {wall:>10.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, nargs="+", default=[1, 10, 30])
+    parser.add_argument("--latency", type=float, default=0.2, help="Stub latency per provider request (s)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--provider-limit", type=int, default=64, help="Max in-flight requests per provider")
+    args = parser.parse_args()
+
+    server = StubServer(create_stub_app(args.latency), port=args.port).start()
+    os.environ.setdefault("ELEVENLABS_API_KEY", "stub")
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+    os.environ["ELEVENLABS_BASE_URL"] = f"{server.base_url}/v1"
+    os.environ["OPENAI_BASE_URL"] = f"{server.base_url}/v1"
+    # Every turn asks for the same reply text; measure synthesis, not cache hits
+    os.environ["TTS_CACHE_ENABLED"] = "false"
+    os.environ["ELEVENLABS_MAX_CONCURRENCY"] = str(args.provider_limit)
+    os.environ["OPENAI_MAX_CONCURRENCY"] = str(args.provider_limit)
+
+    print(f"Stub latency {args.latency:.3f}s per request, 3 requests per turn")
+    print(f"{'mode':<8} {'calls':>6} {'mean (s)':>10} {'p95 (s)':>10} {'wall (s)':>10}")
+    try:
+        for calls in args.calls:
+            summarize("legacy", calls, *asyncio.run(run_legacy(calls, server.base_url)))
+            summarize("async", calls, *asyncio.run(run_async(calls)))
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
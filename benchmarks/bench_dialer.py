@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""Outbound campaign throughput of a real `app.main` process against a local Twilio stand-in.
+
+Starts the provider stub, the Twilio REST stand-in (`benchmarks.stub_twilio`)
+and the app, queues one campaign of --numbers numbers through `POST /campaigns`
+and polls `GET /campaigns` until it finishes. Answered calls stream silence
+into the app for --talk-time, so each holds a real media session. --inbound
+simulated inbound calls run alongside; they take dialer slots too, so the
+campaign only uses what they leave free. The report checks the dials per
+second and calls in progress seen by the stand-in against the configured
+caps, and shows the app's event loop lag while dialing.
+
+    python -m benchmarks.bench_dialer --numbers 60 --cps 5 --max-concurrent 10 --inbound 3
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import httpx
+
+from benchmarks.bench_fillers import scrape_quantiles
+from benchmarks.load_test import run_step, start_servers, stop_servers, wait_until_up
+
+
+async def run_campaign(http_url: str, args) -> dict:
+    """Queue the campaign, poll until it is finished; returns its stats and the most calls the app had in progress"""
+    numbers = [f"+1555{i:07d}" for i in range(args.numbers)]
+    async with httpx.AsyncClient(base_url=http_url, timeout=10.0) as client:
+        created = (await client.post("/campaigns", json={"numbers": numbers, "name": "bench"})).json()
+        campaign_id = created["campaign_id"]
+        max_in_progress = 0
+        deadline = time.monotonic() + args.timeout
+        while time.monotonic() < deadline:
+            dialer = (await client.get("/campaigns")).json()
+            max_in_progress = max(max_in_progress, dialer["calls_in_progress"])
+            campaign = next(c for c in dialer["campaigns"] if c["campaign_id"] == campaign_id)
+            if campaign["status"] != "running":
+                break
+            await asyncio.sleep(0.25)
+    return {"campaign": campaign, "max_in_progress": max_in_progress}
+
+
+async def run(http_url: str, args) -> dict:
+    campaign = asyncio.create_task(run_campaign(http_url, args))
+    if args.inbound:
+        await run_step(http_url.replace("http", "ws", 1), args.inbound, args.inbound_turns, 0.1)
+    return await campaign
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--numbers", type=int, default=60, help="Numbers in the campaign")
+    parser.add_argument("--cps", type=float, default=5.0, help="DIALER_CALLS_PER_SECOND")
+    parser.add_argument("--max-concurrent", type=int, default=10, help="DIALER_MAX_CONCURRENT_CALLS")
+    parser.add_argument("--inbound", type=int, default=3, help="Simulated inbound calls during the campaign")
+    parser.add_argument("--inbound-turns", type=int, default=3, help="Caller turns per inbound call")
+    parser.add_argument("--answer-rate", type=float, default=0.7)
+    parser.add_argument("--busy-rate", type=float, default=0.1)
+    parser.add_argument("--ring-time", type=float, default=1.0, help="Mean seconds a dialed call rings")
+    parser.add_argument("--talk-time", type=float, default=3.0, help="Seconds an answered call stays connected")
+    parser.add_argument("--latency", type=float, default=0.3, help="Stub latency per provider request (s)")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Mean extra stub latency, exponential (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=300.0, help="Give up on the campaign after this long (s)")
+    parser.add_argument("--app-port", type=int, default=8010)
+    parser.add_argument("--stub-port", type=int, default=8765)
+    parser.add_argument("--twilio-port", type=int, default=8766)
+    parser.add_argument("--app-logs", action="store_true", help="Show the app's own log output")
+    args = parser.parse_args()
+
+    http_url = f"http://127.0.0.1:{args.app_port}"
+    twilio_url = f"http://127.0.0.1:{args.twilio_port}"
+    twilio = subprocess.Popen([
+        sys.executable, "-m", "benchmarks.stub_twilio", "--port", str(args.twilio_port),
+        "--answer-rate", str(args.answer_rate), "--busy-rate", str(args.busy_rate),
+        "--ring-time", str(args.ring_time), "--talk-time", str(args.talk_time), "--seed", "1",
+    ], cwd=str(Path(__file__).parent.parent))
+    processes = [twilio]
+    try:
+        wait_until_up(f"{twilio_url}/docs", twilio)
+        os.environ.update(TWILIO_API_BASE_URL=twilio_url, WEBHOOK_URL=http_url,
+                          WEBSOCKET_URL=http_url.replace("http", "ws", 1),
+                          DIALER_CALLS_PER_SECOND=str(args.cps), DIALER_MAX_CONCURRENT_CALLS=str(args.max_concurrent),
+                          DIALER_ANSWER_TIMEOUT=str(max(5, int(args.ring_time * 3))))
+        processes += start_servers(args)
+        result = asyncio.run(run(http_url, args))
+        seen = httpx.get(f"{twilio_url}/stats").json()
+        quantiles = scrape_quantiles(http_url)
+    finally:
+        stop_servers(processes)
+
+    campaign = result["campaign"]
+    print(f"\n{args.numbers} numbers, caps {args.cps:g} calls/s and {args.max_concurrent} concurrent, "
+          f"{args.inbound} inbound calls alongside; ring {args.ring_time:g}s, talk {args.talk_time:g}s")
+    print(f"campaign {campaign['status']} in {campaign['elapsed_seconds']:.1f}s: "
+          f"{campaign['dials_per_second']:.2f} dials/s overall; states {campaign['states']}")
+    print(f"dials in any 1s window:  {seen['max_per_second']:>3} (cap {args.cps:g})")
+    print(f"dialed calls in progress: {seen['max_in_progress']:>3} (stand-in's count)")
+    print(f"all calls in progress:    {result['max_in_progress']:>3} (app's count incl. inbound, "
+          f"cap {args.max_concurrent})")
+    print(f"stand-in outcomes {seen['outcomes']}, errors {seen['errors']}")
+    lag = lambda q: quantiles.get(("event_loop_lag", q), float("nan")) * 1000
+    print(f"app event loop lag p50 {lag(0.5):.1f} ms, p99 {lag(0.99):.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
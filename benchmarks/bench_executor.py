@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""Event-loop lag while bursts of utterances are encoded inline, on a thread pool or on a process pool.
+
+Simulates --calls callers streaming 20 ms frames in real time through the
+ring buffer and VAD, as the media-stream handler does, while every
+--interval seconds --burst of them finish a --seconds utterance at once and
+have it encoded. `wav` is the mu-law -> WAV conversion done for each batch
+STT request; `transcode` stands in for heavier work (decode, resample to
+24 kHz and back, re-encode). Reported per executor: loop lag from a 5 ms
+probe, how late frames were handled, and per-job latency.
+
+    python -m benchmarks.bench_executor --calls 100 --burst 40 --seconds 10
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks.synthetic_audio import synthesize_call, to_mulaw
+from utils.audio import FRAME_BYTES, FRAME_MS, SAMPLE_RATE, mulaw_to_pcm16, mulaw_to_wav, pcm16_to_mulaw, resample
+from utils.executor import EXECUTOR_KINDS, AudioExecutor
+from utils.ring_buffer import AudioRingBuffer
+from utils.vad import VoiceActivityDetector
+
+PROBE_INTERVAL = 0.005
+
+
+def transcode(mulaw: bytes) -> bytes:
+    """Round trip through 24 kHz PCM, like re-encoding provider audio for Twilio"""
+    pcm = resample(mulaw_to_pcm16(mulaw), SAMPLE_RATE, 24000)
+    return pcm16_to_mulaw(resample(pcm, 24000, SAMPLE_RATE))
+
+
+JOBS = {"wav": mulaw_to_wav, "transcode": transcode}
+
+
+async def probe(lags: List[float]):
+    loop = asyncio.get_running_loop()
+    while True:
+        scheduled = loop.time() + PROBE_INTERVAL
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append(max(0.0, loop.time() - scheduled))
+
+
+async def caller(ring: AudioRingBuffer, audio: bytes, offset: int, deadline: float, late: List[float]):
+    """Feed frames on a 20 ms clock, recording how late each one was handled"""
+    loop = asyncio.get_running_loop()
+    vad = VoiceActivityDetector()
+    tick = loop.time()
+    position = offset
+    while tick < deadline:
+        tick += FRAME_MS / 1000
+        await asyncio.sleep(max(0.0, tick - loop.time()))
+        late.append(max(0.0, loop.time() - tick))
+        ring.write(audio[position:position + FRAME_BYTES])
+        vad.feed(ring.view(vad.position, ring.write_position))
+        position = (position + FRAME_BYTES) % (len(audio) - FRAME_BYTES)
+
+
+async def bursts(executor: AudioExecutor, rings: List[AudioRingBuffer], job, args, deadline: float,
+                 job_times: List[float]):
+    loop = asyncio.get_running_loop()
+    span = int(args.seconds * SAMPLE_RATE)
+
+    async def encode(ring: AudioRingBuffer):
+        started = loop.time()
+        await executor.run(job, ring.view(ring.write_position - span, ring.write_position))
+        job_times.append(loop.time() - started)
+
+    while loop.time() + args.interval < deadline:
+        await asyncio.sleep(args.interval)
+        await asyncio.gather(*(encode(ring) for ring in rings[:args.burst]))
+
+
+async def run(kind: str, job, audio: bytes, args) -> Dict[str, float]:
+    executor = AudioExecutor(kind, args.workers, args.min_bytes)
+    executor.warm()
+    await asyncio.sleep(0.5 if kind == "process" else 0.0)
+    loop = asyncio.get_running_loop()
+
+    span = int(args.seconds * SAMPLE_RATE)
+    rings = []
+    for index in range(args.calls):
+        ring = AudioRingBuffer(2 * span)
+        ring.write(audio[:span])
+        rings.append(ring)
+
+    lags: List[float] = []
+    late: List[float] = []
+    job_times: List[float] = []
+    deadline = loop.time() + args.duration
+    monitor = asyncio.create_task(probe(lags))
+    try:
+        await asyncio.gather(
+            bursts(executor, rings, job, args, deadline, job_times),
+            *(caller(ring, audio, (index * 997 * FRAME_BYTES) % (len(audio) // 2), deadline, late)
+              for index, ring in enumerate(rings)))
+    finally:
+        monitor.cancel()
+        executor.shutdown()
+
+    ms = lambda values, q: float(np.quantile(values, q)) * 1000 if values else 0.0
+    return {"lag_p50": ms(lags, 0.5), "lag_p99": ms(lags, 0.99), "lag_max": ms(lags, 1.0),
+            "late_p99": ms(late, 0.99), "job_p50": ms(job_times, 0.5), "job_p99": ms(job_times, 0.99),
+            "jobs": len(job_times)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--executors", nargs="+", choices=EXECUTOR_KINDS, default=["inline", "thread", "process"])
+    parser.add_argument("--jobs", nargs="+", choices=list(JOBS), default=list(JOBS))
+    parser.add_argument("--calls", type=int, default=100, help="Callers streaming frames in real time")
+    parser.add_argument("--burst", type=int, default=40, help="Utterances ending together in each burst")
+    parser.add_argument("--seconds", type=float, default=10.0, help="Length of each utterance (s)")
+    parser.add_argument("--interval", type=float, default=0.5, help="Time between bursts (s)")
+    parser.add_argument("--duration", type=float, default=10.0, help="Run time per executor (s)")
+    parser.add_argument("--workers", type=int, default=None, help="Pool size (default: min(4, cores))")
+    parser.add_argument("--min-bytes", type=int, default=16000, help="Smaller jobs run inline")
+    args = parser.parse_args()
+
+    pcm, _ = synthesize_call(max(60.0, 2 * args.seconds))
+    audio = to_mulaw(pcm)
+    print(f"{args.calls} calls, bursts of {args.burst} x {args.seconds:g}s utterances every {args.interval:g}s")
+    print(f"{'job':>9} {'executor':>8} {'lag p50':>8} {'lag p99':>8} {'lag max':>8} {'frame late p99':>14} "
+          f"{'job p50':>8} {'job p99':>8} {'jobs':>6}   (ms)")
+    for name in args.jobs:
+        for kind in args.executors:
+            result = asyncio.run(run(kind, JOBS[name], audio, args))
+            print(f"{name:>9} {kind:>8} {result['lag_p50']:>8.2f} {result['lag_p99']:>8.2f} {result['lag_max']:>8.2f} "
+                  f"{result['late_p99']:>14.2f} {result['job_p50']:>8.2f} {result['job_p99']:>8.2f} {result['jobs']:>6}")
+
+
+if __name__ == "__main__":
+    main()
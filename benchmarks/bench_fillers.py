@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""Perceived vs true reply latency of a real `app.main` process, with and without filler audio.
+
+Starts the provider stub and the app once per mode, then runs --calls
+simulated Twilio calls of --turns turns each. Perceived latency is the end of
+the caller's speech until the caller hears anything (a filler clip, comfort
+noise or the reply); true latency is until the first reply frame. Both come
+from the app's /metrics quantiles (`perceived_first_frame`, `first_frame`),
+measured from the VAD end of speech; the simulated caller's own count, which
+also includes the VAD hangover, is shown as "caller p50".
+Filler clips are played from the TTS cache the app warms at startup, so the
+cache is on in both modes.
+
+    python -m benchmarks.bench_fillers --calls 5 --turns 4 --latency 0.5
+"""
+import argparse
+import asyncio
+import os
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import httpx
+
+from benchmarks.load_test import percentile, run_step, start_servers, stop_servers
+from benchmarks.twilio_simulator import SimulatedCall
+
+MODES = {"off": "false", "on": "true"}
+QUANTILE_LINE = re.compile(r'voice_agent_stage_latency_quantile_seconds\{stage="(\w+)",quantile="([^"]+)"\} ([\d.]+)')
+
+
+def scrape_quantiles(base_url: str) -> Dict[Tuple[str, float], float]:
+    """Recent p50/p95/p99 per stage from the app's /metrics; the app is fresh per mode"""
+    return {(stage, float(q)): float(value)
+            for stage, q, value in QUANTILE_LINE.findall(httpx.get(f"{base_url}/metrics").text)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    parser.add_argument("--calls", type=int, default=5)
+    parser.add_argument("--turns", type=int, default=4, help="Caller turns per call")
+    parser.add_argument("--latency", type=float, default=0.5, help="Stub latency per provider request (s)")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Mean extra stub latency, exponential (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--spawn-interval", type=float, default=0.2, help="Mean delay between call starts (s)")
+    parser.add_argument("--app-port", type=int, default=8010)
+    parser.add_argument("--stub-port", type=int, default=8765)
+    parser.add_argument("--app-logs", action="store_true", help="Show the app's own log output")
+    args = parser.parse_args()
+
+    http_url = f"http://127.0.0.1:{args.app_port}"
+    rows = []
+    for mode in args.modes:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            os.environ.update(FILLER_AUDIO=MODES[mode], TTS_CACHE_ENABLED="true", TTS_CACHE_DIR=cache_dir)
+            processes = start_servers(args)
+            try:
+                # Let the startup cache warm-up synthesize the acknowledgement clips
+                time.sleep(2.0)
+                sims: List[SimulatedCall] = asyncio.run(
+                    run_step(http_url.replace("http", "ws", 1), args.calls, args.turns, args.spawn_interval))
+                quantiles = scrape_quantiles(http_url)
+            finally:
+                stop_servers(processes)
+        heard = [latency for sim in sims for latency in sim.turn_latencies]
+        rows.append((mode, heard, quantiles, sum(sim.underruns for sim in sims), sum(sim.timeouts for sim in sims)))
+
+    print(f"\nStub latency {args.latency:.2f}s + {args.jitter:.2f}s mean jitter; "
+          f"{args.calls} calls x {args.turns} turns; latencies from the end of caller speech (s)")
+    print(f"{'fillers':<8} {'turns':>5} {'heard p50':>9} {'heard p95':>9} {'reply p50':>9} {'reply p95':>9} "
+          f"{'caller p50':>10} {'underruns':>9} {'timeouts':>8}")
+    for mode, heard, quantiles, underruns, timeouts in rows:
+        stage = lambda name, q: quantiles.get((name, q), float("nan"))
+        print(f"{mode:<8} {len(heard):>5} {stage('perceived_first_frame', 0.5):>9.2f} "
+              f"{stage('perceived_first_frame', 0.95):>9.2f} {stage('first_frame', 0.5):>9.2f} "
+              f"{stage('first_frame', 0.95):>9.2f} {percentile(heard, 0.5) if heard else float('nan'):>10.2f} "
+              f"{underruns:>9} {timeouts:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""Prompt tokens per turn over a long call, with unbounded and token-budgeted history.
+
+Replays a scripted caller against OpenAIService and the provider stub, one
+turn every --turn-interval seconds of simulated call time. Unbounded history
+resends every earlier turn, so prompts grow linearly with call length. The
+budgeted history keeps recent turns verbatim and folds older ones into a
+background summary.
+
+    python -m benchmarks.bench_history --minutes 30 --budget 1000
+"""
+import argparse
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks.stub_providers import StubServer, create_stub_app
+
+CALLER_LINES = [
+    "Hi, I'd like to check the status of my order from last Tuesday.",
+    "The order number is four five two nine one, under the name Jordan.",
+    "Can you tell me when it is expected to arrive at my address?",
+    "I also wanted to ask whether I can still change the delivery time.",
+    "Mornings are better for me, ideally before ten o'clock.",
+    "And is there any extra charge for choosing a specific time slot?",
+    "Okay. What happens if nobody is home when the courier arrives?",
+    "Could you also send me a text message with the tracking link?",
+]
+
+
+async def run_call(budget: int, turns: int, gap: float):
+    """Return estimated prompt tokens per turn and the number of messages kept at the end"""
+    os.environ["HISTORY_TOKEN_BUDGET"] = str(budget)
+    from services.http_client import close_provider_clients
+    from services.openai_service import OpenAIService
+    from utils.metrics import metrics
+
+    service = OpenAIService()
+    call_sid = f"bench-history-{budget}"
+    per_turn = []
+    try:
+        for turn in range(turns):
+            before = metrics.counters.get(("prompt_tokens", ()), 0)
+            await service.get_response(CALLER_LINES[turn % len(CALLER_LINES)], call_sid)
+            per_turn.append(metrics.counters[("prompt_tokens", ())] - before)
+            # Time the caller spends listening, when background summaries run
+            await asyncio.sleep(gap)
+        kept = len(service.conversations[call_sid].messages)
+        summaries = metrics.counters.get(("conversation_summaries", ()), 0)
+        await service.clear_conversation(call_sid)
+    finally:
+        await close_provider_clients()
+        metrics.reset()
+    return per_turn, kept, summaries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--minutes", type=float, default=30)
+    parser.add_argument("--turn-interval", type=float, default=15.0, help="Simulated seconds between caller turns")
+    parser.add_argument("--budget", type=int, default=1000, help="HISTORY_TOKEN_BUDGET for the bounded run")
+    parser.add_argument("--gap", type=float, default=0.05, help="Real seconds to wait between turns")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    server = StubServer(create_stub_app(latency=0.01, token_interval=0.0), port=args.port).start()
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+    os.environ["OPENAI_BASE_URL"] = f"{server.base_url}/v1"
+    turns = int(args.minutes * 60 / args.turn_interval)
+
+    try:
+        unbounded, unbounded_kept, _ = asyncio.run(run_call(10 ** 9, turns, args.gap))
+        bounded, bounded_kept, summaries = asyncio.run(run_call(args.budget, turns, args.gap))
+    finally:
+        server.stop()
+
+    print(f"{turns} turns over {args.minutes:g} min, one every {args.turn_interval:g} s; "
+          f"token counts are estimates (about 4 characters per token)")
+    print(f"{'minute':>6} {'unbounded':>10} {'budgeted':>10}")
+    step = max(1, int(5 * 60 / args.turn_interval))
+    for turn in list(range(0, turns, step)) + [turns - 1]:
+        minute = (turn + 1) * args.turn_interval / 60
+        print(f"{minute:>6.1f} {unbounded[turn]:>10} {bounded[turn]:>10}")
+    print(f"{'total':>6} {sum(unbounded):>10} {sum(bounded):>10}   "
+          f"({sum(bounded) / sum(unbounded):.0%} of unbounded, {summaries:g} background summaries)")
+    print(f"messages held at the end: unbounded {unbounded_kept}, budgeted {bounded_kept}")
+
+
+if __name__ == "__main__":
+    main()
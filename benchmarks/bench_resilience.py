@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""Tail latency and failures of provider calls against a stub with stalls and errors, per resilience setting.
+
+The stub answers after --latency, but --slow-rate of the requests stall for
+another --slow-latency seconds and --error-rate fail with HTTP 500. Each
+mode runs --requests STT, batch TTS and streamed TTS (time to first chunk)
+requests, --concurrency at a time, after a warm-up that gives the hedge
+delay its latency samples:
+
+- plain: one attempt, no hedging (the services before this change)
+- retry: deadline-aware retries with jittered backoff
+- hedge: retries, plus a duplicate request after the recent p95
+
+A second phase takes the provider down completely and times how long a
+turn waits before the caller hears the cached fallback phrase, with the
+circuit breaker effectively off and with the default settings.
+
+    python -m benchmarks.bench_resilience --requests 300 --slow-rate 0.03 --slow-latency 2 --error-rate 0.03
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks.stub_providers import StubServer, create_stub_app
+
+WAV_PAYLOAD = b"RIFF" + b"\x00" * 6400
+FALLBACK_PHRASE = "I'm sorry, I'm having trouble processing your request right now."
+
+MODES = {
+    "plain": {"PROVIDER_RETRIES": "0", "HEDGE_ENABLED": "false"},
+    "retry": {"PROVIDER_RETRIES": "2", "HEDGE_ENABLED": "false"},
+    "hedge": {"PROVIDER_RETRIES": "2", "HEDGE_ENABLED": "true"},
+}
+
+
+def new_service(settings: Dict[str, str]):
+    os.environ.update(settings)
+    from services.elevenlabs_service import ElevenLabsService
+    return ElevenLabsService(fallback_phrase=FALLBACK_PHRASE)
+
+
+async def timed(operation) -> Tuple[float, bool]:
+    started = time.perf_counter()
+    ok = await operation()
+    return time.perf_counter() - started, ok
+
+
+def operations(service, index: int):
+    text = f"Reply sentence number {index}."
+
+    async def stt() -> bool:
+        return await service.speech_to_text(WAV_PAYLOAD) is not None
+
+    async def tts() -> bool:
+        return bool(await service.text_to_speech(text))
+
+    async def tts_first_chunk() -> bool:
+        async for _ in service.stream_text_to_speech(text + " Streamed."):
+            return True
+        return False
+
+    return {"stt": stt, "tts": tts, "tts_stream": tts_first_chunk}
+
+
+async def run_mode(settings: Dict[str, str], args) -> Dict[str, Tuple[List[float], int]]:
+    from services.http_client import close_provider_clients
+
+    service = new_service(settings)
+    results: Dict[str, Tuple[List[float], int]] = {}
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def limited(operation):
+        async with semaphore:
+            return await timed(operation)
+
+    try:
+        # Warm-up: latency samples for the hedge delay, not measured
+        await asyncio.gather(*(limited(op) for i in range(args.warmup)
+                               for op in operations(service, -1 - i).values()))
+        for name in ("stt", "tts", "tts_stream"):
+            runs = await asyncio.gather(*(limited(operations(service, i)[name]) for i in range(args.requests)))
+            results[name] = ([latency for latency, _ in runs], sum(1 for _, ok in runs if not ok))
+    finally:
+        await close_provider_clients()
+    return results
+
+
+async def run_outage(settings: Dict[str, str], stub, args) -> List[float]:
+    """Seconds until a turn gets audio (the fallback) with the provider down"""
+    from services.http_client import close_provider_clients
+
+    service = new_service(settings)
+    # The fallback phrase was cached while the provider was up
+    await service.warm_cache([FALLBACK_PHRASE])
+    stub.state.error_rate = 1.0
+    waits = []
+    try:
+        for i in range(args.outage_turns):
+            started = time.perf_counter()
+            await service.text_to_speech(f"Outage turn {i}.", fallback=True)
+            waits.append(time.perf_counter() - started)
+    finally:
+        stub.state.error_rate = args.error_rate
+        await close_provider_clients()
+    return waits
+
+
+def ms(values: List[float], q: float) -> float:
+    return float(np.quantile(values, q)) * 1000 if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    parser.add_argument("--requests", type=int, default=300, help="Requests per operation and mode")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=30, help="Warm-up requests per operation")
+    parser.add_argument("--latency", type=float, default=0.1, help="Stub latency per provider request (s)")
+    parser.add_argument("--slow-rate", type=float, default=0.03, help="Fraction of requests that stall")
+    parser.add_argument("--slow-latency", type=float, default=2.0, help="Extra seconds a stalled request takes")
+    parser.add_argument("--error-rate", type=float, default=0.03, help="Fraction of requests failing with 500")
+    parser.add_argument("--outage-turns", type=int, default=20, help="Turns timed with the provider down")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    stub = create_stub_app(args.latency, chunk_interval=0.01, error_rate=args.error_rate,
+                           slow_rate=args.slow_rate, slow_latency=args.slow_latency)
+    server = StubServer(stub, port=args.port).start()
+    os.environ.setdefault("ELEVENLABS_API_KEY", "stub")
+    os.environ["ELEVENLABS_BASE_URL"] = f"{server.base_url}/v1"
+    os.environ["ELEVENLABS_MAX_CONCURRENCY"] = "100"
+    os.environ["TTS_CACHE_ENABLED"] = "true"
+    os.environ["TTS_CACHE_DIR"] = ""
+
+    rows = []
+    try:
+        for mode in args.modes:
+            rows.append((mode, asyncio.run(run_mode(MODES[mode], args))))
+        outage = {
+            "no breaker": asyncio.run(run_outage({**MODES["hedge"], "CIRCUIT_FAILURE_THRESHOLD": "1000000"},
+                                                 stub, args)),
+            "breaker": asyncio.run(run_outage({**MODES["hedge"], "CIRCUIT_FAILURE_THRESHOLD": "5"}, stub, args)),
+        }
+    finally:
+        server.stop()
+
+    print(f"\nStub: {args.latency * 1000:.0f} ms latency, {args.slow_rate:.0%} of requests +{args.slow_latency:g}s, "
+          f"{args.error_rate:.0%} HTTP 500; {args.requests} requests per operation, {args.concurrency} at a time")
+    print(f"{'operation':<11} {'mode':<6} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} {'max (ms)':>9} {'failed':>7}")
+    for name in ("stt", "tts", "tts_stream"):
+        for mode, results in rows:
+            latencies, failed = results[name]
+            print(f"{name:<11} {mode:<6} {ms(latencies, 0.5):>9.0f} {ms(latencies, 0.95):>9.0f} "
+                  f"{ms(latencies, 0.99):>9.0f} {ms(latencies, 1.0):>9.0f} {failed:>7}")
+    print(f"\nProvider down: time until a TTS request returns the cached fallback, over {args.outage_turns} turns")
+    print(f"{'setting':<11} {'p50 (ms)':>9} {'max (ms)':>9} {'total (s)':>9}")
+    for setting, waits in outage.items():
+        print(f"{setting:<11} {ms(waits, 0.5):>9.0f} {ms(waits, 1.0):>9.0f} {sum(waits):>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
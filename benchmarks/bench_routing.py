@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""LLM time to first token and cost per turn, with every turn on the full model vs routed turns.
+
+Replays a scripted call mixing trivial turns (thanks, goodbye, "say that
+again"), a repeated question, short answers and real questions through OpenAIService against
+the provider stub, with MODEL_ROUTING off and then on. The stub answers
+the small model after --small-latency and everything else after --latency,
+the way smaller models start sooner. Costs are estimated from the tokens
+(about 4 characters each) at the prices in the routing rules.
+
+    python -m benchmarks.bench_routing --calls 20 --latency 0.45 --small-latency 0.25
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks.load_test import percentile
+from benchmarks.stub_providers import StubServer, create_stub_app
+
+CALL_SCRIPT = [
+    "Hi there",
+    "I'd like to know what time your office opens on Saturdays and whether I need an appointment.",
+    "Sorry, can you repeat that?",
+    "Yes",
+    "And is there parking near the office, or should I take the bus from the station?",
+    "And is there parking near the office, or should I take the bus from the station?",
+    "Okay, my name is Jordan Lee",
+    "Could you also send me a text message with the address and the opening hours?",
+    "Hold on a second",
+    "The number is five five five, one two three four",
+    "Thanks so much",
+    "That's all, bye",
+]
+
+
+async def run_calls(calls: int, gap: float) -> dict:
+    """Replay the script `calls` times; returns first-token seconds per route and LLM cost"""
+    from services.http_client import close_provider_clients
+    from services.openai_service import OpenAIService
+    from utils.metrics import metrics
+
+    service = OpenAIService()
+    first_tokens = defaultdict(list)
+    try:
+        for call in range(calls):
+            call_sid = f"bench-routing-{call}"
+            for line in CALL_SCRIPT:
+                started = time.perf_counter()
+                first = None
+                async for _ in service.stream_response(line, call_sid):
+                    if first is None:
+                        first = time.perf_counter() - started
+                first_tokens[service.reply_route(call_sid).name].append(first)
+                await asyncio.sleep(gap)
+            await service.clear_conversation(call_sid)
+        cost = sum(value for (name, _), value in metrics.counters.items() if name == "llm_route_cost_usd")
+        requests = sum(value for (name, labels), value in metrics.counters.items()
+                       if name == "llm_routes" and ("route", "canned") not in labels)
+    finally:
+        await close_provider_clients()
+        metrics.reset()
+    return {"first_tokens": first_tokens, "cost": cost, "requests": requests}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=20, help="Times the scripted call is replayed per mode")
+    parser.add_argument("--latency", type=float, default=0.45, help="Stub time to first token, full model (s)")
+    parser.add_argument("--small-latency", type=float, default=0.25, help="Stub time to first token, small model (s)")
+    parser.add_argument("--gap", type=float, default=0.0, help="Real seconds to wait between turns")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+    from services.model_router import get_model_router
+    router = get_model_router()
+    small = router.routes.get("small")
+    server = StubServer(create_stub_app(latency=args.latency, token_interval=0.0,
+                                       model_latency={small.model: args.small_latency} if small else None),
+                        port=args.port).start()
+    os.environ["OPENAI_BASE_URL"] = f"{server.base_url}/v1"
+
+    results = {}
+    try:
+        for mode in ("off", "on"):
+            router.enabled = mode == "on"
+            results[mode] = asyncio.run(run_calls(args.calls, args.gap))
+    finally:
+        server.stop()
+
+    turns = args.calls * len(CALL_SCRIPT)
+    print(f"\n{args.calls} calls x {len(CALL_SCRIPT)} turns; stub first token {args.latency:g}s "
+          f"(small model {args.small_latency:g}s)")
+    print(f"{'routing':<8} {'route':<7} {'turns':>6} {'p50 ms':>7} {'p95 ms':>7}")
+    for mode, result in results.items():
+        everything = [seconds for values in result["first_tokens"].values() for seconds in values]
+        for route, values in sorted(result["first_tokens"].items()) + [("all", everything)]:
+            print(f"{mode:<8} {route:<7} {len(values):>6} {percentile(values, 0.5) * 1000:>7.1f} "
+                  f"{percentile(values, 0.95) * 1000:>7.1f}")
+    for mode, result in results.items():
+        print(f"routing {mode}: {result['requests']:g} LLM requests for {turns} turns, "
+              f"estimated LLM cost ${result['cost'] / args.calls * 1000:.2f} per 1000 calls")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""Provider errors and per-call latency under account limits, with and without the provider scheduler.
+
+The stub enforces --limit concurrent requests and --rate requests per second
+per provider, answering anything beyond with HTTP 429, like a real account.
+One chatty call fires --burst TTS requests at once (a long reply synthesized
+sentence by sentence); just after, --calls quiet calls each run one turn
+(STT, streamed LLM reply, TTS). Modes:
+
+- unscheduled: no client-side limits, as before the scheduler; 429s reach the services
+- fifo: scheduler at the account limits, but every request in one queue
+- fair: scheduler at the account limits, round-robin across calls
+
+    python -m benchmarks.bench_scheduler --calls 20 --burst 40 --limit 4 --rate 20
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks.stub_providers import StubServer, create_stub_app
+
+WAV_PAYLOAD = b"RIFF" + b"\x00" * 6400
+MODES = ("unscheduled", "fifo", "fair")
+
+
+async def quiet_turn(elevenlabs_service, openai_service, call_sid: str) -> Tuple[float, bool]:
+    """One caller turn; returns its latency and whether every stage succeeded"""
+    from services.openai_service import FALLBACK_RESPONSE
+
+    started = time.perf_counter()
+    text = await elevenlabs_service.speech_to_text(WAV_PAYLOAD, call_sid)
+    ok = bool(text)
+    reply = "".join([token async for token in openai_service.stream_response(text or "hello", call_sid)])
+    ok = ok and reply != FALLBACK_RESPONSE
+    audio = await elevenlabs_service.text_to_speech(reply, call_sid)
+    return time.perf_counter() - started, ok and bool(audio)
+
+
+async def chatty_call(elevenlabs_service, burst: int, call_sid: str) -> Tuple[float, int]:
+    """Synthesize `burst` sentences at once; returns the time for all of them and how many failed"""
+    started = time.perf_counter()
+    results = await asyncio.gather(*(
+        elevenlabs_service.text_to_speech(f"Here is sentence number {i} of a long answer.", call_sid)
+        for i in range(burst)))
+    return time.perf_counter() - started, sum(1 for audio in results if not audio)
+
+
+async def run(mode: str, args) -> Tuple[List[float], int, float, int]:
+    from services.elevenlabs_service import ElevenLabsService
+    from services.http_client import close_provider_clients
+    from services.openai_service import OpenAIService
+
+    scheduled = mode != "unscheduled"
+    for provider in ("ELEVENLABS", "OPENAI"):
+        os.environ[f"{provider}_MAX_CONCURRENCY"] = str(args.limit if scheduled else 1000)
+        os.environ[f"{provider}_RATE_LIMIT"] = str(args.rate if scheduled else 0)
+        os.environ[f"{provider}_RATE_LIMIT_RETRIES"] = "2" if scheduled else "0"
+    elevenlabs_service = ElevenLabsService()
+    openai_service = OpenAIService()
+
+    def sid(name: str) -> Optional[str]:
+        # FIFO: no call ids, so every request shares the background queue
+        return name if mode == "fair" else None
+
+    try:
+        chatty = asyncio.create_task(chatty_call(elevenlabs_service, args.burst, sid("CAchatty")))
+        await asyncio.sleep(0.01)
+        quiet = await asyncio.gather(*(quiet_turn(elevenlabs_service, openai_service, sid(f"CAquiet{i:03d}"))
+                                       for i in range(args.calls)))
+        chatty_time, chatty_failed = await chatty
+    finally:
+        await close_provider_clients()
+    return [latency for latency, _ in quiet], sum(1 for _, ok in quiet if not ok), chatty_time, chatty_failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--calls", type=int, default=20, help="Quiet calls running one turn each")
+    parser.add_argument("--burst", type=int, default=40, help="TTS requests the chatty call fires at once")
+    parser.add_argument("--limit", type=int, default=4, help="Provider concurrency limit enforced by the stub")
+    parser.add_argument("--rate", type=float, default=20.0, help="Provider requests/s enforced by the stub")
+    parser.add_argument("--latency", type=float, default=0.1, help="Stub latency per provider request (s)")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    stub = create_stub_app(args.latency, token_interval=0.005, chunk_interval=0.01,
+                           max_concurrency=args.limit, rate_limit=args.rate)
+    server = StubServer(stub, port=args.port).start()
+    os.environ.setdefault("ELEVENLABS_API_KEY", "stub")
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+    os.environ["ELEVENLABS_BASE_URL"] = f"{server.base_url}/v1"
+    os.environ["OPENAI_BASE_URL"] = f"{server.base_url}/v1"
+    os.environ["TTS_CACHE_ENABLED"] = "false"
+    # Measure the scheduler alone, without the resilience layer's retries and hedges
+    os.environ["PROVIDER_RETRIES"] = "0"
+    os.environ["HEDGE_ENABLED"] = "false"
+    os.environ["CIRCUIT_FAILURE_THRESHOLD"] = "1000000"
+
+    print(f"Stub limits per provider: {args.limit} concurrent, {args.rate:g} req/s; "
+          f"{args.calls} quiet calls, 1 chatty call with {args.burst} TTS requests")
+    print(f"{'mode':<12} {'quiet p50 (s)':>13} {'quiet p95 (s)':>13} {'failed turns':>12} "
+          f"{'chatty (s)':>10} {'chatty failed':>13} {'429s':>6}")
+    try:
+        for mode in args.modes:
+            throttled = stub.state.throttled
+            latencies, failed, chatty_time, chatty_failed = asyncio.run(run(mode, args))
+            ordered = sorted(latencies)
+            p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+            print(f"{mode:<12} {statistics.median(latencies):>13.2f} {p95:>13.2f} {failed:>12} "
+                  f"{chatty_time:>10.2f} {chatty_failed:>13} {stub.state.throttled - throttled:>6}")
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
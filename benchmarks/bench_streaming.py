@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""Compare time-to-first-audio-byte for batch and streamed replies against the provider stub.
+
+Batch waits for the full completion and the full TTS file; streaming sends
+sentence chunks to TTS while the LLM is still generating.
+
+    python -m benchmarks.bench_streaming --turns 5 --latency 0.3
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks.stub_providers import StubServer, create_stub_app
+
+
+async def batch_turn(openai_service, elevenlabs_service, call_sid: str):
+    start = time.perf_counter()
+    response = await openai_service.get_response("What are your opening hours?", call_sid)
+    await elevenlabs_service.text_to_speech(response)
+    elapsed = time.perf_counter() - start
+    return elapsed, elapsed
+
+
+async def streaming_turn(openai_service, elevenlabs_service, call_sid: str):
+    from app.reply_stream import ReplyStream
+
+    async def discard(audio: bytes, index: int):
+        pass
+
+    reply = ReplyStream(openai_service, elevenlabs_service, call_sid, discard)
+    await reply.run("What are your opening hours?")
+    return reply.first_audio_at - reply.started_at, reply.completed_at - reply.started_at
+
+
+async def run(mode: str, turns: int):
+    from services.elevenlabs_service import ElevenLabsService
+    from services.http_client import close_provider_clients
+    from services.openai_service import OpenAIService
+
+    openai_service = OpenAIService()
+    elevenlabs_service = ElevenLabsService()
+    turn = batch_turn if mode == "batch" else streaming_turn
+    results = []
+    try:
+        for i in range(turns):
+            results.append(await turn(openai_service, elevenlabs_service, f"bench-{mode}-{i}"))
+    finally:
+        await close_provider_clients()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.3, help="Stub time to first byte (s)")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    server = StubServer(create_stub_app(args.latency), port=args.port).start()
+    os.environ.setdefault("ELEVENLABS_API_KEY", "stub")
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+    os.environ["ELEVENLABS_BASE_URL"] = f"{server.base_url}/v1"
+    os.environ["OPENAI_BASE_URL"] = f"{server.base_url}/v1"
+    # Every turn asks for the same reply text; measure synthesis, not cache hits
+    os.environ["TTS_CACHE_ENABLED"] = "false"
+
+    print(f"{'mode':<10} {'first audio (ms)':>17} {'complete (ms)':>14}")
+    try:
+        for mode in ("batch", "streaming"):
+            results = asyncio.run(run(mode, args.turns))
+            first_audio = statistics.mean(r[0] for r in results) * 1000
+            complete = statistics.mean(r[1] for r in results) * 1000
+            print(f"{mode:<10} {first_audio:>17.0f} {complete:>14.0f}")
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Compare end-of-speech to final-transcript latency for batch and streaming STT.
+
+Batch uploads the whole utterance as a WAV once the caller stops talking.
+Streaming pushes audio over one persistent connection in real time and only
+commits at the end, so just the tail is left to transcribe. The stub models
+transcription cost with --stt-rtf (seconds per second of audio). Loopback
+upload time is close to zero here; over a real network the batch upload of a
+16-bit WAV adds to its latency.
+
+    python -m benchmarks.bench_stt --durations 1 3 6 10 --latency 0.15 --stt-rtf 0.1
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks.stub_providers import StubServer, create_stub_app
+from benchmarks.synthetic_audio import synthesize_call, to_mulaw
+
+CHUNK_BYTES = 800  # 100 ms of 8 kHz mu-law, like CallSession's default STT_CHUNK_MS
+
+
+async def batch_latency(service, mulaw: bytes) -> float:
+    from utils.audio import mulaw_to_wav
+
+    start = time.perf_counter()
+    await service.speech_to_text(mulaw_to_wav(mulaw))
+    return time.perf_counter() - start
+
+
+async def streaming_latency(service, mulaw: bytes) -> float:
+    session = await service.open_transcription_stream()
+    if session is None:
+        raise RuntimeError("could not open the streaming STT connection")
+    try:
+        transcripts = session.transcripts()
+        # Audio arrives at real-time pace while the caller talks
+        for offset in range(0, len(mulaw), CHUNK_BYTES):
+            await session.send_audio(mulaw[offset:offset + CHUNK_BYTES])
+            await asyncio.sleep(CHUNK_BYTES / 8000)
+        start = time.perf_counter()
+        await session.send_audio(b"", commit=True)
+        async for kind, _ in transcripts:
+            if kind == "final":
+                return time.perf_counter() - start
+        raise RuntimeError("connection closed before the final transcript")
+    finally:
+        await session.close()
+
+
+async def run(durations, repeats: int):
+    from services.elevenlabs_service import ElevenLabsService
+    from services.http_client import close_provider_clients
+
+    service = ElevenLabsService()
+    results = []
+    try:
+        for duration in durations:
+            mulaw = to_mulaw(synthesize_call(duration, seed=int(duration * 10))[0])
+            batch = [await batch_latency(service, mulaw) for _ in range(repeats)]
+            streaming = [await streaming_latency(service, mulaw) for _ in range(repeats)]
+            results.append((duration, statistics.mean(batch), statistics.mean(streaming)))
+    finally:
+        await close_provider_clients()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--durations", type=float, nargs="+", default=[1, 3, 6, 10], help="Utterance lengths (s)")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.15, help="Stub latency per request (s)")
+    parser.add_argument("--stt-rtf", type=float, default=0.1, help="Stub STT seconds per second of audio")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    server = StubServer(create_stub_app(args.latency, stt_rtf=args.stt_rtf), port=args.port).start()
+    os.environ.setdefault("ELEVENLABS_API_KEY", "stub")
+    os.environ["ELEVENLABS_BASE_URL"] = f"{server.base_url}/v1"
+    try:
+        results = asyncio.run(run(args.durations, args.repeats))
+    finally:
+        server.stop()
+
+    print(f"Stub latency {args.latency:.3f}s, STT real-time factor {args.stt_rtf:g}; "
+          f"end of speech -> final transcript")
+    print(f"{'utterance (s)':>13} {'batch (ms)':>11} {'streaming (ms)':>15}")
+    for duration, batch, streaming in results:
+        print(f"{duration:>13g} {batch * 1000:>11.0f} {streaming * 1000:>15.0f}")
+
+
+if __name__ == "__main__":
+    main()
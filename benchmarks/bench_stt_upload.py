@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""Upload bytes, STT calls and STT latency per minute of caller audio, per pre-upload setting.
+
+Synthesizes --minutes of caller audio with handset rustles (short loud bumps)
+in some of the pauses, runs it through the VAD frame by frame as a call
+does, and sends every utterance to the stub's batch STT, which charges
+--stt-rtf seconds per second of uploaded audio. Upload time over a
+--uplink-kbps link is modelled from the bytes, since loopback is free.
+Settings:
+
+- wav16: untrimmed 16-bit PCM WAV (before this stage)
+- trimmed: silence trimmed and noise-only utterances skipped, 16-bit PCM WAV
+- mulaw: trimmed and skipped, uploaded as mu-law WAV (the default)
+
+"speech kept" is the share of the synthesized phrases' audio that made it
+into an upload, so trimming that clips words shows up.
+
+    python -m benchmarks.bench_stt_upload --minutes 5 --stt-rtf 0.1 --uplink-kbps 256
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks.stub_providers import StubServer, create_stub_app
+from benchmarks.synthetic_audio import SAMPLE_RATE, synthesize_call, to_mulaw
+from utils.audio import FRAME_BYTES
+from utils.stt_upload import STTUpload, speech_span
+from utils.vad import UTTERANCE, VoiceActivityDetector
+
+SETTINGS = {
+    "wav16": STTUpload(trim=False, upload_format="pcm"),
+    "trimmed": STTUpload(trim=True, upload_format="pcm"),
+    "mulaw": STTUpload(trim=True, upload_format="mulaw"),
+}
+
+
+def add_rustles(pcm: np.ndarray, phrases: List[Tuple[float, float]], rate: float, seed: int = 1) -> int:
+    """Put a burst of 60-100 ms low-frequency bumps in a `rate` share of the pauses; returns how many"""
+    rng = np.random.default_rng(seed)
+    audio = pcm.astype(np.float64)
+    added = 0
+    for (_, end), (start, _) in zip(phrases, phrases[1:]):
+        if start - end < 1.5 or rng.random() >= rate:
+            continue
+        position = int((end + 0.9) * SAMPLE_RATE)
+        for _ in range(int(rng.integers(3, 7))):
+            length = int(rng.uniform(0.06, 0.1) * SAMPLE_RATE)
+            # Low-passed noise: loud, but with few zero crossings, like a thump on the handset
+            bump = np.convolve(rng.standard_normal(length), np.ones(12) / 12, mode="same")
+            audio[position:position + length] += bump / np.abs(bump).max() * 32768.0 * 10 ** (-12 / 20)
+            position += length + int(rng.uniform(0.05, 0.15) * SAMPLE_RATE)
+        added += 1
+    pcm[:] = np.clip(audio, -32768, 32767).astype(np.int16)
+    return added
+
+
+def utterances(mulaw: bytes) -> List[Tuple[int, int, float]]:
+    """(start, end, speech threshold) of each utterance, fed to the VAD one 20 ms frame at a time"""
+    vad = VoiceActivityDetector()
+    found = []
+    for offset in range(0, len(mulaw) - FRAME_BYTES + 1, FRAME_BYTES):
+        for event, span in vad.feed(mulaw[offset:offset + FRAME_BYTES]):
+            if event == UTTERANCE:
+                found.append((span[0], span[1], vad.speech_threshold_db()))
+    return found
+
+
+def speech_kept(spans: List[Tuple[int, int]], phrases: List[Tuple[float, float]]) -> float:
+    """Share of phrase audio that lies inside an uploaded span"""
+    total = kept = 0
+    for phrase_start, phrase_end in phrases:
+        start, end = int(phrase_start * SAMPLE_RATE), int(phrase_end * SAMPLE_RATE)
+        total += end - start
+        kept += sum(max(0, min(end, span_end) - max(start, span_start)) for span_start, span_end in spans)
+    return kept / total if total else 1.0
+
+
+async def run(setting: STTUpload, mulaw: bytes, found, uplink_kbps: float) -> Dict[str, float]:
+    from services.elevenlabs_service import ElevenLabsService
+    from services.http_client import close_provider_clients
+
+    service = ElevenLabsService()
+    uploads = skipped = upload_bytes = 0
+    stt_seconds = 0.0
+    spans = []
+    try:
+        for start, end, threshold_db in found:
+            upload = setting.prepare(mulaw[start:end], threshold_db)
+            if upload is None:
+                skipped += 1
+                continue
+            span = speech_span(mulaw[start:end], threshold_db, setting.zcr_max, setting.min_speech_frames,
+                               setting.pad_frames) if setting.trim else (0, end - start)
+            spans.append((start + span[0], start + span[1]))
+            started = time.perf_counter()
+            await service.speech_to_text(upload)
+            stt_seconds += time.perf_counter() - started
+            uploads += 1
+            upload_bytes += len(upload)
+    finally:
+        await close_provider_clients()
+    return {"uploads": uploads, "skipped": skipped, "bytes": upload_bytes, "stt": stt_seconds,
+            "upload": upload_bytes * 8 / (uplink_kbps * 1000), "spans": spans}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--settings", nargs="+", choices=list(SETTINGS), default=list(SETTINGS))
+    parser.add_argument("--minutes", type=float, default=5.0, help="Caller audio to synthesize")
+    parser.add_argument("--rustle-rate", type=float, default=0.3, help="Share of pauses with a handset rustle")
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub latency per STT request (s)")
+    parser.add_argument("--stt-rtf", type=float, default=0.1, help="Stub STT seconds per second of audio")
+    parser.add_argument("--uplink-kbps", type=float, default=256.0, help="Modelled upload bandwidth")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    pcm, phrases = synthesize_call(args.minutes * 60)
+    rustles = add_rustles(pcm, phrases, args.rustle_rate)
+    mulaw = to_mulaw(pcm)
+    found = utterances(mulaw)
+
+    server = StubServer(create_stub_app(args.latency, stt_rtf=args.stt_rtf), port=args.port).start()
+    os.environ.setdefault("ELEVENLABS_API_KEY", "stub")
+    os.environ["ELEVENLABS_BASE_URL"] = f"{server.base_url}/v1"
+    os.environ["PROVIDER_RETRIES"] = "0"
+    os.environ["HEDGE_ENABLED"] = "false"
+    try:
+        results = {name: asyncio.run(run(SETTINGS[name], mulaw, found, args.uplink_kbps)) for name in args.settings}
+    finally:
+        server.stop()
+
+    minutes = args.minutes
+    print(f"\n{minutes:g} min of caller audio: {len(phrases)} phrases, {rustles} rustles, {len(found)} VAD utterances; "
+          f"stub STT {args.latency * 1000:.0f} ms + {args.stt_rtf:g} s/s, uplink {args.uplink_kbps:g} kbit/s")
+    print(f"{'setting':<8} {'uploads/min':>11} {'skipped/min':>11} {'KB/min':>8} {'STT s/min':>9} "
+          f"{'upload s/min':>12} {'speech kept':>11}")
+    for name, result in results.items():
+        print(f"{name:<8} {result['uploads'] / minutes:>11.1f} {result['skipped'] / minutes:>11.1f} "
+              f"{result['bytes'] / 1024 / minutes:>8.1f} {result['stt'] / minutes:>9.2f} "
+              f"{result['upload'] / minutes:>12.2f} {speech_kept(result['spans'], phrases):>11.1%}")
+    if "wav16" in results:
+        base = results["wav16"]
+        for name, result in results.items():
+            if name != "wav16":
+                saved = (base["stt"] + base["upload"]) - (result["stt"] + result["upload"])
+                print(f"{name}: {1 - result['bytes'] / base['bytes']:.0%} fewer bytes, "
+                      f"{saved / minutes:.2f} s of STT and upload time saved per minute of call audio")
+
+
+if __name__ == "__main__":
+    main()
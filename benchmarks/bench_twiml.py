@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""`/twiml` webhook throughput of a real `app.main` process: per-request TwiML vs the precompiled template.
+
+Modes, each served by its own app process:
+
+- legacy: the webhook as it used to be: FastAPI `Form` fields, a fresh
+  `VoiceResponse` per request, WEBSOCKET_URL read from the environment,
+  the URL and full XML logged
+- precompiled: the template rendered at startup with only the call SID
+  substituted, and the urlencoded body read with `parse_qsl`
+- signed: precompiled, with TWILIO_VALIDATE_SIGNATURE on and every request signed
+
+--concurrency clients post realistic Twilio voice webhooks (25 form fields)
+for --seconds. The load generator shares the machine with the app, so
+server CPU per request (from /proc) is shown next to requests/s; it is the
+number that does not depend on how many cores the client gets. The
+in-process render time of each TwiML path is shown as well.
+
+    python -m benchmarks.bench_twiml --seconds 10 --concurrency 20
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import httpx
+from twilio.request_validator import RequestValidator
+from twilio.twiml.voice_response import VoiceResponse
+
+from benchmarks.load_test import percentile, start_servers, stop_servers
+
+MODES = ("legacy", "precompiled", "signed")
+AUTH_TOKEN = "stub"
+
+
+def legacy_generate(service, call_sid: str) -> str:
+    """The webhook's TwiML as it was generated before the template"""
+    response = VoiceResponse()
+    if not service.stream_greeting:
+        response.say("Hello! I'm your AI voice assistant. How can I help you today?")
+    websocket_url = os.getenv("WEBSOCKET_URL")
+    if not websocket_url:
+        webhook_domain = service.webhook_url.replace('http://', '').replace('https://', '')
+        websocket_url = f"wss://{webhook_domain}/ws/{call_sid}"
+    else:
+        websocket_url = f"{websocket_url}/ws/{call_sid}"
+    print(f"🌐 WebSocket URL for streaming: {websocket_url}")
+    connect = response.connect()
+    connect.stream(url=websocket_url)
+    twiml = str(response)
+    print(f"📋 Generated TwiML response: {twiml}")
+    return twiml
+
+
+def legacy_app():
+    """uvicorn factory: app.main with `/twiml` as it was, Form fields and all"""
+    from fastapi import Form
+    from fastapi.responses import Response
+    from app import main
+
+    main.app.router.routes = [route for route in main.app.router.routes if getattr(route, "path", None) != "/twiml"]
+
+    @main.app.post("/twiml")
+    async def twiml_endpoint(CallSid: str = Form(...), From: str = Form(None), To: str = Form(None)):
+        print(f"📞 Received Twilio webhook for call: {CallSid}")
+        print(f"📞 From: {From}, To: {To}")
+        await main.record_call(CallSid, caller=From, called=To)
+        return Response(content=legacy_generate(main.twilio_service, CallSid), media_type="application/xml")
+
+    return main.app
+
+
+def webhook_form(index: int) -> Dict[str, str]:
+    """The fields Twilio posts to a voice webhook for an inbound call"""
+    caller, called = f"+1415555{index % 10000:04d}", "+15550000000"
+    form = {"AccountSid": "ACstub", "ApiVersion": "2010-04-01", "CallSid": f"CA{index:032x}",
+            "CallStatus": "ringing", "Direction": "inbound", "Called": called, "To": called, "Caller": caller,
+            "From": caller}
+    for prefix in ("Called", "To", "Caller", "From"):
+        form.update({f"{prefix}City": "SAN FRANCISCO", f"{prefix}Country": "US", f"{prefix}State": "CA",
+                     f"{prefix}Zip": "94105"})
+    return form
+
+
+def process_cpu_seconds(pid: int) -> float:
+    """User + system CPU time of a process, from /proc (Linux only)"""
+    try:
+        fields = Path(f"/proc/{pid}/stat").read_text().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, IndexError, ValueError):
+        return float("nan")
+
+
+async def hammer(url: str, requests: List[Tuple[Dict[str, str], Dict[str, str]]], concurrency: int,
+                 seconds: float) -> Tuple[List[float], int]:
+    latencies: List[float] = []
+    errors = 0
+    deadline = time.perf_counter() + seconds
+
+    async def client_loop(client: httpx.AsyncClient, offset: int):
+        nonlocal errors
+        index = offset
+        while time.perf_counter() < deadline:
+            form, headers = requests[index % len(requests)]
+            index += concurrency
+            started = time.perf_counter()
+            try:
+                response = await client.post(url, data=form, headers=headers)
+                if response.status_code != 200 or "<Stream" not in response.text:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=15.0) as client:
+        await asyncio.gather(*(client_loop(client, i) for i in range(concurrency)))
+    return latencies, errors
+
+
+def render_times(iterations: int) -> Dict[str, float]:
+    """Microseconds per TwiML render, in this process, for both generation paths"""
+    from services.twilio_service import TwilioService
+    import contextlib
+    import io
+
+    service = TwilioService()
+    times = {}
+    for name, render in (("legacy", lambda sid: legacy_generate(service, sid)),
+                         ("precompiled", service.generate_twiml_response)):
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            for i in range(iterations):
+                render(f"CA{i:032x}")
+            times[name] = (time.perf_counter() - started) / iterations * 1e6
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--seconds", type=float, default=10.0, help="Load duration per mode")
+    parser.add_argument("--concurrency", type=int, default=20, help="Webhooks in flight at once")
+    parser.add_argument("--app-port", type=int, default=8010)
+    parser.add_argument("--stub-port", type=int, default=8765)
+    parser.add_argument("--app-logs", action="store_true", help="Show the app's own log output")
+    args = parser.parse_args()
+    # start_servers also runs the provider stub; the webhook never calls it
+    args.latency, args.jitter, args.error_rate = 0.0, 0.0, 0.0
+
+    http_url = f"http://127.0.0.1:{args.app_port}"
+    os.environ.update(TWILIO_ACCOUNT_SID="ACstub", TWILIO_AUTH_TOKEN=AUTH_TOKEN, TWILIO_PHONE_NUMBER="+15550000000",
+                      WEBHOOK_URL=http_url, TTS_CACHE_ENABLED="false")
+    validator = RequestValidator(AUTH_TOKEN)
+    forms = [webhook_form(i) for i in range(2000)]
+    signed = [(form, {"X-Twilio-Signature": validator.compute_signature(f"{http_url}/twiml", form)})
+              for form in forms]
+
+    rows = []
+    for mode in args.modes:
+        os.environ["TWILIO_VALIDATE_SIGNATURE"] = "true" if mode == "signed" else "false"
+        target, factory = ("benchmarks.bench_twiml:legacy_app", True) if mode == "legacy" else ("app.main:app", False)
+        processes = start_servers(args, target, factory)
+        try:
+            app_pid = processes[-1].pid
+            # Warm up connections and the app before measuring
+            asyncio.run(hammer(f"{http_url}/twiml", signed, args.concurrency, 1.0))
+            cpu_before = process_cpu_seconds(app_pid)
+            started = time.perf_counter()
+            latencies, errors = asyncio.run(hammer(f"{http_url}/twiml", signed if mode == "signed" else
+                                                   [(form, {}) for form in forms], args.concurrency, args.seconds))
+            elapsed = time.perf_counter() - started
+            cpu = process_cpu_seconds(app_pid) - cpu_before
+        finally:
+            stop_servers(processes)
+        rows.append((mode, latencies, errors, elapsed, cpu))
+
+    print(f"\n{args.concurrency} concurrent webhooks for {args.seconds:g}s per mode")
+    print(f"{'mode':<12} {'requests':>8} {'req/s':>8} {'p50 ms':>7} {'p99 ms':>7} {'server CPU ms/req':>17} "
+          f"{'errors':>6}")
+    for mode, latencies, errors, elapsed, cpu in rows:
+        print(f"{mode:<12} {len(latencies):>8} {len(latencies) / elapsed:>8.0f} "
+              f"{percentile(latencies, 0.5) * 1000:>7.1f} {percentile(latencies, 0.99) * 1000:>7.1f} "
+              f"{cpu / max(1, len(latencies)) * 1000:>17.3f} {errors:>6}")
+    times = render_times(5000)
+    print("TwiML render in-process: " + ", ".join(f"{name} {us:.1f} us" for name, us in times.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""Replay synthetic call audio through the old fixed 20-chunk batching and the VAD endpointer.
+
+Reports STT requests per minute of caller speech for both strategies.
+
+    python -m benchmarks.bench_vad --minutes 10
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks.synthetic_audio import frames, synthesize_call, to_mulaw
+from utils.vad import UTTERANCE, VoiceActivityDetector
+
+
+def legacy_requests(media_frames) -> int:
+    """The old rule: one STT request every 20 buffered frames, speech or not"""
+    return len(media_frames) // 20
+
+
+def vad_requests(media_frames):
+    vad = VoiceActivityDetector()
+    utterances = []
+    start = time.perf_counter()
+    for frame in media_frames:
+        utterances.extend(span for event, span in vad.feed(frame) if event == UTTERANCE)
+    tail = vad.flush()
+    if tail:
+        utterances.append(tail)
+    return utterances, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--minutes", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    pcm, phrases = synthesize_call(args.minutes * 60, seed=args.seed)
+    media_frames = frames(to_mulaw(pcm))
+    speech_minutes = sum(end - start for start, end in phrases) / 60
+
+    legacy = legacy_requests(media_frames)
+    utterances, elapsed = vad_requests(media_frames)
+    mean_seconds = sum(end - start for start, end in utterances) / max(1, len(utterances)) / 8000
+
+    print(f"Audio: {args.minutes:.1f} min, {speech_minutes:.2f} min of speech in {len(phrases)} phrases")
+    print(f"{'strategy':<10} {'requests':>9} {'per speech-min':>15} {'mean length (s)':>16}")
+    print(f"{'legacy':<10} {legacy:>9} {legacy / speech_minutes:>15.1f} {0.4:>16.2f}")
+    print(f"{'vad':<10} {len(utterances):>9} {len(utterances) / speech_minutes:>15.1f} {mean_seconds:>16.2f}")
+    print(f"VAD processing: {elapsed * 1e6 / len(media_frames):.1f} µs per 20 ms frame")
+
+
+if __name__ == "__main__":
+    main()
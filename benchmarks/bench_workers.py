@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""Media-stream throughput of the app with 1, 2, 4... uvicorn worker processes sharing a session store.
+
+Starts the provider stub, the Redis stand-in and `app.main` with --workers N
+and SESSION_STORE=redis, then has several client processes push --calls
+Media Streams calls of --seconds of caller audio each, as fast as the server
+accepts them. Each call ends with `stop`; it counts once the server has
+closed the stream, i.e. after every frame went through decoding, VAD and
+the session store. Frames per second divided by 50 is the number of
+real-time calls the deployment could carry on the ingest path. Scaling is
+bounded by the cores available, which the report prints.
+
+    python -m benchmarks.bench_workers --workers 1 2 4 --calls 40 --seconds 30
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import websockets
+
+from benchmarks.load_test import stop_servers, wait_until_up
+from benchmarks.twilio_simulator import caller_audio
+
+FRAMES_PER_SECOND = 50
+
+
+def call_messages(seconds: float, seed: int) -> List[str]:
+    """Media events for one caller alternating a phrase and line noise"""
+    utterance, noise = caller_audio(seed)
+    audio = utterance + noise
+    count = int(seconds * FRAMES_PER_SECOND)
+    return [json.dumps({"event": "media", "streamSid": "MZbench",
+                        "media": {"payload": base64.b64encode(audio[i % len(audio)]).decode()}})
+            for i in range(count)]
+
+
+async def flood_call(url: str, call_sid: str, messages: List[str]):
+    async def drain(ws):
+        # Read outbound audio while sending, as Twilio does, until the server ends the call
+        async for _ in ws:
+            pass
+
+    # No keepalive pings: a saturated server is the point of the exercise, not a dead peer
+    async with websockets.connect(f"{url}/ws/{call_sid}", max_size=None, ping_interval=None) as ws:
+        reader = asyncio.create_task(drain(ws))
+        await ws.send(json.dumps({"event": "start", "streamSid": "MZbench"}))
+        for message in messages:
+            await ws.send(message)
+        await ws.send(json.dumps({"event": "stop", "streamSid": "MZbench"}))
+        await reader
+
+
+def client_process(url: str, calls: int, seconds: float, index: int,
+                   timeout: float) -> Tuple[float, float, int, List[str]]:
+    """Run `calls` concurrent calls; returns wall-clock start, end, frames sent and per-call errors"""
+    messages = call_messages(seconds, seed=index)
+
+    async def call(call_sid: str) -> Optional[str]:
+        try:
+            await asyncio.wait_for(flood_call(url, call_sid, messages), timeout)
+        except (asyncio.TimeoutError, OSError, websockets.WebSocketException) as e:
+            return f"{call_sid}: {type(e).__name__} {e}"
+        return None
+
+    async def run() -> List[str]:
+        results = await asyncio.gather(*(call(f"CAWORK{index:02d}{i:04d}") for i in range(calls)))
+        return [error for error in results if error]
+
+    started = time.time()
+    errors = asyncio.run(run())
+    return started, time.time(), calls * len(messages), errors
+
+
+def start_app(args, workers: int, stub_url: str, redis_url: str) -> subprocess.Popen:
+    env = dict(os.environ,
+               SESSION_STORE=args.store, REDIS_URL=redis_url,
+               ELEVENLABS_BASE_URL=f"{stub_url}/v1", OPENAI_BASE_URL=f"{stub_url}/v1",
+               TTS_CACHE_ENABLED="false",
+               ELEVENLABS_API_KEY=os.getenv("ELEVENLABS_API_KEY", "stub"),
+               OPENAI_API_KEY=os.getenv("OPENAI_API_KEY", "stub"),
+               TWILIO_ACCOUNT_SID=os.getenv("TWILIO_ACCOUNT_SID", "ACstub"),
+               TWILIO_AUTH_TOKEN=os.getenv("TWILIO_AUTH_TOKEN", "stub"),
+               TWILIO_PHONE_NUMBER=os.getenv("TWILIO_PHONE_NUMBER", "+15550000000"))
+    app = subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(args.app_port),
+        "--workers", str(workers), "--log-level", "warning", "--ws-ping-interval", "600",
+    ], env=env, cwd=str(Path(__file__).parent.parent), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_until_up(f"http://127.0.0.1:{args.app_port}/", app)
+    # Give every worker time to boot before measuring
+    time.sleep(1.0 + 0.5 * workers)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Worker counts to compare")
+    parser.add_argument("--calls", type=int, default=40, help="Calls per step")
+    parser.add_argument("--seconds", type=float, default=30.0, help="Caller audio per call (s)")
+    parser.add_argument("--clients", type=int, default=4, help="Load generator processes")
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub latency per provider request (s)")
+    parser.add_argument("--store", choices=["redis", "memory"], default="redis",
+                        help="Session store backend; with memory, workers share nothing")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Give up on a call after this long (s)")
+    parser.add_argument("--app-port", type=int, default=8010)
+    parser.add_argument("--stub-port", type=int, default=8765)
+    parser.add_argument("--redis-port", type=int, default=6390)
+    args = parser.parse_args()
+
+    stub_url = f"http://127.0.0.1:{args.stub_port}"
+    redis_url = f"redis://127.0.0.1:{args.redis_port}/0"
+    stub = subprocess.Popen([sys.executable, "-m", "benchmarks.stub_providers", "--port", str(args.stub_port),
+                             "--latency", str(args.latency)], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    redis = subprocess.Popen([sys.executable, "-m", "benchmarks.stub_redis", "--port", str(args.redis_port)],
+                             stdout=subprocess.DEVNULL)
+    processes = [stub, redis]
+    try:
+        wait_until_up(f"{stub_url}/docs", stub)
+        print(f"{os.cpu_count()} CPU cores, {args.calls} calls x {args.seconds:g}s of audio, "
+              f"{args.clients} client processes, SESSION_STORE={args.store}")
+        print(f"{'workers':>7} {'frames':>8} {'wall (s)':>9} {'frames/s':>9} {'rt calls':>9} {'speedup':>8} {'errors':>6}")
+        baseline = None
+        for workers in args.workers:
+            app = start_app(args, workers, stub_url, redis_url)
+            try:
+                ws_url = f"ws://127.0.0.1:{args.app_port}"
+                shares = [args.calls // args.clients + (i < args.calls % args.clients) for i in range(args.clients)]
+                with ProcessPoolExecutor(args.clients) as pool:
+                    results = list(pool.map(client_process, [ws_url] * args.clients, shares,
+                                            [args.seconds] * args.clients, range(args.clients),
+                                            [args.timeout] * args.clients))
+            finally:
+                stop_servers([app])
+            wall = max(end for _, end, _, _ in results) - min(start for start, _, _, _ in results)
+            sent = sum(count for _, _, count, _ in results)
+            errors = [error for *_, call_errors in results for error in call_errors]
+            rate = sent / wall
+            baseline = baseline or rate
+            print(f"{workers:>7} {sent:>8} {wall:>9.2f} {rate:>9.0f} {rate / FRAMES_PER_SECOND:>9.0f} "
+                  f"{rate / baseline:>7.2f}x {len(errors):>6}")
+            for error in errors[:5]:
+                print(f"  call error: {error}")
+    finally:
+        stop_servers(processes)
+
+
+if __name__ == "__main__":
+    main()
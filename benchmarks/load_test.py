@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""Ramp concurrent simulated Twilio calls against a real `app.main` process.
+
+Starts the provider stub and the FastAPI app as subprocesses (or targets a
+running app with --url), then for each concurrency step opens that many
+simulated Media Streams calls. Each call speaks, waits for the reply to
+finish playing, pauses, and repeats. Per step it reports:
+- turn latency percentiles, from the end of the caller's speech to the first
+  reply frame, so they include the VAD hangover
+- late inbound frames and playback underruns
+- server event-loop lag, from the /metrics histogram delta over the step
+
+    python -m benchmarks.load_test --calls 1 5 10 20 --turns 3 --latency 0.2 --jitter 0.1 --error-rate 0.02
+"""
+import argparse
+import asyncio
+import os
+import random
+import re
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import httpx
+
+from benchmarks.twilio_simulator import SimulatedCall, caller_audio
+
+BUCKET_LINE = re.compile(r'voice_agent_stage_latency_seconds_bucket\{stage="(\w+)",le="([^"]+)"\} (\d+)')
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def scrape_buckets(base_url: str) -> Dict[str, List[Tuple[float, int]]]:
+    """Cumulative histogram buckets per stage from the app's /metrics"""
+    buckets: Dict[str, List[Tuple[float, int]]] = {}
+    for stage, bound, count in BUCKET_LINE.findall(httpx.get(f"{base_url}/metrics").text):
+        buckets.setdefault(stage, []).append((float(bound), int(count)))
+    return buckets
+
+
+def bucket_quantile(before: List[Tuple[float, int]], after: List[Tuple[float, int]], q: float) -> float:
+    """Quantile of the samples observed between two scrapes, interpolated like histogram_quantile()"""
+    deltas = [(bound, count - previous) for (bound, count), (_, previous) in zip(after, before)]
+    total = deltas[-1][1]
+    if not total:
+        return 0.0
+    rank = q * total
+    lower_bound, lower_count = 0.0, 0
+    for bound, count in deltas:
+        if count >= rank:
+            if bound == float("inf"):
+                return lower_bound
+            return lower_bound + (bound - lower_bound) * (rank - lower_count) / max(1, count - lower_count)
+        lower_bound, lower_count = bound, count
+    return lower_bound
+
+
+async def run_step(url: str, calls: int, turns: int, spawn_interval: float) -> List[SimulatedCall]:
+    utterance, noise = caller_audio()
+    sims = [SimulatedCall(url, f"CALOAD{calls:03d}{i:04d}", utterance, noise, turns=turns) for i in range(calls)]
+
+    async def start(sim: SimulatedCall, index: int):
+        # Stagger connects so calls do not all speak in lockstep
+        await asyncio.sleep(index * spawn_interval * random.uniform(0.5, 1.5))
+        await sim.run()
+
+    await asyncio.gather(*(start(sim, i) for i, sim in enumerate(sims)))
+    return sims
+
+
+def wait_until_up(url: str, process: subprocess.Popen, timeout: float = 30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{' '.join(process.args)} exited with {process.returncode}")
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up")
+
+
+def start_servers(args, target: str = "app.main:app", factory: bool = False,
+                  provider_url: Optional[str] = None) -> List[subprocess.Popen]:
+    """Provider stub and app in their own processes, so the load generator does not share their event loop.
+
+    `target` is the uvicorn app to serve, or with `factory` a function that returns it.
+    With `provider_url`, the app talks to providers already served there and no stub is started.
+    """
+    stub_url = provider_url or f"http://127.0.0.1:{args.stub_port}"
+    processes = []
+    if not provider_url:
+        processes.append(subprocess.Popen([
+            sys.executable, "-m", "benchmarks.stub_providers", "--port", str(args.stub_port),
+            "--latency", str(args.latency), "--jitter", str(args.jitter), "--error-rate", str(args.error_rate),
+            "--seed", "1",
+        ]))
+    env = dict(os.environ,
+               ELEVENLABS_BASE_URL=f"{stub_url}/v1", OPENAI_BASE_URL=f"{stub_url}/v1",
+               # The stub gives every turn the same reply; real replies would rarely hit the TTS cache
+               TTS_CACHE_ENABLED=os.getenv("TTS_CACHE_ENABLED", "false"),
+               ELEVENLABS_API_KEY=os.getenv("ELEVENLABS_API_KEY", "stub"),
+               OPENAI_API_KEY=os.getenv("OPENAI_API_KEY", "stub"),
+               TWILIO_ACCOUNT_SID=os.getenv("TWILIO_ACCOUNT_SID", "ACstub"),
+               TWILIO_AUTH_TOKEN=os.getenv("TWILIO_AUTH_TOKEN", "stub"),
+               TWILIO_PHONE_NUMBER=os.getenv("TWILIO_PHONE_NUMBER", "+15550000000"))
+    # The app logs every turn; keep its output out of the report unless asked for
+    output = None if args.app_logs else subprocess.DEVNULL
+    app = subprocess.Popen([
+        sys.executable, "-m", "uvicorn", target, "--host", "127.0.0.1", "--port", str(args.app_port),
+        "--log-level", "warning", *(["--factory"] if factory else []),
+    ], env=env, cwd=str(Path(__file__).parent.parent), stdout=output, stderr=output)
+    processes.append(app)
+    try:
+        if not provider_url:
+            wait_until_up(f"{stub_url}/docs", processes[0])
+        wait_until_up(f"http://127.0.0.1:{args.app_port}/", app)
+    except Exception:
+        stop_servers(processes)
+        raise
+    return processes
+
+
+def stop_servers(processes: List[subprocess.Popen]):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, nargs="+", default=[1, 5, 10, 20], help="Concurrency steps")
+    parser.add_argument("--turns", type=int, default=3, help="Caller turns per call")
+    parser.add_argument("--latency", type=float, default=0.2, help="Stub latency per provider request (s)")
+    parser.add_argument("--jitter", type=float, default=0.05, help="Mean extra stub latency, exponential (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of stub requests failing with 500")
+    parser.add_argument("--spawn-interval", type=float, default=0.05, help="Mean delay between call starts (s)")
+    parser.add_argument("--url", help="Target an already running app instead of starting one")
+    parser.add_argument("--app-port", type=int, default=8010)
+    parser.add_argument("--stub-port", type=int, default=8765)
+    parser.add_argument("--app-logs", action="store_true", help="Show the app's own log output")
+    args = parser.parse_args()
+
+    processes = [] if args.url else start_servers(args)
+    http_url = args.url or f"http://127.0.0.1:{args.app_port}"
+    ws_url = http_url.replace("http", "ws", 1)
+
+    print(f"Stub latency {args.latency:.3f}s + {args.jitter:.3f}s mean jitter, {args.error_rate:.1%} errors, "
+          f"{args.turns} turns per call")
+    print(f"{'calls':>5} {'turns':>6} {'p50 (s)':>8} {'p95 (s)':>8} {'p99 (s)':>8} {'timeouts':>8} "
+          f"{'late in':>8} {'underrun':>8} {'lag p99 (ms)':>12} {'errors':>6}")
+    try:
+        for calls in args.calls:
+            before = scrape_buckets(http_url)
+            sims = asyncio.run(run_step(ws_url, calls, args.turns, args.spawn_interval))
+            after = scrape_buckets(http_url)
+
+            latencies = [latency for sim in sims for latency in sim.turn_latencies]
+            lag = bucket_quantile(before["event_loop_lag"], after["event_loop_lag"], 0.99)
+            errors = [sim.error for sim in sims if sim.error]
+            p50, p95, p99 = (percentile(latencies, q) if latencies else float("nan") for q in (0.5, 0.95, 0.99))
+            print(f"{calls:>5} {len(latencies):>6} {p50:>8.3f} {p95:>8.3f} {p99:>8.3f} "
+                  f"{sum(sim.timeouts for sim in sims):>8} {sum(sim.late_frames for sim in sims):>8} "
+                  f"{sum(sim.underruns for sim in sims):>8} {lag * 1000:>12.1f} {len(errors):>6}")
+            for error in sorted(set(errors)):
+                print(f"  call error: {error}")
+    finally:
+        stop_servers(processes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""Replay recorded calls through a real `app.main` process, with providers answering from the recording.
+
+Each recording (CALL_RECORDING=true, see utils/recording.py) is replayed as
+its own call. Its inbound Twilio events go to `/ws/{call_sid}` at their
+recorded times divided by --speed, and marks are echoed once the agent
+audio before them would have played, as Twilio does. A stand-in answers
+provider requests with the recorded response for the same method, path and
+request body, in recorded order, at the recorded pace divided by --speed.
+Audio bodies come back as silence of the recorded size. Requests the
+recording has no answer for, such as the startup cache warm-up or an
+extra hedged request, go to the synthetic provider stub.
+
+The app runs under the pipeline settings saved in the recording unless
+--current-config is given. It records the replay too, so the report
+compares each turn's reply latency with the original. Above --speed 1 the
+app sends reply audio without real-time pacing. Provider waits shrink with
+the speed but on-box work does not, so only compare runs made at the same
+speed. Realtime STT (STREAMING_STT) runs over a WebSocket and is not
+recorded, so replays use batch STT.
+
+    CALL_RECORDING=true python -m benchmarks.load_test --calls 1 --turns 3   # make a recording
+    python -m benchmarks.replay recordings/CALOAD0010000.rec
+    python -m benchmarks.replay recordings/*.rec --speed 4 --copies 5
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import sys
+import tempfile
+from collections import Counter, deque
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import websockets
+
+from benchmarks.load_test import percentile, start_servers, stop_servers
+from benchmarks.stub_providers import StubServer, create_stub_app
+from utils.recording import EVENT, MEDIA, META, PROVIDER, TURN, body_fingerprint, provider_path, read_recording
+
+FRAME_SECONDS = 0.02
+
+
+class Recording:
+    """One recorded media stream: inbound events, provider exchanges and turn latencies"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.meta: Optional[dict] = None
+        self.inbound = []
+        self.exchanges: List[dict] = []
+        self.turns: List[dict] = []
+        for record in read_recording(path):
+            if record.kind == META:
+                if self.meta is not None:
+                    # The call reconnected and appended a second stream; replay the first
+                    break
+                self.meta = json.loads(record.payload)
+            elif record.kind in (MEDIA, EVENT):
+                self.inbound.append(record)
+            elif record.kind == PROVIDER:
+                self.exchanges.append(json.loads(record.payload))
+            elif record.kind == TURN:
+                self.turns.append(json.loads(record.payload))
+        if self.meta is None:
+            raise ValueError(f"{path} holds no recorded call")
+        self.call_sid = self.meta["call_sid"]
+        starts = [json.loads(record.payload) for record in self.inbound
+                  if record.kind == EVENT and b'"start"' in record.payload]
+        self.stream_sid = starts[0].get("streamSid", f"MZ{self.call_sid}") if starts else f"MZ{self.call_sid}"
+
+
+class ReplayProviders:
+    """ASGI app answering provider requests from recorded exchanges, falling back to `fallback`.
+
+    A request takes the first unused exchange with the same method, path and
+    body fingerprint, else the first unused one with the same method and path.
+    """
+
+    def __init__(self, exchanges: List[dict], speed: float, fallback):
+        self.speed = speed
+        self.fallback = fallback
+        self.by_body: Dict[Tuple, deque] = {}
+        self.by_path: Dict[Tuple, deque] = {}
+        self.used = set()
+        for serial, exchange in enumerate(exchanges):
+            key = (exchange["method"], provider_path(exchange["path"]))
+            self.by_body.setdefault(key + (exchange["fingerprint"],), deque()).append((serial, exchange))
+            self.by_path.setdefault(key, deque()).append((serial, exchange))
+        self.matched = 0
+        self.unmatched: Counter = Counter()
+
+    def take(self, method: str, path: str, fingerprint: str) -> Optional[dict]:
+        for queue in (self.by_body.get((method, path, fingerprint)), self.by_path.get((method, path))):
+            while queue:
+                serial, exchange = queue.popleft()
+                if serial not in self.used:
+                    self.used.add(serial)
+                    return exchange
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            # Lifespan and the realtime STT WebSocket
+            await self.fallback(scope, receive, send)
+            return
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        content_type = dict(scope["headers"]).get(b"content-type", b"").decode("latin-1")
+        path = provider_path(scope["path"])
+        exchange = self.take(scope["method"], path, body_fingerprint(body, content_type))
+        if exchange is None:
+            self.unmatched[path] += 1
+            sent = False
+
+            async def replay_body():
+                nonlocal sent
+                if sent:
+                    return await receive()
+                sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+
+            await self.fallback(scope, replay_body, send)
+            return
+        self.matched += 1
+        await self.respond(exchange, send)
+
+    async def respond(self, exchange: dict, send):
+        """Send the recorded response with its recorded header and chunk timing, scaled by the speed"""
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        if "status" not in exchange:
+            # The request failed without a response (timeout, reset); fail it after as long
+            await asyncio.sleep(exchange.get("duration", 0.0) / self.speed)
+            await send({"type": "http.response.start", "status": 503,
+                        "headers": [(b"content-type", b"application/json")]})
+            await send({"type": "http.response.body",
+                        "body": json.dumps({"error": f"recorded {exchange.get('error')}"}).encode()})
+            return
+        if "body" in exchange:
+            body = exchange["body"].encode()
+        else:
+            body = b"\xff" * exchange.get("bytes", 0)
+        await asyncio.sleep(exchange.get("headers_after", 0.0) / self.speed)
+        await send({"type": "http.response.start", "status": exchange["status"],
+                    "headers": [(b"content-type", exchange.get("content_type", "").encode("latin-1"))]})
+        offset = 0
+        for at, size in exchange.get("chunks") or []:
+            await asyncio.sleep(max(0.0, started + at / self.speed - loop.time()))
+            await send({"type": "http.response.body", "body": body[offset:offset + size], "more_body": True})
+            offset += size
+        await send({"type": "http.response.body", "body": body[offset:]})
+
+
+async def replay_call(ws_url: str, recording: Recording, speed: float, copy: int) -> str:
+    """Play one recording's inbound events into the app; returns the call SID used"""
+    call_sid = f"{recording.call_sid}-r{copy}"
+    loop = asyncio.get_running_loop()
+    playhead: List[Optional[float]] = [None]
+
+    async def echo_mark(ws, name: str, played_at: float):
+        await asyncio.sleep(max(0.0, played_at - loop.time()))
+        playhead[0] = None
+        try:
+            await ws.send(json.dumps({"event": "mark", "streamSid": recording.stream_sid, "mark": {"name": name}}))
+        except websockets.WebSocketException:
+            pass
+
+    async def receive(ws):
+        async for data in ws:
+            message = json.loads(data)
+            event = message.get("event")
+            now = loop.time()
+            if event == "media":
+                playhead[0] = max(playhead[0] or now, now) + FRAME_SECONDS / speed
+            elif event == "mark":
+                asyncio.create_task(echo_mark(ws, message["mark"]["name"], playhead[0] or now))
+            elif event == "clear":
+                playhead[0] = None
+
+    async with websockets.connect(f"{ws_url}/ws/{call_sid}", max_size=None) as ws:
+        receiver = asyncio.create_task(receive(ws))
+        started = loop.time()
+        for record in recording.inbound:
+            await asyncio.sleep(max(0.0, started + record.at / speed - loop.time()))
+            if record.kind == MEDIA:
+                message = {"event": "media", "streamSid": recording.stream_sid,
+                           "media": {"payload": base64.b64encode(record.payload).decode("ascii")}}
+            else:
+                message = json.loads(record.payload)
+                if message.get("event") == "mark":
+                    # Echoes of the original call's marks; this replay's own are echoed as they play
+                    continue
+            await ws.send(json.dumps(message))
+        # After `stop` the app closes the socket; a recording cut short by a disconnect just ends here
+        try:
+            await asyncio.wait_for(receiver, timeout=10.0)
+        except asyncio.TimeoutError:
+            receiver.cancel()
+    return call_sid
+
+
+def replay_turns(directory: Path, call_sid: str) -> List[dict]:
+    path = directory / f"{call_sid}.rec"
+    return Recording(path).turns if path.exists() else []
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("recordings", nargs="+", type=Path, help="Recording files (.rec)")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed; 1 is real time")
+    parser.add_argument("--copies", type=int, default=1, help="Concurrent replays of each recording")
+    parser.add_argument("--current-config", action="store_true",
+                        help="Run the app under the current environment, not the recorded settings")
+    parser.add_argument("--latency", type=float, default=0.2, help="Fallback stub latency per request (s)")
+    parser.add_argument("--app-port", type=int, default=8010)
+    parser.add_argument("--stub-port", type=int, default=8765)
+    parser.add_argument("--app-logs", action="store_true", help="Show the app's own log output")
+    args = parser.parse_args()
+
+    recordings = [Recording(path) for path in args.recordings]
+    exchanges = [exchange for recording in recordings for exchange in recording.exchanges] * args.copies
+    providers = ReplayProviders(exchanges, args.speed, create_stub_app(args.latency))
+
+    with tempfile.TemporaryDirectory() as replay_dir:
+        if not args.current_config:
+            for recording in recordings[:1]:
+                os.environ.update(recording.meta.get("config", {}))
+        os.environ.update(CALL_RECORDING="true", CALL_RECORDING_DIR=replay_dir, STREAMING_STT="false",
+                          TTS_CACHE_DIR=str(Path(replay_dir) / "tts"))
+        if args.speed > 1:
+            # Reply audio plays faster too: let the app send it as fast as it is ready
+            os.environ["PLAYBACK_LEAD_MS"] = str(10 ** 7)
+        server = StubServer(providers, port=args.stub_port).start()
+        processes = []
+        try:
+            processes = start_servers(args, provider_url=server.base_url)
+            ws_url = f"ws://127.0.0.1:{args.app_port}"
+
+            async def run_all():
+                return await asyncio.gather(*(replay_call(ws_url, recording, args.speed, copy)
+                                              for recording in recordings for copy in range(args.copies)))
+
+            call_sids = asyncio.run(run_all())
+        finally:
+            stop_servers(processes)
+            server.stop()
+        replayed = {call_sid: replay_turns(Path(replay_dir), call_sid) for call_sid in call_sids}
+
+    print(f"\nReplayed {len(recordings)} recording(s) x {args.copies} at {args.speed:g}x; provider requests: "
+          f"{providers.matched} answered from recordings, {sum(providers.unmatched.values())} by the fallback stub")
+    for path, count in providers.unmatched.most_common():
+        print(f"  unmatched {path}: {count}")
+    if len(args.recordings) > 1 and not args.current_config:
+        print(f"Pipeline settings from {args.recordings[0]}")
+    originals, replays = [], []
+    for recording in recordings:
+        print(f"\n{recording.path.name}: {len(recording.turns)} turns, first reply frame after end of speech (s)")
+        print(f"{'turn':>4} {'original':>8} {'replay':>8} {'diff':>7}")
+        turns = replayed.get(f"{recording.call_sid}-r0", [])
+        for index, original in enumerate(recording.turns):
+            replay = turns[index]["first_frame"] if index < len(turns) else None
+            diff = f"{replay - original['first_frame']:+7.3f}" if replay is not None else f"{'-':>7}"
+            print(f"{original['turn']:>4} {original['first_frame']:>8.3f} "
+                  f"{replay if replay is not None else float('nan'):>8.3f} {diff}")
+        originals += [turn["first_frame"] for turn in recording.turns]
+        for copy in range(args.copies):
+            replays += [turn["first_frame"] for turn in replayed.get(f"{recording.call_sid}-r{copy}", [])]
+    if originals and replays:
+        print(f"\nfirst reply frame p50/p95: original {percentile(originals, 0.5):.3f}/"
+              f"{percentile(originals, 0.95):.3f}s, replay {percentile(replays, 0.5):.3f}/"
+              f"{percentile(replays, 0.95):.3f}s over {len(replays)} replayed turns")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""Local stand-ins for the ElevenLabs and OpenAI HTTP APIs used by the benchmarks"""
+import argparse
+import asyncio
+import base64
+import json
+import random
+import struct
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.requests import ClientDisconnect
+
+REPLY_TEXT = ("Sure, I can help with that. Our office is open from nine to five on weekdays. "
+              "Is there anything else you would like to know?")
+TRANSCRIPT = "hello this is a test caller"
+
+
+def create_stub_app(latency: float = 0.2, token_interval: float = 0.02, chunk_interval: float = 0.05,
+                    jitter: float = 0.0, error_rate: float = 0.0, seed: Optional[int] = None,
+                    stt_rtf: float = 0.0, max_concurrency: int = 0, rate_limit: float = 0.0,
+                    slow_rate: float = 0.0, slow_latency: float = 0.0,
+                    model_latency: Optional[Dict[str, float]] = None) -> FastAPI:
+    """Build a stub app answering every provider request after `latency` seconds.
+
+    Streaming endpoints send their first piece after `latency`, then one LLM
+    token every `token_interval` or one audio chunk every `chunk_interval`.
+    TTS returns 500 bytes per character, roughly real speaking rate at 8 kHz.
+
+    `jitter` adds an exponentially distributed extra delay with that mean, so
+    a few requests are much slower than the rest, and `error_rate` of the
+    requests fail with HTTP 500 after the delay. `slow_rate` of the requests
+    stall for an extra `slow_latency` seconds, for a hard latency tail.
+    `model_latency` replaces `latency` for chat completions of the models it
+    names, and completions stop at the request's `max_tokens` words.
+
+    `stt_rtf` is the speech-to-text real-time factor: batch STT spends that
+    many seconds per second of uploaded audio on top of the latency, while
+    the realtime endpoint transcribes as audio arrives and only has the
+    last half second left when an utterance is committed.
+
+    `max_concurrency` and `rate_limit` (requests per second) apply to each
+    provider separately, like real account limits: requests beyond them are
+    answered at once with HTTP 429 and a Retry-After header.
+    """
+    stub = FastAPI()
+    stub.state.latency = latency
+    stub.state.token_interval = token_interval
+    stub.state.chunk_interval = chunk_interval
+    stub.state.jitter = jitter
+    stub.state.error_rate = error_rate
+    stub.state.stt_rtf = stt_rtf
+    stub.state.slow_rate = slow_rate
+    stub.state.slow_latency = slow_latency
+    stub.state.max_concurrency = max_concurrency
+    stub.state.rate_limit = rate_limit
+    stub.state.requests = 0
+    stub.state.errors = 0
+    stub.state.throttled = 0
+    rng = random.Random(seed)
+    in_flight = {"elevenlabs": 0, "openai": 0}
+    # Admission times over the last second, per provider
+    admitted = {"elevenlabs": deque(), "openai": deque()}
+
+    def tts_audio(text: str) -> bytes:
+        return b"\xff" * (len(text) * 500)
+
+    def delay(base: Optional[float] = None) -> float:
+        """Time to the first response byte for one request"""
+        seconds = stub.state.latency if base is None else base
+        if stub.state.jitter > 0:
+            seconds += rng.expovariate(1.0 / stub.state.jitter)
+        if stub.state.slow_rate and rng.random() < stub.state.slow_rate:
+            seconds += stub.state.slow_latency
+        return seconds
+
+    def admit(provider: str) -> Optional[Response]:
+        """Take a concurrency slot for `provider`, or return the 429 a limit calls for"""
+        now = time.monotonic()
+        window = admitted[provider]
+        while window and window[0] <= now - 1.0:
+            window.popleft()
+        if ((stub.state.max_concurrency and in_flight[provider] >= stub.state.max_concurrency)
+                or (stub.state.rate_limit and len(window) >= stub.state.rate_limit)):
+            stub.state.throttled += 1
+            wait = (window[0] + 1.0 - now) if stub.state.rate_limit and window else 0.1
+            return JSONResponse({"detail": "rate limit exceeded"}, status_code=429,
+                                headers={"Retry-After": f"{max(0.05, wait):.2f}"})
+        window.append(now)
+        in_flight[provider] += 1
+        return None
+
+    def release(provider: str):
+        in_flight[provider] -= 1
+
+    async def failure() -> Optional[Response]:
+        """Wait and return a 500 for the configured fraction of requests"""
+        if rng.random() >= stub.state.error_rate:
+            return None
+        stub.state.errors += 1
+        await asyncio.sleep(delay())
+        return JSONResponse({"detail": "stub provider error"}, status_code=500)
+
+    @stub.post("/v1/text-to-speech/{voice_id}")
+    async def text_to_speech(voice_id: str, request: Request):
+        body = await request.json()
+        stub.state.requests += 1
+        limited = admit("elevenlabs")
+        if limited:
+            return limited
+        try:
+            error = await failure()
+            if error:
+                return error
+            # Batch synthesis takes as long as streaming all the chunks
+            audio = tts_audio(body.get("text", ""))
+            chunks = max(1, len(audio) // 1600)
+            await asyncio.sleep(delay() + (chunks - 1) * stub.state.chunk_interval)
+            return Response(content=audio, media_type="audio/mpeg")
+        finally:
+            release("elevenlabs")
+
+    @stub.post("/v1/text-to-speech/{voice_id}/stream")
+    async def text_to_speech_stream(voice_id: str, request: Request):
+        body = await request.json()
+        stub.state.requests += 1
+        limited = admit("elevenlabs")
+        if limited:
+            return limited
+        error = await failure()
+        if error:
+            release("elevenlabs")
+            return error
+        audio = tts_audio(body.get("text", ""))
+
+        async def chunks():
+            # The slot is held until the last chunk is out
+            try:
+                await asyncio.sleep(delay())
+                for offset in range(0, len(audio), 1600):
+                    if offset:
+                        await asyncio.sleep(stub.state.chunk_interval)
+                    yield audio[offset:offset + 1600]
+            finally:
+                release("elevenlabs")
+
+        return StreamingResponse(chunks(), media_type="audio/mpeg")
+
+    @stub.post("/v1/speech-to-text")
+    async def speech_to_text(request: Request):
+        # A WAV inside the multipart body; its header gives the bytes per second (16-bit PCM or mu-law)
+        try:
+            body = await request.body()
+        except ClientDisconnect:
+            # A cancelled (e.g. hedged) upload
+            return Response(status_code=499)
+        fmt = body.find(b"fmt ")
+        byte_rate = struct.unpack_from("<I", body, fmt + 16)[0] if fmt >= 0 and len(body) >= fmt + 20 else 16000
+        audio_seconds = len(body) / (byte_rate or 16000)
+        stub.state.requests += 1
+        limited = admit("elevenlabs")
+        if limited:
+            return limited
+        try:
+            error = await failure()
+            if error:
+                return error
+            await asyncio.sleep(delay() + stub.state.stt_rtf * audio_seconds)
+            return {"text": TRANSCRIPT}
+        finally:
+            release("elevenlabs")
+
+    @stub.websocket("/v1/speech-to-text/realtime")
+    async def speech_to_text_realtime(websocket: WebSocket):
+        await websocket.accept()
+        await websocket.send_json({"message_type": "session_started"})
+        words = TRANSCRIPT.split()
+        # mu-law bytes since the last commit, and since the last partial transcript
+        pending = 0
+        untranscribed = 0
+        finals = []
+
+        async def finalize(tail_seconds: float):
+            await asyncio.sleep(delay() + stub.state.stt_rtf * tail_seconds)
+            await websocket.send_json({"message_type": "committed_transcript", "text": TRANSCRIPT})
+
+        try:
+            while True:
+                message = await websocket.receive_json()
+                audio = base64.b64decode(message.get("audio_base_64", ""))
+                pending += len(audio)
+                untranscribed += len(audio)
+                if message.get("commit"):
+                    stub.state.requests += 1
+                    finals.append(asyncio.create_task(finalize(untranscribed / 8000)))
+                    pending = untranscribed = 0
+                elif untranscribed >= 4000:
+                    # A partial every half second of audio, one more word each time
+                    untranscribed = 0
+                    spoken = min(len(words), pending // 4000)
+                    await websocket.send_json({"message_type": "partial_transcript",
+                                               "text": " ".join(words[:spoken])})
+        except WebSocketDisconnect:
+            pass
+        finally:
+            for task in finals:
+                task.cancel()
+
+    @stub.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stub.state.requests += 1
+        limited = admit("openai")
+        if limited:
+            return limited
+        error = await failure()
+        if error:
+            release("openai")
+            return error
+        model = body.get("model", "gpt-3.5-turbo")
+        # Whitespace-led tokens, the way the OpenAI tokenizer splits words
+        tokens = [word if i == 0 else f" {word}" for i, word in enumerate(REPLY_TEXT.split(" "))]
+        tokens = tokens[:body.get("max_tokens") or len(tokens)]
+        latency = (model_latency or {}).get(model)
+
+        if body.get("stream"):
+            async def events():
+                try:
+                    await asyncio.sleep(delay(latency))
+                    for i, token in enumerate(tokens):
+                        if i:
+                            await asyncio.sleep(stub.state.token_interval)
+                        chunk = {
+                            "id": "chatcmpl-stub",
+                            "object": "chat.completion.chunk",
+                            "created": int(time.time()),
+                            "model": model,
+                            "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]
+                        }
+                        yield f"data: {json.dumps(chunk)}\n\n"
+                    yield "data: [DONE]\n\n"
+                finally:
+                    release("openai")
+
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        try:
+            await asyncio.sleep(delay(latency) + (len(tokens) - 1) * stub.state.token_interval)
+        finally:
+            release("openai")
+        return JSONResponse({
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "".join(tokens)},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": 10, "completion_tokens": len(tokens), "total_tokens": 10 + len(tokens)}
+        })
+
+    return stub
+
+
+class StubServer:
+    """Runs a stub app with uvicorn on a background thread"""
+
+    def __init__(self, app: FastAPI, host: str = "127.0.0.1", port: int = 8765):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self) -> "StubServer":
+        self.thread.start()
+        deadline = time.time() + 10
+        while not self.server.started:
+            if time.time() > deadline:
+                raise RuntimeError(f"Stub server on port {self.port} did not start")
+            time.sleep(0.05)
+        return self
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the provider stub server")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds to wait before each response")
+    parser.add_argument("--token-interval", type=float, default=0.02, help="Seconds between streamed LLM tokens")
+    parser.add_argument("--chunk-interval", type=float, default=0.05, help="Seconds between streamed TTS chunks")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Mean extra delay per request, exponentially distributed")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 500")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--stt-rtf", type=float, default=0.0, help="STT seconds per second of audio")
+    parser.add_argument("--max-concurrency", type=int, default=0, help="Per-provider concurrent requests before 429")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Per-provider requests per second before 429")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Fraction of requests that stall")
+    parser.add_argument("--slow-latency", type=float, default=0.0, help="Extra seconds a stalled request takes")
+    args = parser.parse_args()
+    uvicorn.run(create_stub_app(args.latency, args.token_interval, args.chunk_interval,
+                                args.jitter, args.error_rate, args.seed, args.stt_rtf,
+                                args.max_concurrency, args.rate_limit, args.slow_rate, args.slow_latency),
+                host="127.0.0.1", port=args.port, log_level="warning")
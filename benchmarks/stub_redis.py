@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""Local stand-in for Redis, speaking RESP2, with just the commands the session store uses.
+
+Keeps everything in memory in one process, so several app workers can share
+session state in benchmarks and smoke tests without a Redis install:
+
+    python -m benchmarks.stub_redis --port 6390
+    SESSION_STORE=redis REDIS_URL=redis://127.0.0.1:6390/0 python -m app.main
+"""
+import argparse
+import asyncio
+import fnmatch
+import threading
+import time
+from typing import Dict, List, Optional
+
+
+class SimpleString(str):
+    pass
+
+
+class RedisError(Exception):
+    pass
+
+
+class StubRedis:
+    """Strings, hashes and sorted sets with key expiry; not persistent, not clustered"""
+
+    def __init__(self):
+        self.data: Dict[bytes, object] = {}
+        self.expires: Dict[bytes, float] = {}
+
+    def _live(self, key: bytes) -> Optional[object]:
+        expires_at = self.expires.get(key)
+        if expires_at is not None and expires_at <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return self.data.get(key)
+
+    def _typed(self, key: bytes, kind: type, create: bool = False):
+        value = self._live(key)
+        if value is None:
+            if not create:
+                return None
+            value = self.data[key] = kind()
+        if not isinstance(value, kind):
+            raise RedisError("WRONGTYPE Operation against a key holding the wrong kind of value")
+        return value
+
+    def execute(self, command: List[bytes]):
+        name, args = command[0].decode().upper(), command[1:]
+        handler = getattr(self, f"cmd_{name.lower()}", None)
+        if handler is None:
+            raise RedisError(f"ERR unknown command '{name}'")
+        return handler(*args)
+
+    def cmd_ping(self, *args):
+        return args[0] if args else SimpleString("PONG")
+
+    def cmd_client(self, *args):
+        # redis-py announces its name and version on connect
+        return SimpleString("OK")
+
+    def cmd_select(self, index):
+        return SimpleString("OK")
+
+    def cmd_flushall(self, *args):
+        self.data.clear()
+        self.expires.clear()
+        return SimpleString("OK")
+
+    def cmd_get(self, key):
+        return self._typed(key, bytes)
+
+    def cmd_set(self, key, value, *options):
+        self.data[key] = value
+        self.expires.pop(key, None)
+        options = [option.upper() for option in options]
+        for flag, scale in ((b"EX", 1.0), (b"PX", 0.001)):
+            if flag in options:
+                self.expires[key] = time.monotonic() + float(options[options.index(flag) + 1]) * scale
+        return SimpleString("OK")
+
+    def cmd_del(self, *keys):
+        removed = 0
+        for key in keys:
+            if self._live(key) is not None:
+                removed += 1
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return removed
+
+    def cmd_exists(self, *keys):
+        return sum(self._live(key) is not None for key in keys)
+
+    def cmd_expire(self, key, seconds):
+        if self._live(key) is None:
+            return 0
+        self.expires[key] = time.monotonic() + float(seconds)
+        return 1
+
+    def cmd_keys(self, pattern):
+        pattern = pattern.decode()
+        return [key for key in list(self.data) if self._live(key) is not None
+                and fnmatch.fnmatchcase(key.decode(), pattern)]
+
+    def cmd_hset(self, key, *pairs):
+        fields = self._typed(key, dict, create=True)
+        added = 0
+        for field, value in zip(pairs[::2], pairs[1::2]):
+            added += field not in fields
+            fields[field] = value
+        return added
+
+    def cmd_hgetall(self, key):
+        fields = self._typed(key, dict) or {}
+        return [item for pair in fields.items() for item in pair]
+
+    def cmd_zadd(self, key, *pairs):
+        members = self._typed(key, ZSet, create=True)
+        added = 0
+        for score, member in zip(pairs[::2], pairs[1::2]):
+            added += member not in members
+            members[member] = float(score)
+        return added
+
+    def cmd_zrem(self, key, *names):
+        members = self._typed(key, ZSet) or {}
+        return sum(members.pop(name, None) is not None for name in names)
+
+    def cmd_zcard(self, key):
+        return len(self._typed(key, ZSet) or {})
+
+    def cmd_zremrangebyscore(self, key, low, high):
+        members = self._typed(key, ZSet) or {}
+        low, high = float(low), float(high)
+        doomed = [name for name, score in members.items() if low <= score <= high]
+        for name in doomed:
+            del members[name]
+        return len(doomed)
+
+
+class ZSet(dict):
+    """Sorted set as member -> score; only counts and range deletes are needed, so no ordering is kept"""
+
+
+def encode(reply) -> bytes:
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, SimpleString):
+        return f"+{reply}\r\n".encode()
+    if isinstance(reply, bool) or isinstance(reply, int):
+        return f":{int(reply)}\r\n".encode()
+    if isinstance(reply, str):
+        reply = reply.encode()
+    if isinstance(reply, bytes):
+        return b"$%d\r\n%s\r\n" % (len(reply), reply)
+    if isinstance(reply, RedisError):
+        return f"-{reply}\r\n".encode()
+    return b"*%d\r\n" % len(reply) + b"".join(encode(item) for item in reply)
+
+
+async def read_command(reader: asyncio.StreamReader) -> Optional[List[bytes]]:
+    header = await reader.readline()
+    if not header:
+        return None
+    if not header.startswith(b"*"):
+        # Inline command, as typed into telnet
+        return header.split()
+    command = []
+    for _ in range(int(header[1:])):
+        length = int((await reader.readline())[1:])
+        command.append((await reader.readexactly(length + 2))[:-2])
+    return command
+
+
+class StubRedisServer:
+    """Runs a StubRedis on a background thread with its own event loop"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 6390):
+        self.host = host
+        self.port = port
+        self.redis = StubRedis()
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.server: Optional[asyncio.base_events.Server] = None
+
+    @property
+    def url(self) -> str:
+        return f"redis://{self.host}:{self.port}/0"
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                command = await read_command(reader)
+                if command is None:
+                    break
+                if not command:
+                    continue
+                try:
+                    reply = self.redis.execute(command)
+                except RedisError as e:
+                    reply = e
+                except (TypeError, ValueError, IndexError):
+                    reply = RedisError(f"ERR syntax error in {command[0].decode(errors='replace')}")
+                writer.write(encode(reply))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self):
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        return self.server
+
+    def start(self) -> "StubRedisServer":
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(self.serve(), self.loop).result(timeout=10)
+        return self
+
+    def stop(self):
+        async def shutdown():
+            self.server.close()
+            await self.server.wait_closed()
+        asyncio.run_coroutine_threadsafe(shutdown(), self.loop).result(timeout=5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=5)
+
+
+async def main(host: str, port: int):
+    server = StubRedisServer(host, port)
+    async with await server.serve():
+        print(f"Stub Redis listening on {server.url}")
+        await server.server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the Redis stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    args = parser.parse_args()
+    asyncio.run(main(args.host, args.port))
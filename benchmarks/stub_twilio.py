@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""Local stand-in for the Twilio REST calls API, playing out each call against the app.
+
+`POST /2010-04-01/Accounts/{sid}/Calls.json` answers with a call SID like
+Twilio does, then, after --ring-time, the call is busy, not answered or
+answered. An answered call fetches the app's TwiML webhook, connects the
+`<Stream>` it names and sends silent 20 ms media frames for --talk-time
+before `stop`. Final statuses go to the call's StatusCallback. `GET /stats`
+reports how many calls were created, the most created in any one second and
+the most in progress at once, to check the dialer's caps from outside:
+
+    python -m benchmarks.stub_twilio --port 8766 --answer-rate 0.7 --talk-time 5
+    TWILIO_API_BASE_URL=http://127.0.0.1:8766 python -m app.main
+"""
+import argparse
+import asyncio
+import base64
+import json
+import random
+import re
+import time
+import uuid
+from collections import deque
+from typing import Dict, Optional
+
+import httpx
+import uvicorn
+import websockets
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+SILENCE_FRAME = base64.b64encode(b"\xff" * 160).decode("ascii")
+STREAM_URL = re.compile(r'<Stream url="([^"]+)"')
+
+
+def create_stub_twilio_app(answer_rate: float = 0.7, busy_rate: float = 0.1, ring_time: float = 2.0,
+                           talk_time: float = 5.0, seed: Optional[int] = None) -> FastAPI:
+    """Twilio stand-in; anything not answered or busy ends as no-answer after ring_time"""
+    stub = FastAPI()
+    rng = random.Random(seed)
+    stub.state.created = 0
+    stub.state.outcomes: Dict[str, int] = {}
+    stub.state.in_progress = 0
+    stub.state.max_in_progress = 0
+    stub.state.max_per_second = 0
+    stub.state.errors = 0
+    created_at: deque = deque()
+    tasks = set()
+
+    def finish(outcome: str):
+        stub.state.in_progress -= 1
+        stub.state.outcomes[outcome] = stub.state.outcomes.get(outcome, 0) + 1
+
+    async def report(form: Dict[str, str], call_sid: str, status: str):
+        if form.get("StatusCallback"):
+            async with httpx.AsyncClient() as client:
+                await client.post(form["StatusCallback"], data={"CallSid": call_sid, "CallStatus": status})
+
+    async def drain_messages(ws):
+        async for _ in ws:
+            pass
+
+    async def media_stream(url: str, call_sid: str):
+        stream_sid = f"MZ{call_sid[2:]}"
+        async with websockets.connect(url, max_size=None) as ws:
+            # Read the agent's audio as it comes, or the close handshake waits behind it
+            drain = asyncio.create_task(drain_messages(ws))
+            await ws.send(json.dumps({"event": "start", "streamSid": stream_sid,
+                                      "start": {"streamSid": stream_sid, "callSid": call_sid}}))
+            loop = asyncio.get_running_loop()
+            next_frame = loop.time()
+            end = next_frame + talk_time
+            while next_frame < end:
+                await ws.send(json.dumps({"event": "media", "streamSid": stream_sid,
+                                          "media": {"payload": SILENCE_FRAME}}))
+                next_frame += 0.02
+                await asyncio.sleep(max(0.0, next_frame - loop.time()))
+            await ws.send(json.dumps({"event": "stop", "streamSid": stream_sid}))
+            drain.cancel()
+
+    async def play_call(call_sid: str, form: Dict[str, str]):
+        await asyncio.sleep(ring_time * rng.uniform(0.5, 1.5))
+        roll = rng.random()
+        if roll >= answer_rate:
+            status = "busy" if roll < answer_rate + busy_rate else "no-answer"
+            finish(status)
+            await report(form, call_sid, status)
+            return
+        status = "completed"
+        try:
+            async with httpx.AsyncClient() as client:
+                twiml = await client.post(form["Url"], data={"CallSid": call_sid, "From": form.get("From", ""),
+                                                             "To": form.get("To", "")})
+            await media_stream(STREAM_URL.search(twiml.text).group(1).replace("&amp;", "&"), call_sid)
+        except Exception as e:
+            print(f"stub twilio: call {call_sid} failed: {e}")
+            stub.state.errors += 1
+            status = "failed"
+        finish(status)
+        await report(form, call_sid, status)
+
+    @stub.post("/2010-04-01/Accounts/{account_sid}/Calls.json")
+    async def create_call(account_sid: str, request: Request):
+        form = dict(await request.form())
+        if not form.get("To") or not form.get("Url"):
+            return JSONResponse({"code": 21201, "message": "To and Url are required"}, status_code=400)
+        now = time.monotonic()
+        created_at.append(now)
+        while created_at[0] <= now - 1.0:
+            created_at.popleft()
+        stub.state.max_per_second = max(stub.state.max_per_second, len(created_at))
+        stub.state.created += 1
+        stub.state.in_progress += 1
+        stub.state.max_in_progress = max(stub.state.max_in_progress, stub.state.in_progress)
+
+        call_sid = f"CA{uuid.uuid4().hex}"
+        task = asyncio.create_task(play_call(call_sid, form))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        return JSONResponse({"sid": call_sid, "status": "queued", "to": form["To"]}, status_code=201)
+
+    @stub.get("/stats")
+    async def stats():
+        return {"created": stub.state.created, "in_progress": stub.state.in_progress,
+                "max_in_progress": stub.state.max_in_progress, "max_per_second": stub.state.max_per_second,
+                "outcomes": stub.state.outcomes, "errors": stub.state.errors}
+
+    return stub
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the Twilio REST stand-in")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--answer-rate", type=float, default=0.7, help="Fraction of calls answered")
+    parser.add_argument("--busy-rate", type=float, default=0.1, help="Fraction of calls busy; the rest ring out")
+    parser.add_argument("--ring-time", type=float, default=2.0, help="Mean seconds before a call is answered or fails")
+    parser.add_argument("--talk-time", type=float, default=5.0, help="Seconds an answered call streams media")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    uvicorn.run(create_stub_twilio_app(args.answer_rate, args.busy_rate, args.ring_time, args.talk_time, args.seed),
+                host="127.0.0.1", port=args.port, log_level="warning")
@@ -0,0 +1,50 @@
+"""Deterministic speech-like telephone audio for benchmarks and load tests"""
+from typing import List, Tuple
+
+import numpy as np
+
+from utils.audio import pcm16_to_mulaw
+
+SAMPLE_RATE = 8000
+
+
+def synthesize_call(duration_s: float, seed: int = 0, noise_db: float = -60.0) -> Tuple[np.ndarray, List[Tuple[float, float]]]:
+    """Return 8 kHz PCM16 audio alternating phrases and pauses, plus the phrase (start, end) times.
+
+    Phrases are runs of voiced "syllables" (harmonic tones with a short
+    envelope) separated by brief intra-phrase gaps, like words in speech.
+    """
+    rng = np.random.default_rng(seed)
+    total = int(duration_s * SAMPLE_RATE)
+    audio = rng.normal(0.0, 32768.0 * 10 ** (noise_db / 20.0), total)
+    phrases: List[Tuple[float, float]] = []
+
+    position = int(rng.uniform(0.5, 1.5) * SAMPLE_RATE)
+    while position < total:
+        phrase_end = min(total, position + int(rng.uniform(1.5, 5.0) * SAMPLE_RATE))
+        phrase_start = position
+        f0 = rng.uniform(110.0, 220.0)
+        while position < phrase_end:
+            length = int(rng.uniform(0.12, 0.3) * SAMPLE_RATE)
+            length = min(length, total - position)
+            t = np.arange(length) / SAMPLE_RATE
+            pitch = f0 * (1.0 + 0.05 * np.sin(2 * np.pi * rng.uniform(2, 5) * t))
+            phase = 2 * np.pi * np.cumsum(pitch) / SAMPLE_RATE
+            voiced = sum(np.sin(k * phase) / k for k in range(1, 6))
+            envelope = np.sin(np.pi * np.arange(length) / max(1, length)) ** 0.5
+            level = 32768.0 * 10 ** (rng.uniform(-24.0, -14.0) / 20.0)
+            audio[position:position + length] += level * envelope * voiced / 2.3
+            position += length + int(rng.uniform(0.03, 0.15) * SAMPLE_RATE)
+        phrases.append((phrase_start / SAMPLE_RATE, min(position, total) / SAMPLE_RATE))
+        position += int(rng.uniform(0.9, 3.0) * SAMPLE_RATE)
+
+    return np.clip(audio, -32768, 32767).astype(np.int16), phrases
+
+
+def to_mulaw(pcm: np.ndarray) -> bytes:
+    return pcm16_to_mulaw(pcm)
+
+
+def frames(mulaw: bytes, frame_bytes: int = 160) -> List[bytes]:
+    """Split mu-law audio into 20 ms Twilio media frames"""
+    return [mulaw[i:i + frame_bytes] for i in range(0, len(mulaw), frame_bytes)]
@@ -0,0 +1,148 @@
+"""Simulated Twilio Media Streams client for load tests.
+
+Each SimulatedCall connects to `/ws/{call_sid}` like Twilio does, sends
+`start`, then one 160-byte mu-law `media` frame every 20 ms for the whole
+call: a caller utterance, background noise while the agent replies, a
+pause, and so on for each turn, then `stop`. Agent audio is played out on a
+simulated jitter buffer so gaps in the reply show up as underruns, and
+`mark` events are echoed when playback reaches them, as Twilio does.
+"""
+import asyncio
+import base64
+import itertools
+import json
+from typing import List, Optional, Tuple
+
+import websockets
+
+from benchmarks.synthetic_audio import SAMPLE_RATE, frames, synthesize_call, to_mulaw
+
+FRAME_SECONDS = 0.02
+
+
+def caller_audio(seed: int = 0) -> Tuple[List[bytes], List[bytes]]:
+    """One spoken phrase and a stretch of line noise, as 20 ms mu-law frames"""
+    pcm, phrases = synthesize_call(10.0, seed=seed)
+    start, end = phrases[0]
+    mulaw = to_mulaw(pcm)
+    utterance = frames(mulaw[int(max(0.0, start - 0.1) * SAMPLE_RATE):int(end * SAMPLE_RATE)])
+    noise = frames(mulaw[:int(start * SAMPLE_RATE) // 160 * 160])
+    return utterance, noise
+
+
+class SimulatedCall:
+    """One caller: real-time paced inbound audio, timed replies and playback underruns"""
+
+    def __init__(self, url: str, call_sid: str, utterance: List[bytes], noise: List[bytes],
+                 turns: int = 3, pause: float = 1.0, turn_timeout: float = 15.0):
+        self.url = url
+        self.call_sid = call_sid
+        self.stream_sid = f"MZ{call_sid}"
+        self.utterance = utterance
+        self.noise = itertools.cycle(noise)
+        self.turns = turns
+        self.pause = pause
+        self.turn_timeout = turn_timeout
+
+        self.turn_latencies: List[float] = []
+        self.timeouts = 0
+        self.frames_sent = 0
+        self.late_frames = 0
+        self.frames_received = 0
+        self.underruns = 0
+        self.error: Optional[str] = None
+
+        # End of the current utterance until the first reply frame arrives
+        self._speech_ended_at: Optional[float] = None
+        self._reply_done = asyncio.Event()
+        self._playhead: Optional[float] = None
+        self._next_frame_at = 0.0
+
+    async def run(self):
+        try:
+            async with websockets.connect(f"{self.url}/ws/{self.call_sid}", max_size=None) as ws:
+                await ws.send(json.dumps({
+                    "event": "start",
+                    "streamSid": self.stream_sid,
+                    "start": {"streamSid": self.stream_sid, "callSid": self.call_sid,
+                              "mediaFormat": {"encoding": "audio/x-mulaw", "sampleRate": SAMPLE_RATE, "channels": 1}}
+                }))
+                receiver = asyncio.create_task(self._receive(ws))
+                try:
+                    await self._talk(ws)
+                    await ws.send(json.dumps({"event": "stop", "streamSid": self.stream_sid}))
+                finally:
+                    receiver.cancel()
+                    await asyncio.gather(receiver, return_exceptions=True)
+        except (OSError, websockets.WebSocketException) as e:
+            self.error = f"{type(e).__name__}: {e}"
+
+    async def _talk(self, ws):
+        loop = asyncio.get_running_loop()
+        self._next_frame_at = loop.time()
+        for _ in range(self.turns):
+            for frame in self.utterance:
+                await self._send_frame(ws, frame)
+            self._speech_ended_at = loop.time()
+            self._reply_done.clear()
+
+            # Keep streaming line noise while the agent answers, like a real phone line
+            deadline = self._speech_ended_at + self.turn_timeout
+            while not self._reply_done.is_set():
+                if loop.time() > deadline:
+                    self.timeouts += 1
+                    self._speech_ended_at = None
+                    break
+                await self._send_frame(ws, next(self.noise))
+
+            for _ in range(int(self.pause / FRAME_SECONDS)):
+                await self._send_frame(ws, next(self.noise))
+
+    async def _send_frame(self, ws, frame: bytes):
+        """Send on a fixed 20 ms schedule; frames more than one period late count as late"""
+        loop = asyncio.get_running_loop()
+        delay = self._next_frame_at - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        elif -delay > FRAME_SECONDS:
+            self.late_frames += 1
+        self._next_frame_at += FRAME_SECONDS
+        await ws.send(json.dumps({
+            "event": "media",
+            "streamSid": self.stream_sid,
+            "media": {"payload": base64.b64encode(frame).decode("ascii")}
+        }))
+        self.frames_sent += 1
+
+    async def _receive(self, ws):
+        loop = asyncio.get_running_loop()
+        async for data in ws:
+            message = json.loads(data)
+            event = message.get("event")
+            now = loop.time()
+
+            if event == "media":
+                self.frames_received += 1
+                if self._speech_ended_at is not None:
+                    self.turn_latencies.append(now - self._speech_ended_at)
+                    self._speech_ended_at = None
+                # A frame arriving after the previous one finished playing is an audible gap
+                if self._playhead is not None and now > self._playhead + FRAME_SECONDS:
+                    self.underruns += 1
+                self._playhead = max(self._playhead or now, now) + FRAME_SECONDS
+
+            elif event == "mark":
+                asyncio.create_task(self._echo_mark(ws, message["mark"]["name"], self._playhead or now))
+
+            elif event == "clear":
+                self._playhead = None
+
+    async def _echo_mark(self, ws, name: str, played_at: float):
+        """Twilio echoes a mark once everything sent before it has played"""
+        await asyncio.sleep(max(0.0, played_at - asyncio.get_running_loop().time()))
+        self._playhead = None
+        self._reply_done.set()
+        try:
+            await ws.send(json.dumps({"event": "mark", "streamSid": self.stream_sid, "mark": {"name": name}}))
+        except websockets.WebSocketException:
+            pass
@@ -0,0 +1,297 @@
+"""Durable call analytics: transcripts, per-turn stage timings and provider usage.
+
+Calls and turns are handed to `AnalyticsWriter.record_*` on the event loop,
+which only appends a row to a list. Rows are written in batches every
+ANALYTICS_FLUSH_MS or ANALYTICS_BATCH_SIZE rows by a single thread that owns
+the store, so a slow disk never holds up a call. If the writer falls more
+than ANALYTICS_MAX_PENDING rows behind, new rows are dropped and counted.
+Queries run on the same thread, behind the rows already queued.
+
+Usage is what the pipeline can count itself: estimated LLM prompt and
+completion tokens of each reply, characters sent to TTS and seconds of
+caller audio transcribed. Each turn's LLM cost is priced at its route's
+prices from the routing rules; cost per call adds TTS and STT at the
+PRICE_* settings.
+"""
+import asyncio
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from utils.env_loader import load_env
+from utils.metrics import metrics
+
+load_env(override=True)
+
+CALL_COLUMNS = ("call_sid", "started_at", "ended_at", "caller", "called", "direction", "worker", "turns",
+                "barge_ins", "prompt_tokens", "completion_tokens", "llm_cost", "tts_chars", "stt_seconds")
+TURN_COLUMNS = ("call_sid", "turn", "started_at", "user_text", "assistant_text", "route", "interrupted", "speculative",
+                "stt", "llm_first_token", "first_audio", "first_frame", "perceived_first_frame",
+                "prompt_tokens", "completion_tokens", "llm_cost", "tts_chars", "stt_seconds")
+# Turn latencies the slowest-turns query can rank by, in seconds from the end of caller speech
+# (llm_first_token is from the LLM request); first_frame is indexed
+TURN_STAGES = ("first_frame", "perceived_first_frame", "first_audio", "stt", "llm_first_token")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS calls (
+    call_sid TEXT PRIMARY KEY,
+    started_at REAL NOT NULL,
+    ended_at REAL,
+    caller TEXT,
+    called TEXT,
+    direction TEXT,
+    worker TEXT,
+    turns INTEGER NOT NULL DEFAULT 0,
+    barge_ins INTEGER NOT NULL DEFAULT 0,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    llm_cost REAL,
+    tts_chars INTEGER NOT NULL DEFAULT 0,
+    stt_seconds REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS calls_started_at ON calls (started_at);
+CREATE TABLE IF NOT EXISTS turns (
+    call_sid TEXT NOT NULL,
+    turn INTEGER NOT NULL,
+    started_at REAL NOT NULL,
+    user_text TEXT,
+    assistant_text TEXT,
+    route TEXT,
+    interrupted INTEGER NOT NULL DEFAULT 0,
+    speculative INTEGER NOT NULL DEFAULT 0,
+    stt REAL,
+    llm_first_token REAL,
+    first_audio REAL,
+    first_frame REAL,
+    perceived_first_frame REAL,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    llm_cost REAL,
+    tts_chars INTEGER NOT NULL DEFAULT 0,
+    stt_seconds REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (call_sid, turn)
+);
+CREATE INDEX IF NOT EXISTS turns_first_frame ON turns (first_frame);
+"""
+# Columns added since a table was first created, added to existing databases on open
+ADDED_COLUMNS = {"calls": {"llm_cost": "REAL"}, "turns": {"route": "TEXT", "llm_cost": "REAL"}}
+
+
+def prices() -> Dict[str, float]:
+    """Provider prices in USD, per million LLM tokens, thousand TTS characters and hour of STT audio"""
+    return {
+        "llm_input": float(os.getenv("PRICE_LLM_INPUT_PER_MTOK", "0.5")),
+        "llm_output": float(os.getenv("PRICE_LLM_OUTPUT_PER_MTOK", "1.5")),
+        "tts": float(os.getenv("PRICE_TTS_PER_1K_CHARS", "0.3")),
+        "stt": float(os.getenv("PRICE_STT_PER_HOUR", "0.4")),
+    }
+
+
+class AnalyticsStore:
+    """Where call and turn rows are kept. Every method runs on the writer thread and may block."""
+
+    def write(self, calls: List[Dict[str, Any]], turns: List[Dict[str, Any]]):
+        """Insert or replace a batch of rows; a call or turn written again replaces the earlier row"""
+        raise NotImplementedError
+
+    def slowest_turns(self, stage: str, limit: int, since: float) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def call_costs(self, limit: int, since: float, order: str, prices: Dict[str, float]) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def call(self, call_sid: str, prices: Dict[str, float]) -> Optional[Dict[str, Any]]:
+        """One call with its cost and its turns in order"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SQLiteAnalyticsStore(AnalyticsStore):
+    """A local SQLite file in WAL mode, so reads do not wait behind a batch being written"""
+
+    # LLM cost as recorded at each route's prices; rows written before it was recorded fall back to PRICE_LLM_*
+    COST = ("COALESCE(llm_cost, prompt_tokens * :llm_input / 1e6 + completion_tokens * :llm_output / 1e6)"
+            " + tts_chars * :tts / 1e3 + stt_seconds * :stt / 3600")
+
+    def __init__(self, path: str):
+        self.path = path
+        self.db: Optional[sqlite3.Connection] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        # Opened on first use, on the writer thread that will use it from then on
+        if self.db is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            self.db = sqlite3.connect(self.path, check_same_thread=False)
+            self.db.row_factory = sqlite3.Row
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.executescript(SCHEMA)
+            for table, columns in ADDED_COLUMNS.items():
+                existing = {row["name"] for row in self.db.execute(f"PRAGMA table_info({table})")}
+                for column, kind in columns.items():
+                    if column not in existing:
+                        self.db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {kind}")
+        return self.db
+
+    @staticmethod
+    def _insert(table: str, columns: tuple) -> str:
+        return (f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) "
+                f"VALUES ({', '.join(':' + column for column in columns)})")
+
+    def write(self, calls: List[Dict[str, Any]], turns: List[Dict[str, Any]]):
+        db = self._connection()
+        with db:
+            if turns:
+                db.executemany(self._insert("turns", TURN_COLUMNS),
+                               [{column: row.get(column) for column in TURN_COLUMNS} for row in turns])
+            if calls:
+                db.executemany(self._insert("calls", CALL_COLUMNS),
+                               [{column: row.get(column) for column in CALL_COLUMNS} for row in calls])
+
+    def slowest_turns(self, stage: str, limit: int, since: float) -> List[Dict[str, Any]]:
+        if stage not in TURN_STAGES:
+            raise ValueError(f"Unknown stage {stage!r}, expected one of {', '.join(TURN_STAGES)}")
+        rows = self._connection().execute(
+            f"SELECT * FROM turns WHERE {stage} IS NOT NULL AND started_at >= ? ORDER BY {stage} DESC LIMIT ?",
+            (since, limit))
+        return [dict(row) for row in rows]
+
+    def call_costs(self, limit: int, since: float, order: str, prices: Dict[str, float]) -> List[Dict[str, Any]]:
+        order_by = {"recent": "started_at DESC", "cost": "cost DESC"}.get(order)
+        if order_by is None:
+            raise ValueError(f"Unknown order {order!r}, expected 'recent' or 'cost'")
+        rows = self._connection().execute(
+            f"SELECT *, {self.COST} AS cost FROM calls WHERE started_at >= :since ORDER BY {order_by} LIMIT :limit",
+            dict(prices, since=since, limit=limit))
+        return [dict(row) for row in rows]
+
+    def call(self, call_sid: str, prices: Dict[str, float]) -> Optional[Dict[str, Any]]:
+        db = self._connection()
+        row = db.execute(f"SELECT *, {self.COST} AS cost FROM calls WHERE call_sid = :call_sid",
+                         dict(prices, call_sid=call_sid)).fetchone()
+        turns = [dict(turn) for turn in db.execute("SELECT * FROM turns WHERE call_sid = ? ORDER BY turn",
+                                                   (call_sid,))]
+        if row is None and not turns:
+            return None
+        call = dict(row) if row else {"call_sid": call_sid}
+        call["transcript"] = turns
+        return call
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+
+class AnalyticsWriter:
+    """Batches rows on the event loop and hands them to the store's own thread"""
+
+    def __init__(self, store: AnalyticsStore, flush_interval: float, batch_size: int, max_pending: int):
+        self.store = store
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.calls: List[Dict[str, Any]] = []
+        self.turns: List[Dict[str, Any]] = []
+        # Rows handed to the thread and not yet written
+        self.in_flight = 0
+        self.executor = ThreadPoolExecutor(1, thread_name_prefix="analytics")
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+    def _add(self, rows: list, row: Dict[str, Any]):
+        if self.in_flight + len(self.calls) + len(self.turns) >= self.max_pending:
+            metrics.increment("analytics_dropped_rows")
+            return
+        rows.append(row)
+        if len(self.calls) + len(self.turns) >= self.batch_size:
+            self.flush()
+        elif self.timer is None:
+            self.timer = asyncio.get_running_loop().call_later(self.flush_interval, self.flush)
+
+    def record_turn(self, row: Dict[str, Any]):
+        self._add(self.turns, row)
+
+    def record_call(self, row: Dict[str, Any]):
+        self._add(self.calls, row)
+
+    def flush(self):
+        """Hand the pending rows to the writer thread"""
+        if self.timer:
+            self.timer.cancel()
+            self.timer = None
+        if not self.calls and not self.turns:
+            return
+        calls, turns = self.calls, self.turns
+        self.calls, self.turns = [], []
+        size = len(calls) + len(turns)
+        self.in_flight += size
+        future = asyncio.get_running_loop().run_in_executor(self.executor, self._write, calls, turns)
+        future.add_done_callback(lambda done: self._written(done, size))
+
+    def _write(self, calls: List[Dict[str, Any]], turns: List[Dict[str, Any]]) -> float:
+        # Runs on the writer thread
+        started = time.perf_counter()
+        self.store.write(calls, turns)
+        return time.perf_counter() - started
+
+    def _written(self, future: asyncio.Future, size: int):
+        self.in_flight -= size
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            print(f"❌ Analytics write of {size} rows failed: {future.exception()}")
+            metrics.increment("analytics_errors")
+        else:
+            metrics.observe("analytics_write", future.result())
+            metrics.increment("analytics_rows", size)
+
+    async def query(self, method, *args):
+        """Run a store query on the writer thread, after the rows recorded so far are written"""
+        self.flush()
+        return await asyncio.get_running_loop().run_in_executor(self.executor, method, *args)
+
+    async def slowest_turns(self, stage: str = "first_frame", limit: int = 20, since: float = 0.0):
+        return await self.query(self.store.slowest_turns, stage, limit, since)
+
+    async def call_costs(self, limit: int = 50, since: float = 0.0, order: str = "recent"):
+        return await self.query(self.store.call_costs, limit, since, order, prices())
+
+    async def call(self, call_sid: str):
+        return await self.query(self.store.call, call_sid, prices())
+
+    async def close(self):
+        """Write out what is pending and close the store"""
+        await self.query(self.store.close)
+        self.executor.shutdown(wait=True)
+
+
+_analytics: Optional[AnalyticsWriter] = None
+
+
+def get_analytics() -> Optional[AnalyticsWriter]:
+    """Return the process-wide analytics writer from ANALYTICS_STORE, or None when it is `none`"""
+    global _analytics
+    if _analytics is None:
+        backend = os.getenv("ANALYTICS_STORE", "sqlite").lower()
+        if backend == "none":
+            return None
+        if backend == "sqlite":
+            store = SQLiteAnalyticsStore(os.getenv("ANALYTICS_DB", "analytics.db"))
+        else:
+            raise ValueError(f"Unknown ANALYTICS_STORE {backend!r}, expected 'sqlite' or 'none'")
+        _analytics = AnalyticsWriter(store, int(os.getenv("ANALYTICS_FLUSH_MS", "1000")) / 1000,
+                                     int(os.getenv("ANALYTICS_BATCH_SIZE", "200")),
+                                     int(os.getenv("ANALYTICS_MAX_PENDING", "10000")))
+    return _analytics
+
+
+async def close_analytics():
+    global _analytics
+    if _analytics is not None:
+        await _analytics.close()
+        _analytics = None
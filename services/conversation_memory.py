@@ -0,0 +1,100 @@
+import asyncio
+import time
+from typing import Dict, List, Optional
+
+from services.model_router import Route
+
+# Chat formatting adds a few tokens per message on top of the content
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count (about 4 characters per token for English), without a tokenizer"""
+    return len(text) // 4 + 1
+
+
+def message_tokens(message: Dict) -> int:
+    return estimate_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+
+class ConversationMemory:
+    """One call's chat history, kept under a token budget.
+
+    Recent messages are sent verbatim. Once they exceed `token_budget`, the
+    oldest turns are handed out by `take_overflow()` to be folded into a
+    running summary, which is sent as a second system message in their place.
+    Until the summary arrives those turns stay in the prompt, so no context is
+    lost while it is generated.
+    """
+
+    def __init__(self, system_prompt: str, token_budget: int = 1000):
+        self.system_prompt = system_prompt
+        self.token_budget = token_budget
+        self.summary = ""
+        self.messages: List[Dict] = []
+        self.last_used = time.monotonic()
+        self.summarizing: Optional[asyncio.Task] = None
+        # Write-behind to the session store: one save at a time, repeated while `dirty`
+        self.saving: Optional[asyncio.Task] = None
+        self.dirty = False
+        # Leading messages currently being summarized
+        self._pending = 0
+        # How the latest reply was produced (canned, small, full), for analytics
+        self.route: Optional[Route] = None
+
+    def state(self) -> Dict:
+        """JSON-serializable snapshot for the session store"""
+        return {"summary": self.summary, "messages": [dict(message) for message in self.messages]}
+
+    def restore(self, state: Dict):
+        self.summary = state.get("summary", "")
+        self.messages = list(state.get("messages", []))
+
+    def add(self, role: str, content: str):
+        self.messages.append({"role": role, "content": content})
+        self.last_used = time.monotonic()
+
+    def prompt(self) -> List[Dict]:
+        """Messages to send for the next completion"""
+        prompt = [{"role": "system", "content": self.system_prompt}]
+        if self.summary:
+            prompt.append({"role": "system", "content": f"Summary of the call so far: {self.summary}"})
+        return prompt + self.messages
+
+    def prompt_tokens(self) -> int:
+        return sum(message_tokens(message) for message in self.prompt())
+
+    def window_tokens(self) -> int:
+        return sum(message_tokens(message) for message in self.messages)
+
+    def take_overflow(self) -> List[Dict]:
+        """Oldest turns to summarize once the window is over budget, or [] if none are due"""
+        if self._pending or self.window_tokens() <= self.token_budget:
+            return []
+
+        # Keep the newest messages that fit in half the budget, so summaries are not needed every turn
+        kept = 0
+        cut = len(self.messages)
+        while cut > 0 and kept + message_tokens(self.messages[cut - 1]) <= self.token_budget // 2:
+            cut -= 1
+            kept += message_tokens(self.messages[cut])
+        # Cut on a turn boundary and always keep the latest exchange
+        cut = min(max(cut, 1), len(self.messages) - 2)
+        while 0 < cut < len(self.messages) and self.messages[cut]["role"] != "user":
+            cut += 1
+        if cut <= 0 or cut > len(self.messages) - 2:
+            return []
+
+        self._pending = cut
+        return self.messages[:cut]
+
+    def apply_summary(self, summary: str):
+        """Replace the summarized turns with the new running summary"""
+        del self.messages[:self._pending]
+        self._pending = 0
+        self.summary = summary
+
+    def drop_overflow(self):
+        """Summarizing failed: drop the oldest turns anyway so the history stays bounded"""
+        del self.messages[:self._pending]
+        self._pending = 0
@@ -0,0 +1,262 @@
+import asyncio
+import csv
+import io
+import os
+import re
+import time
+import uuid
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from services.scheduler import ProviderScheduler
+from utils.env_loader import load_env
+from utils.metrics import metrics
+
+load_env(override=True)
+
+# Per-number states; every state after DIALING is final except CONNECTED
+QUEUED = "queued"
+DIALING = "dialing"
+CONNECTED = "connected"
+COMPLETED = "completed"
+NO_ANSWER = "no_answer"
+BUSY = "busy"
+FAILED = "failed"
+CANCELED = "canceled"
+STATES = (QUEUED, DIALING, CONNECTED, COMPLETED, NO_ANSWER, BUSY, FAILED, CANCELED)
+FINAL_STATES = {COMPLETED, NO_ANSWER, BUSY, FAILED, CANCELED}
+
+# Twilio's final CallStatus values
+TWILIO_STATUSES = {"completed": COMPLETED, "no-answer": NO_ANSWER, "busy": BUSY, "failed": FAILED,
+                   "canceled": CANCELED}
+
+E164 = re.compile(r"^\+[1-9]\d{6,14}$")
+NUMBER_COLUMNS = ("phone_number", "phone", "number", "to")
+
+
+def normalize_number(value: str) -> Optional[str]:
+    """E.164 form of a phone number, or None if it does not look like one"""
+    number = re.sub(r"[\s().-]", "", value or "")
+    return number if E164.match(number) else None
+
+
+def parse_numbers(values: Iterable[str]) -> Tuple[List[str], List[str]]:
+    """Valid numbers in order without duplicates, and the values that were not numbers"""
+    numbers: List[str] = []
+    seen: Set[str] = set()
+    invalid: List[str] = []
+    for value in values:
+        number = normalize_number(value)
+        if number is None:
+            invalid.append(value)
+        elif number not in seen:
+            seen.add(number)
+            numbers.append(number)
+    return numbers, invalid
+
+
+def numbers_from_csv(text: str) -> Tuple[List[str], List[str]]:
+    """Numbers from a CSV: the phone_number / phone / number / to column if there is a header, else the first"""
+    rows = [row for row in csv.reader(io.StringIO(text)) if row and any(cell.strip() for cell in row)]
+    if not rows:
+        return [], []
+    header = [cell.strip().lower() for cell in rows[0]]
+    column = next((header.index(name) for name in NUMBER_COLUMNS if name in header), None)
+    if column is not None:
+        rows = rows[1:]
+    elif normalize_number(rows[0][0]) is None:
+        # A header without a recognized column name
+        rows = rows[1:]
+    return parse_numbers(row[column or 0] if len(row) > (column or 0) else "" for row in rows)
+
+
+class Campaign:
+    """A list of numbers to dial, with each number's state and the timing needed for throughput stats"""
+
+    def __init__(self, numbers: List[str], name: Optional[str] = None):
+        self.id = f"CP{uuid.uuid4().hex[:16]}"
+        self.name = name or self.id
+        self.numbers = numbers
+        self.states = [QUEUED] * len(numbers)
+        self.errors: Dict[int, str] = {}
+        self.counts = Counter({QUEUED: len(numbers)})
+        self.dialed = 0
+        self.created_at = time.time()
+        self.first_dial_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.cancelled = False
+
+    def set_state(self, index: int, state: str):
+        self.counts[self.states[index]] -= 1
+        self.counts[state] += 1
+        self.states[index] = state
+        if state == DIALING:
+            self.dialed += 1
+            if self.first_dial_at is None:
+                self.first_dial_at = time.time()
+        if self.done and self.finished_at is None:
+            self.finished_at = time.time()
+
+    @property
+    def done(self) -> bool:
+        return sum(self.counts[state] for state in FINAL_STATES) == len(self.numbers)
+
+    def stats(self) -> Dict:
+        elapsed = ((self.finished_at or time.time()) - self.first_dial_at) if self.first_dial_at else 0.0
+        rate = self.dialed / elapsed if elapsed > 0 else 0.0
+        return {
+            "campaign_id": self.id,
+            "name": self.name,
+            "status": "cancelled" if self.cancelled else "finished" if self.done else "running",
+            "total": len(self.numbers),
+            "states": {state: self.counts[state] for state in STATES},
+            "dialed": self.dialed,
+            "elapsed_seconds": round(elapsed, 3),
+            "dials_per_second": round(rate, 3),
+            "eta_seconds": round(self.counts[QUEUED] / rate, 1) if rate and not self.done else None,
+            "errors": list(self.errors.values())[-10:],
+        }
+
+
+class CampaignDialer:
+    """Dials campaign numbers under a calls-per-second and a concurrent-call cap.
+
+    Admission uses a ProviderScheduler: its rate limit is the calls-per-second
+    cap, its in-flight limit the concurrent-call cap, and campaigns are served
+    round-robin. A dialed call holds its slot until it ends: when its media
+    stream closes, Twilio reports a final status, or it is not answered within
+    `answer_timeout`. Media streams of calls the dialer did not place (inbound
+    calls, single `/initiate-call` calls) take a slot too, so campaigns only
+    use the capacity live calls leave free. Counts are per worker.
+    """
+
+    def __init__(self, twilio_service, calls_per_second: Optional[float] = None,
+                 max_concurrent_calls: Optional[int] = None, answer_timeout: Optional[int] = None):
+        self.twilio_service = twilio_service
+        self.calls_per_second = calls_per_second or float(os.getenv("DIALER_CALLS_PER_SECOND", "1"))
+        self.max_concurrent_calls = max_concurrent_calls or int(os.getenv("DIALER_MAX_CONCURRENT_CALLS", "20"))
+        self.answer_timeout = answer_timeout or int(os.getenv("DIALER_ANSWER_TIMEOUT", "60"))
+        self.scheduler = ProviderScheduler("dialer", self.max_concurrent_calls, self.calls_per_second, burst=1,
+                                           queue_stage="dialer_queue")
+        self.campaigns: Dict[str, Campaign] = {}
+        # Dialed call_sid -> (campaign, number index), while the call holds a slot
+        self.calls: Dict[str, Tuple[Campaign, int]] = {}
+        self.timers: Dict[str, asyncio.TimerHandle] = {}
+        # Media streams of calls placed elsewhere that hold a slot
+        self.other_calls: Set[str] = set()
+        self.tasks: Set[asyncio.Task] = set()
+
+    def _spawn(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    def submit(self, numbers: List[str], name: Optional[str] = None) -> Campaign:
+        """Queue a campaign and start dialing it"""
+        campaign = Campaign(numbers, name)
+        self.campaigns[campaign.id] = campaign
+        self._spawn(self._run(campaign))
+        metrics.increment("dialer_numbers_queued", len(numbers))
+        print(f"📇 Campaign {campaign.name}: {len(numbers)} numbers queued")
+        return campaign
+
+    def cancel(self, campaign_id: str) -> Optional[Campaign]:
+        """Stop dialing a campaign's queued numbers; calls already placed carry on"""
+        campaign = self.campaigns.get(campaign_id)
+        if campaign and not campaign.cancelled:
+            campaign.cancelled = True
+            for index, state in enumerate(campaign.states):
+                if state == QUEUED:
+                    campaign.set_state(index, CANCELED)
+        return campaign
+
+    async def _run(self, campaign: Campaign):
+        # One admission request per campaign at a time, so the scheduler alternates between campaigns
+        for index, number in enumerate(campaign.numbers):
+            if campaign.cancelled:
+                return
+            await self.scheduler.acquire(campaign.id)
+            if campaign.cancelled:
+                self.scheduler.release()
+                return
+            campaign.set_state(index, DIALING)
+            self._spawn(self._dial(campaign, index))
+
+    async def _dial(self, campaign: Campaign, index: int):
+        try:
+            call_sid = await self.twilio_service.make_call(campaign.numbers[index], status_callback=True,
+                                                           timeout=self.answer_timeout)
+        except Exception as e:
+            campaign.errors[index] = f"{campaign.numbers[index]}: {e}"
+            campaign.set_state(index, FAILED)
+            self.scheduler.release()
+            metrics.increment("dialer_calls", outcome=FAILED)
+            print(f"❌ Campaign {campaign.name}: {e}")
+            return
+        self.calls[call_sid] = (campaign, index)
+        if call_sid in self.other_calls:
+            # The media stream connected before the REST response arrived: it already holds this call's slot
+            self.other_calls.discard(call_sid)
+            self.scheduler.release()
+            campaign.set_state(index, CONNECTED)
+            return
+        # Twilio's own ring timeout should report no-answer first; this also covers a lost status callback
+        self.timers[call_sid] = asyncio.get_running_loop().call_later(
+            self.answer_timeout + 15, self.call_ended, call_sid, NO_ANSWER)
+
+    def session_started(self, call_sid: str):
+        """A media stream connected for `call_sid`"""
+        entry = self.calls.get(call_sid)
+        if entry is None:
+            self.other_calls.add(call_sid)
+            self.scheduler.occupy()
+            return
+        timer = self.timers.pop(call_sid, None)
+        if timer:
+            timer.cancel()
+        campaign, index = entry
+        campaign.set_state(index, CONNECTED)
+
+    def session_ended(self, call_sid: str):
+        """The media stream of `call_sid` closed"""
+        if call_sid in self.other_calls:
+            self.other_calls.discard(call_sid)
+            self.scheduler.release()
+        else:
+            self.call_ended(call_sid, COMPLETED)
+
+    def call_status(self, call_sid: str, status: str):
+        """Twilio status callback; final statuses free the call's slot"""
+        state = TWILIO_STATUSES.get(status)
+        if state:
+            self.call_ended(call_sid, state)
+
+    def call_ended(self, call_sid: str, state: str):
+        entry = self.calls.pop(call_sid, None)
+        if entry is None:
+            return
+        timer = self.timers.pop(call_sid, None)
+        if timer:
+            timer.cancel()
+        campaign, index = entry
+        # A call that connected and then hung up is completed, whatever Twilio calls it
+        campaign.set_state(index, COMPLETED if campaign.states[index] == CONNECTED else state)
+        self.scheduler.release()
+        metrics.increment("dialer_calls", outcome=campaign.states[index])
+
+    def stats(self) -> Dict:
+        return {
+            "calls_per_second": self.calls_per_second,
+            "max_concurrent_calls": self.max_concurrent_calls,
+            "calls_in_progress": self.scheduler.in_flight,
+            "other_calls": len(self.other_calls),
+            "numbers_queued": sum(campaign.counts[QUEUED] for campaign in self.campaigns.values()),
+            "campaigns": [campaign.stats() for campaign in self.campaigns.values()],
+        }
+
+    async def close(self):
+        for timer in self.timers.values():
+            timer.cancel()
+        for task in list(self.tasks):
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
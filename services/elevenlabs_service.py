@@ -1,26 +1,57 @@
-import requests
-import os
+import asyncio
+import httpx
 import io
-from typing import Optional
+import os
+import time
+import websockets
+from pathlib import Path
+from urllib.parse import urlencode
+from typing import AsyncIterator, Iterable, Optional, Tuple, Union
+from services.http_client import get_provider_client, raise_if_cancelled
+from services.resilience import provider_policy
+from services.streaming_stt import StreamingSTTSession
+from services.tts_cache import TTSCache, normalize_text
 from utils.env_loader import load_env
+from utils.metrics import metrics
 
 load_env(override=True)
 
+# Twilio media streams play raw 8 kHz mu-law, so request it directly instead of MP3
+TTS_PARAMS = {"output_format": "ulaw_8000"}
+
 class ElevenLabsService:
-    def __init__(self):
+    def __init__(self, fallback_phrase: Optional[str] = None):
         self.api_key = os.getenv("ELEVENLABS_API_KEY")
-        self.base_url = "https://api.elevenlabs.io/v1"
+        self.base_url = os.getenv("ELEVENLABS_BASE_URL", "https://api.elevenlabs.io/v1")
         self.voice_id = os.getenv("ELEVENLABS_VOICE_ID", "pNInz6obpgDQGcFmaJgB")  # Default voice ID
         
         if not self.api_key:
             raise ValueError("ELEVENLABS_API_KEY environment variable is required")
-    
-    async def text_to_speech(self, text: str) -> bytes:
-        """Convert text to speech using ElevenLabs API"""
-        url = f"{self.base_url}/text-to-speech/{self.voice_id}"
         
+        # Shared keep-alive client, concurrency-limited across all calls
+        self.http = get_provider_client("elevenlabs")
+        # Retries, hedging after the recent p95 and a circuit breaker per operation
+        self.tts_policy = provider_policy("elevenlabs_tts", hedge=True)
+        self.stt_policy = provider_policy("elevenlabs_stt", hedge=True)
+        # Played from the cache when synthesis fails, so the caller is not left in silence
+        self.fallback_phrase = fallback_phrase
+        
+        # Repeated phrases (greeting, fallback, fillers) play from cache with no provider round trip
+        self.cache: Optional[TTSCache] = None
+        # Normalized text of the warmed phrases, the only ones kept on disk; per-call reply
+        # sentences stay in memory, so caller-specific text is never written out
+        self.disk_phrases = {normalize_text(fallback_phrase)} if fallback_phrase else set()
+        if os.getenv("TTS_CACHE_ENABLED", "true").lower() != "false":
+            self.cache = TTSCache(
+                max_memory_bytes=int(float(os.getenv("TTS_CACHE_MEMORY_MB", "32")) * 1024 * 1024),
+                directory=os.getenv("TTS_CACHE_DIR", str(Path(__file__).parent.parent / ".cache" / "tts")),
+                max_disk_bytes=int(float(os.getenv("TTS_CACHE_DISK_MB", "256")) * 1024 * 1024)
+            )
+    
+    def _tts_request(self, text: str):
+        """Headers and JSON body shared by the batch and streaming TTS calls"""
         headers = {
-            "Accept": "audio/mpeg",
+            "Accept": "audio/basic",
             "Content-Type": "application/json",
             "xi-api-key": self.api_key
         }
@@ -33,52 +64,220 @@ class ElevenLabsService:
                 "similarity_boost": 0.5
             }
         }
+        return headers, data
+    
+    def _cache_key(self, data: dict) -> str:
+        return TTSCache.key(data["text"], voice_id=self.voice_id, model_id=data["model_id"],
+                            voice_settings=data["voice_settings"], **TTS_PARAMS)
+    
+    def _on_disk(self, text: str) -> bool:
+        return normalize_text(text) in self.disk_phrases
+    
+    async def _cached_audio(self, cache_key: str, text: str) -> Optional[bytes]:
+        if not self.cache:
+            return None
+        audio = await self.cache.get(cache_key, disk=self._on_disk(text))
+        if audio is not None:
+            metrics.increment("tts_chars_cached", len(text))
+        return audio
+    
+    async def warm_cache(self, phrases: Iterable[str]):
+        """Synthesize phrases ahead of time; ones already in the disk cache cost nothing"""
+        if not self.cache:
+            return
+        phrases = list(phrases)
+        self.disk_phrases.update(normalize_text(phrase) for phrase in phrases)
+        results = await asyncio.gather(*(self.text_to_speech(phrase) for phrase in phrases))
+        print(f"🗄️ TTS cache warmed: {sum(1 for audio in results if audio)}/{len(phrases)} phrases ready")
+    
+    async def cached_speech(self, text: str) -> Optional[bytes]:
+        """Audio for `text` if it is already cached, never synthesized on demand"""
+        _, data = self._tts_request(text)
+        return await self._cached_audio(self._cache_key(data), text)
+    
+    async def fallback_audio(self) -> Optional[bytes]:
+        """Cached audio of the fallback phrase"""
+        if not self.fallback_phrase:
+            return None
+        return await self.cached_speech(self.fallback_phrase)
+    
+    async def text_to_speech(self, text: str, call_sid: Optional[str] = None, fallback: bool = False) -> bytes:
+        """Convert text to 8 kHz mu-law speech using ElevenLabs API.
         
-        try:
-            response = requests.post(url, json=data, headers=headers)
+        Returns empty bytes when synthesis fails, or with `fallback` the cached
+        fallback phrase, for replies where an apology beats silence.
+        """
+        url = f"{self.base_url}/text-to-speech/{self.voice_id}"
+        headers, data = self._tts_request(text)
+        cache_key = self._cache_key(data)
+        audio = await self._cached_audio(cache_key, text)
+        if audio is not None:
+            return audio
+        
+        async def attempt(timeout: float) -> bytes:
+            response = await self.http.post(url, params=TTS_PARAMS, json=data, headers=headers,
+                                            call_sid=call_sid, timeout=timeout)
             response.raise_for_status()
             return response.content
-            
-        except requests.exceptions.RequestException as e:
+        
+        try:
+            with metrics.span("tts_complete"):
+                audio = await self.tts_policy.call(attempt)
+        except Exception as e:
             print(f"ElevenLabs TTS error: {e}")
-            # Return empty bytes on error
+            metrics.increment("provider_errors", provider="elevenlabs", operation="tts")
+            if fallback:
+                return await self.fallback_audio() or b""
             return b""
+        
+        if self.cache:
+            await self.cache.put(cache_key, audio, disk=self._on_disk(text))
+        return audio
     
-    async def speech_to_text(self, audio_data: bytes) -> Optional[str]:
-        """Convert speech to text using ElevenLabs API"""
+    async def _open_tts_stream(self, url: str, data: dict, headers: dict, call_sid: Optional[str],
+                               timeout: float) -> Tuple[asyncio.Queue, asyncio.Task]:
+        """Start a TTS stream in its own task and return once its first audio chunk is in.
+        
+        The chunks, then None at the end (or the error that cut the stream
+        short), arrive on the returned queue.
+        """
+        chunks: asyncio.Queue = asyncio.Queue()
+        first_chunk = asyncio.get_running_loop().create_future()
+        
+        async def produce():
+            try:
+                async with self.http.stream("POST", url, params=TTS_PARAMS, json=data, headers=headers,
+                                            call_sid=call_sid, timeout=timeout) as response:
+                    response.raise_for_status()
+                    async for chunk in response.aiter_bytes():
+                        raise_if_cancelled()
+                        if chunk:
+                            chunks.put_nowait(chunk)
+                            if not first_chunk.done():
+                                first_chunk.set_result(None)
+                raise_if_cancelled()
+                chunks.put_nowait(None)
+                if not first_chunk.done():
+                    first_chunk.set_result(None)
+            except Exception as e:
+                if first_chunk.done():
+                    chunks.put_nowait(e)
+                else:
+                    first_chunk.set_exception(e)
+        
+        producer = asyncio.create_task(produce())
+        try:
+            await first_chunk
+        except BaseException:
+            producer.cancel()
+            raise
+        return chunks, producer
+    
+    async def stream_text_to_speech(self, text: str, call_sid: Optional[str] = None) -> AsyncIterator[bytes]:
+        """Yield 8 kHz mu-law chunks from the ElevenLabs streaming endpoint as they arrive.
+        
+        Retries and hedging cover the wait for the first chunk; once audio has
+        been yielded a failure ends the stream.
+        """
+        url = f"{self.base_url}/text-to-speech/{self.voice_id}/stream"
+        headers, data = self._tts_request(text)
+        cache_key = self._cache_key(data)
+        audio = await self._cached_audio(cache_key, text)
+        if audio is not None:
+            yield audio
+            return
+        
+        started = time.perf_counter()
+        try:
+            chunks, producer = await self.tts_policy.call(
+                lambda timeout: self._open_tts_stream(url, data, headers, call_sid, timeout),
+                discard=lambda stream: stream[1].cancel())
+        except Exception as e:
+            print(f"ElevenLabs TTS stream error: {e}")
+            metrics.increment("provider_errors", provider="elevenlabs", operation="tts")
+            return
+        metrics.observe("tts_first_byte", time.perf_counter() - started)
+        
+        received = []
+        try:
+            while True:
+                chunk = await chunks.get()
+                if chunk is None:
+                    break
+                if isinstance(chunk, Exception):
+                    # Whatever was already yielded still plays
+                    print(f"ElevenLabs TTS stream error: {chunk}")
+                    metrics.increment("provider_errors", provider="elevenlabs", operation="tts")
+                    return
+                received.append(chunk)
+                yield chunk
+            metrics.observe("tts_complete", time.perf_counter() - started)
+            # Only complete audio is cached; a cancelled or failed stream stores nothing
+            if self.cache:
+                await self.cache.put(cache_key, b"".join(received), disk=self._on_disk(text))
+        finally:
+            producer.cancel()
+    
+    async def open_transcription_stream(self) -> Optional[StreamingSTTSession]:
+        """Open a persistent realtime STT connection for one call, or None if it cannot connect"""
+        base = self.base_url.replace("https://", "wss://", 1).replace("http://", "ws://", 1)
+        query = urlencode({
+            "model_id": os.getenv("ELEVENLABS_STT_STREAM_MODEL", "scribe_v2_realtime"),
+            "audio_format": "ulaw_8000",
+            "commit_strategy": "manual"
+        })
+        url = os.getenv("ELEVENLABS_STT_STREAM_URL", f"{base}/speech-to-text/realtime") + f"?{query}"
+        
+        session = StreamingSTTSession(url, self.api_key)
+        try:
+            await session.connect()
+            return session
+        except (OSError, asyncio.TimeoutError, websockets.WebSocketException) as e:
+            print(f"❌ ElevenLabs streaming STT connect error: {e}")
+            metrics.increment("provider_errors", provider="elevenlabs", operation="stt_stream")
+            return None
+    
+    async def speech_to_text(self, audio_data: Union[bytes, bytearray, memoryview],
+                             call_sid: Optional[str] = None) -> Optional[str]:
+        """Convert speech (a WAV file, 16-bit PCM or mu-law) to text using ElevenLabs API"""
         url = f"{self.base_url}/speech-to-text"
         
         print(f"🎙️ Sending {len(audio_data)} bytes to ElevenLabs STT API")
+        metrics.increment("stt_upload_bytes", len(audio_data))
         
         headers = {
             "xi-api-key": self.api_key
         }
         
-        files = {
-            "audio": ("audio.wav", io.BytesIO(audio_data), "audio/wav")
-        }
-        
         data = {
             "model_id": "scribe_v1"
         }
         
-        try:
-            print(f"🌐 Making STT request to: {url}")
-            response = requests.post(url, headers=headers, files=files, data=data)
+        async def attempt(timeout: float) -> str:
+            # A fresh file object per attempt: a hedge runs alongside the original
+            files = {
+                "audio": ("audio.wav", io.BytesIO(audio_data), "audio/wav")
+            }
+            response = await self.http.post(url, headers=headers, files=files, data=data,
+                                            call_sid=call_sid, timeout=timeout)
             print(f"📊 STT Response status: {response.status_code}")
-            
             response.raise_for_status()
-            
-            result = response.json()
-            transcribed_text = result.get("text", "").strip()
+            return response.json().get("text", "").strip()
+        
+        try:
+            print(f"🌐 Making STT request to: {url}")
+            with metrics.span("stt"):
+                transcribed_text = await self.stt_policy.call(attempt)
             print(f"✅ STT Success - Transcribed: '{transcribed_text}'")
             return transcribed_text
             
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             print(f"❌ ElevenLabs STT error: {e}")
-            if hasattr(e, 'response') and e.response is not None:
+            metrics.increment("provider_errors", provider="elevenlabs", operation="stt")
+            if isinstance(e, httpx.HTTPStatusError):
                 print(f"📄 Error response: {e.response.text}")
             return None
         except Exception as e:
             print(f"❌ STT processing error: {e}")
-            return None
\ No newline at end of file
+            metrics.increment("provider_errors", provider="elevenlabs", operation="stt")
+            return None
@@ -0,0 +1,151 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
+import httpx
+
+from services.scheduler import ProviderScheduler
+from utils.env_loader import load_env
+from utils.recording import RecordingTransport
+
+load_env(override=True)
+
+# Defaults per provider, overridable with <PROVIDER>_MAX_CONCURRENCY, <PROVIDER>_MAX_CONNECTIONS,
+# <PROVIDER>_TIMEOUT, <PROVIDER>_RATE_LIMIT (requests/s, 0 = none) and <PROVIDER>_RATE_BURST
+PROVIDER_DEFAULTS = {
+    "elevenlabs": {"max_concurrency": 10, "max_connections": 20, "timeout": 30.0, "rate_limit": 0.0},
+    "openai": {"max_concurrency": 50, "max_connections": 100, "timeout": 30.0, "rate_limit": 0.0},
+    "twilio": {"max_concurrency": 10, "max_connections": 10, "timeout": 15.0, "rate_limit": 0.0},
+}
+
+# How long to hold a provider after a 429 that carries no usable Retry-After
+DEFAULT_RETRY_AFTER = 1.0
+
+
+def retry_after(response: httpx.Response) -> float:
+    """Seconds a 429 response asks us to wait"""
+    try:
+        return max(0.0, float(response.headers.get("retry-after", DEFAULT_RETRY_AFTER)))
+    except ValueError:
+        return DEFAULT_RETRY_AFTER
+
+
+class ProviderClient:
+    """Shared keep-alive HTTP client for one provider, admitting requests through its scheduler.
+
+    A 429 pauses the scheduler for its Retry-After and the request goes back
+    in line, up to `rate_limit_retries` times, before the caller sees it.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_connections: int,
+                 timeout: float, connect_timeout: float = 5.0, http2: bool = True,
+                 rate_limit: float = 0.0, rate_burst: Optional[int] = None, rate_limit_retries: int = 2):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.rate_limit_retries = rate_limit_retries
+        transport = httpx.AsyncHTTPTransport(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=60.0,
+            ),
+        )
+        self.client = httpx.AsyncClient(
+            # Writes the requests of recorded calls to their recording; a pass-through otherwise
+            transport=RecordingTransport(transport, name),
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            # Sees every response, including the OpenAI SDK's own retries
+            event_hooks={"response": [self._on_response]},
+        )
+        self.scheduler = ProviderScheduler(name, max_concurrency, rate_limit, rate_burst)
+
+    async def _on_response(self, response: httpx.Response):
+        # Pause before the slot is given up, so no queued request walks into the same 429
+        if response.status_code == 429:
+            self.scheduler.throttle(retry_after(response))
+
+    def slot(self, call_sid: Optional[str] = None):
+        """Scheduler slot for a request made through another client, e.g. the OpenAI SDK"""
+        return self.scheduler.slot(call_sid)
+
+    async def request(self, method: str, url: str, call_sid: Optional[str] = None, **kwargs) -> httpx.Response:
+        """Send a request once the scheduler admits it for `call_sid`"""
+        for attempt in range(self.rate_limit_retries + 1):
+            async with self.scheduler.slot(call_sid):
+                response = await self.client.request(method, url, **kwargs)
+            if response.status_code != 429 or attempt == self.rate_limit_retries:
+                return response
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    @asynccontextmanager
+    async def stream(self, method: str, url: str, call_sid: Optional[str] = None,
+                     **kwargs) -> AsyncIterator[httpx.Response]:
+        """Stream a response body, holding the scheduler slot until it is consumed"""
+        for attempt in range(self.rate_limit_retries + 1):
+            async with self.scheduler.slot(call_sid):
+                async with self.client.stream(method, url, **kwargs) as response:
+                    if response.status_code != 429 or attempt == self.rate_limit_retries:
+                        yield response
+                        return
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+_clients: Dict[str, ProviderClient] = {}
+
+
+def _env_number(name: str, default, cast):
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    try:
+        return cast(value)
+    except ValueError:
+        print(f"⚠️ Invalid value for {name}: {value!r}, using {default}")
+        return default
+
+
+def get_provider_client(name: str) -> ProviderClient:
+    """Return the process-wide client for a provider, creating it on first use"""
+    if name not in _clients:
+        defaults = PROVIDER_DEFAULTS.get(name, PROVIDER_DEFAULTS["openai"])
+        prefix = name.upper()
+        _clients[name] = ProviderClient(
+            name,
+            max_concurrency=_env_number(f"{prefix}_MAX_CONCURRENCY", defaults["max_concurrency"], int),
+            max_connections=_env_number(f"{prefix}_MAX_CONNECTIONS", defaults["max_connections"], int),
+            timeout=_env_number(f"{prefix}_TIMEOUT", defaults["timeout"], float),
+            http2=os.getenv("HTTP_CLIENT_HTTP2", "true").lower() != "false",
+            rate_limit=_env_number(f"{prefix}_RATE_LIMIT", defaults["rate_limit"], float),
+            rate_burst=_env_number(f"{prefix}_RATE_BURST", None, int),
+            rate_limit_retries=_env_number(f"{prefix}_RATE_LIMIT_RETRIES", 2, int),
+        )
+    return _clients[name]
+
+
+def raise_if_cancelled():
+    """Re-raise a task cancellation that the HTTP stack swallowed.
+
+    With anyio 3.x (pinned by FastAPI 0.104) a cancellation that arrives while
+    httpcore waits on a shared HTTP/2 connection can be lost, and the response
+    keeps streaming into a turn nobody is waiting for. Streaming loops call
+    this per chunk.
+    """
+    task = asyncio.current_task()
+    if task is not None and task.cancelling():
+        raise asyncio.CancelledError()
+
+
+async def close_provider_clients(name: Optional[str] = None):
+    """Close pooled connections, for one provider or all of them"""
+    names = [name] if name else list(_clients)
+    for client_name in names:
+        client = _clients.pop(client_name, None)
+        if client:
+            await client.aclose()
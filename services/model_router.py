@@ -0,0 +1,142 @@
+"""Picks how each caller turn is answered: a canned reply, a small fast model or the full model.
+
+Rules come from a JSON file (MODEL_ROUTING_RULES, default
+config/model_routes.json) and are tried in order against the transcript,
+lowercased and stripped of punctuation; the first match wins. A rule can
+require any of:
+
+- `patterns`: regular expressions, one of which must match the whole text
+- `min_words` / `max_words`: bounds on the number of words
+
+Its `route` is `canned` or one of the models under `routes`. A canned rule
+answers with its `reply` without calling the LLM; `{last_reply}` in it is
+the previous assistant reply, and the rule is skipped when there is none.
+Turns no rule matches use the `default` route. Classifying a turn is a
+handful of regular expressions on a short string, microseconds on the
+event loop.
+"""
+import json
+import os
+import re
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+
+from utils.env_loader import load_env
+
+load_env(override=True)
+
+CANNED = "canned"
+LAST_REPLY = "{last_reply}"
+WORDS = re.compile(r"[\w']+")
+DEFAULT_RULES_FILE = Path(__file__).parent.parent / "config" / "model_routes.json"
+
+
+class Route(NamedTuple):
+    name: str
+    # Rule that picked the route, or "default"
+    rule: str
+    model: Optional[str] = None
+    max_tokens: int = 150
+    temperature: float = 0.7
+    # Canned reply text, for the canned route
+    reply: Optional[str] = None
+    # USD per million prompt and completion tokens
+    price_input: float = 0.0
+    price_output: float = 0.0
+
+    def cost(self, prompt_tokens: int, completion_tokens: int) -> float:
+        """Estimated USD cost of a completion on this route"""
+        return (prompt_tokens * self.price_input + completion_tokens * self.price_output) / 1e6
+
+
+# Every turn's route when routing is off or the rules file names no models
+FULL_ROUTE = Route("full", "default", "gpt-3.5-turbo", 150, 0.7, price_input=0.5, price_output=1.5)
+
+
+def normalize(text: str) -> str:
+    """Lowercase words joined by single spaces, so "Thanks, bye!" and "thanks bye" match alike"""
+    return " ".join(WORDS.findall(text.lower()))
+
+
+class Rule:
+    def __init__(self, spec: Dict, routes: Dict[str, Route]):
+        self.name = spec["name"]
+        self.route = spec["route"]
+        if self.route != CANNED and self.route not in routes:
+            raise ValueError(f"Routing rule {self.name!r} uses unknown route {self.route!r}")
+        self.reply = spec.get("reply")
+        if self.route == CANNED and not self.reply:
+            raise ValueError(f"Canned routing rule {self.name!r} has no reply")
+        self.patterns = [re.compile(pattern) for pattern in spec.get("patterns", [])]
+        self.min_words = spec.get("min_words")
+        self.max_words = spec.get("max_words")
+        if not (self.patterns or self.min_words or self.max_words):
+            raise ValueError(f"Routing rule {self.name!r} has no condition")
+
+    def matches(self, text: str, words: int) -> bool:
+        if self.min_words is not None and words < self.min_words:
+            return False
+        if self.max_words is not None and words > self.max_words:
+            return False
+        return not self.patterns or any(pattern.fullmatch(text) for pattern in self.patterns)
+
+
+class ModelRouter:
+    """Routes turns by the rules of one configuration; with `enabled` off every turn takes the default"""
+
+    def __init__(self, config: Dict, enabled: bool = True):
+        self.enabled = enabled
+        self.routes: Dict[str, Route] = {}
+        for name, spec in config.get("routes", {}).items():
+            self.routes[name] = Route(name, "default", spec["model"], int(spec.get("max_tokens", 150)),
+                                      float(spec.get("temperature", 0.7)),
+                                      price_input=float(spec.get("price_input_per_mtok", 0.0)),
+                                      price_output=float(spec.get("price_output_per_mtok", 0.0)))
+        default = config.get("default", "full")
+        if self.routes and default not in self.routes:
+            raise ValueError(f"Default route {default!r} is not one of the routes {', '.join(self.routes)}")
+        self.default = self.routes.get(default, FULL_ROUTE)
+        self.rules = [Rule(spec, self.routes) for spec in config.get("rules", [])]
+
+    @classmethod
+    def from_file(cls, path, enabled: bool = True) -> "ModelRouter":
+        with open(path, encoding="utf-8") as file:
+            return cls(json.load(file), enabled)
+
+    def route(self, user_input: str, history: List[Dict]) -> Route:
+        """Route for a reply to `user_input`, given the call's history before it"""
+        if not self.enabled or not self.rules:
+            return self.default
+        text = normalize(user_input)
+        last_reply = history[-1]["content"] if history and history[-1]["role"] == "assistant" else None
+        words = len(text.split())
+        for rule in self.rules:
+            if not rule.matches(text, words):
+                continue
+            if rule.route != CANNED:
+                return self.routes[rule.route]._replace(rule=rule.name)
+            if LAST_REPLY in rule.reply:
+                if not last_reply:
+                    continue
+                return Route(CANNED, rule.name, reply=rule.reply.replace(LAST_REPLY, last_reply))
+            return Route(CANNED, rule.name, reply=rule.reply)
+        return self.default
+
+
+_router: Optional[ModelRouter] = None
+
+
+def get_model_router() -> ModelRouter:
+    """Return the process-wide router, loaded from MODEL_ROUTING_RULES on first use"""
+    global _router
+    if _router is None:
+        path = os.getenv("MODEL_ROUTING_RULES") or DEFAULT_RULES_FILE
+        enabled = os.getenv("MODEL_ROUTING", "true").lower() != "false"
+        try:
+            _router = ModelRouter.from_file(path, enabled)
+        except FileNotFoundError:
+            print(f"⚠️ Model routing rules {path} not found, every turn goes to {FULL_ROUTE.model}")
+            _router = ModelRouter({}, enabled=False)
+        print(f"🧭 Model routing {'on' if _router.enabled else 'off'}: {len(_router.rules)} rules, "
+              f"default {_router.default.name} ({_router.default.model})")
+    return _router
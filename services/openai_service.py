@@ -1,18 +1,50 @@
+import asyncio
 import openai
 import os
-from typing import Dict, List
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, List, Optional
+from services.conversation_memory import ConversationMemory, estimate_tokens, message_tokens
+from services.http_client import get_provider_client, raise_if_cancelled
+from services.model_router import Route, get_model_router
+from services.resilience import provider_policy
+from services.session_store import get_session_store
 from utils.env_loader import load_env
+from utils.metrics import metrics
 
 load_env(override=True)
 
+FALLBACK_RESPONSE = "I'm sorry, I'm having trouble processing your request right now."
+
+SUMMARY_PROMPT = """Summarize this phone conversation between a caller and a voice assistant.
+Keep names, numbers, requests and anything already agreed. Write at most three short sentences."""
+
 class OpenAIService:
     def __init__(self):
         api_key = os.getenv("OPENAI_API_KEY")
         if not api_key:
             raise ValueError("OPENAI_API_KEY environment variable is required")
         
-        self.client = openai.OpenAI(api_key=api_key)
-        self.conversations: Dict[str, List[Dict]] = {}
+        # Async client on the shared keep-alive pool so completions never block the event loop
+        self.http = get_provider_client("openai")
+        self.client = openai.AsyncOpenAI(
+            api_key=api_key,
+            base_url=os.getenv("OPENAI_BASE_URL") or None,
+            http_client=self.http.client,
+            timeout=self.http.timeout,
+            # Retries go through the policy below, so they queue in the scheduler and respect the deadline
+            max_retries=0
+        )
+        self.chat_policy = provider_policy("openai_chat")
+        # Shared per-call state; `conversations` holds this worker's copies, least recently used first
+        self.store = get_session_store()
+        self.conversations: "OrderedDict[str, ConversationMemory]" = OrderedDict()
+        self.history_token_budget = int(os.getenv("HISTORY_TOKEN_BUDGET", "1000"))
+        self.max_conversations = int(os.getenv("MAX_CONVERSATIONS", "1000"))
+        self.conversation_ttl = float(os.getenv("CONVERSATION_TTL_SECONDS", "3600"))
+        self.summary_model = os.getenv("SUMMARY_MODEL", "gpt-3.5-turbo")
+        # Trivial turns get canned replies and short ones a faster model, by the rules in MODEL_ROUTING_RULES
+        self.router = get_model_router()
         
         self.system_prompt = """You are a helpful voice assistant for phone calls. 
         Provide concise, clear, and helpful responses to user queries. 
@@ -20,41 +52,279 @@ class OpenAIService:
         Be natural and conversational.
         If the user says goodbye, thanks, or wants to end the call, acknowledge it briefly."""
     
-    async def get_response(self, user_input: str, call_sid: str) -> str:
-        # Initialize conversation if new
+    def _conversation(self, call_sid: str) -> ConversationMemory:
+        conversation = self.conversations.get(call_sid)
+        if conversation is None:
+            self._evict_conversations()
+            conversation = self.conversations[call_sid] = ConversationMemory(
+                self.system_prompt, self.history_token_budget)
+        self.conversations.move_to_end(call_sid)
+        return conversation
+    
+    def _evict_conversations(self):
+        """Drop histories idle past the TTL, then the least recently used beyond the cap"""
+        now = time.monotonic()
+        while self.conversations:
+            oldest = next(iter(self.conversations.values()))
+            if now - oldest.last_used < self.conversation_ttl and len(self.conversations) < self.max_conversations:
+                break
+            # Only the local copy goes; the session store expires its entry on its own
+            self.conversations.popitem(last=False)
+            if oldest.summarizing:
+                oldest.summarizing.cancel()
+            metrics.increment("conversations_evicted")
+    
+    async def load_conversation(self, call_sid: str) -> ConversationMemory:
+        """The call's history, fetched from the session store if this worker has no copy yet"""
         if call_sid not in self.conversations:
-            self.conversations[call_sid] = [
-                {"role": "system", "content": self.system_prompt}
-            ]
+            try:
+                state = await self.store.load_conversation(call_sid)
+            except Exception as e:
+                print(f"Session store load error: {e}")
+                metrics.increment("session_store_errors", operation="load")
+                state = None
+            # Another turn may have created the local copy while the store answered
+            if state and call_sid not in self.conversations:
+                self._conversation(call_sid).restore(state)
+        return self._conversation(call_sid)
+    
+    def _save(self, call_sid: str, conversation: ConversationMemory):
+        """Write the history to the session store in the background, coalescing back-to-back updates"""
+        conversation.dirty = True
+        if conversation.saving is None:
+            conversation.saving = asyncio.create_task(self._persist(call_sid, conversation))
+    
+    async def _persist(self, call_sid: str, conversation: ConversationMemory):
+        try:
+            while conversation.dirty:
+                conversation.dirty = False
+                with metrics.span("session_store"):
+                    await self.store.save_conversation(call_sid, conversation.state())
+        except Exception as e:
+            print(f"Session store save error: {e}")
+            metrics.increment("session_store_errors", operation="save")
+        finally:
+            conversation.saving = None
+    
+    def _prompt(self, user_input: str, call_sid: str, record: bool = True) -> List[Dict]:
+        """Prompt for a reply to `user_input`, recording the caller's turn unless `record` is False"""
+        conversation = self._conversation(call_sid)
+        if record:
+            conversation.add("user", user_input)
+            prompt = conversation.prompt()
+        else:
+            # Speculative request: the turn only enters the history if it is committed
+            prompt = conversation.prompt() + [{"role": "user", "content": user_input}]
+        metrics.increment("prompt_tokens", sum(message_tokens(message) for message in prompt))
+        return prompt
+    
+    def _route(self, user_input: str, call_sid: str) -> Route:
+        """Route the reply to `user_input`, before the turn enters the history"""
+        started = time.perf_counter()
+        conversation = self._conversation(call_sid)
+        route = self.router.route(user_input, conversation.messages)
+        conversation.route = route
+        metrics.increment("llm_routes", route=route.name, rule=route.rule)
+        if route.reply is not None:
+            metrics.observe(f"llm_first_token_{route.name}", time.perf_counter() - started)
+        return route
+    
+    def _account(self, route: Route, prompt: List[Dict], reply: str, first_token: Optional[float] = None):
+        """Per-route estimated tokens and cost of one completion, and its first-token latency if streamed"""
+        prompt_tokens = sum(message_tokens(message) for message in prompt)
+        completion_tokens = estimate_tokens(reply)
+        if first_token is not None:
+            metrics.observe(f"llm_first_token_{route.name}", first_token)
+        metrics.increment("llm_route_prompt_tokens", prompt_tokens, route=route.name)
+        metrics.increment("llm_route_completion_tokens", completion_tokens, route=route.name)
+        metrics.increment("llm_route_cost_usd", route.cost(prompt_tokens, completion_tokens), route=route.name)
+    
+    def reply_route(self, call_sid: str) -> Optional[Route]:
+        """Route of the call's latest reply"""
+        conversation = self.conversations.get(call_sid)
+        return conversation.route if conversation else None
+    
+    def prompt_tokens(self, user_input: str, call_sid: str) -> int:
+        """Estimated prompt tokens of a reply to `user_input`, without recording anything"""
+        conversation = self.conversations.get(call_sid)
+        history = conversation.prompt_tokens() if conversation else message_tokens(
+            {"role": "system", "content": self.system_prompt})
+        return history + message_tokens({"role": "user", "content": user_input})
+    
+    def add_user_message(self, user_input: str, call_sid: str):
+        self._conversation(call_sid).add("user", user_input)
+    
+    def add_assistant_message(self, assistant_response: str, call_sid: str):
+        conversation = self._conversation(call_sid)
+        conversation.add("assistant", assistant_response)
+        # Summarize older turns while the caller listens, not on the next turn's critical path
+        overflow = conversation.take_overflow()
+        if overflow:
+            conversation.summarizing = asyncio.create_task(self._summarize(call_sid, conversation, overflow))
+        self._save(call_sid, conversation)
+    
+    async def _summarize(self, call_sid: str, conversation: ConversationMemory, overflow: List[Dict]):
+        """Fold the oldest turns into the conversation's running summary"""
+        transcript = "\n".join(f"{message['role']}: {message['content']}" for message in overflow)
         
-        # Add user message to conversation
-        self.conversations[call_sid].append({
-            "role": "user", 
-            "content": user_input
-        })
+        async def attempt(timeout: float):
+            # Background work: queued apart from the calls, so it never delays a caller's turn
+            async with self.http.slot():
+                return await self.client.chat.completions.create(
+                    model=self.summary_model,
+                    messages=[
+                        {"role": "system", "content": SUMMARY_PROMPT},
+                        {"role": "user", "content": f"Summary so far: {conversation.summary or 'none'}\n\n{transcript}"}
+                    ],
+                    max_tokens=120,
+                    temperature=0,
+                    timeout=timeout
+                )
         
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=self.conversations[call_sid],
-                max_tokens=150,
-                temperature=0.7
-            )
+            response = await self.chat_policy.call(attempt)
+            conversation.apply_summary(response.choices[0].message.content.strip())
+            metrics.increment("conversation_summaries")
+        except Exception as e:
+            print(f"OpenAI summary error: {e}")
+            metrics.increment("provider_errors", provider="openai", operation="summary")
+            conversation.drop_overflow()
+        finally:
+            conversation.summarizing = None
+        self._save(call_sid, conversation)
+    
+    async def get_response(self, user_input: str, call_sid: str) -> str:
+        await self.load_conversation(call_sid)
+        route = self._route(user_input, call_sid)
+        if route.reply is not None:
+            self.add_user_message(user_input, call_sid)
+            self.add_assistant_message(route.reply, call_sid)
+            return route.reply
+        prompt = self._prompt(user_input, call_sid)
+        
+        async def attempt(timeout: float):
+            async with self.http.slot(call_sid):
+                return await self.client.chat.completions.create(
+                    model=route.model,
+                    messages=prompt,
+                    max_tokens=route.max_tokens,
+                    temperature=route.temperature,
+                    timeout=timeout
+                )
+        
+        try:
+            with metrics.span("llm_complete"):
+                response = await self.chat_policy.call(attempt)
             
             assistant_response = response.choices[0].message.content
+            # Not streamed: the completion time is already in llm_complete, it is no first-token latency
+            self._account(route, prompt, assistant_response)
             
             # Add assistant response to conversation
-            self.conversations[call_sid].append({
-                "role": "assistant",
-                "content": assistant_response
-            })
+            self.add_assistant_message(assistant_response, call_sid)
             
             return assistant_response
             
         except Exception as e:
             print(f"OpenAI API error: {e}")
-            return "I'm sorry, I'm having trouble processing your request right now."
+            metrics.increment("provider_errors", provider="openai", operation="chat")
+            return FALLBACK_RESPONSE
+    
+    async def _open_stream(self, route: Route, prompt: List[Dict], call_sid: str, timeout: float):
+        """Start a streamed completion once the scheduler admits it; the caller releases the slot"""
+        await self.http.scheduler.acquire(call_sid)
+        try:
+            return await self.client.chat.completions.create(
+                model=route.model,
+                messages=prompt,
+                max_tokens=route.max_tokens,
+                temperature=route.temperature,
+                stream=True,
+                timeout=timeout
+            )
+        except BaseException:
+            self.http.scheduler.release()
+            raise
+    
+    async def stream_response(self, user_input: str, call_sid: str, record: bool = True) -> AsyncIterator[str]:
+        """Yield the assistant response token by token as the completion streams in.
+        
+        With `record=False` the history is left untouched, for speculative replies.
+        """
+        await self.load_conversation(call_sid)
+        route = self._route(user_input, call_sid)
+        if route.reply is not None:
+            # A canned reply: no request, the whole text at once
+            if record:
+                self.add_user_message(user_input, call_sid)
+            yield route.reply
+            if record:
+                self.add_assistant_message(route.reply, call_sid)
+            return
+        prompt = self._prompt(user_input, call_sid, record)
+        parts: List[str] = []
+        started = time.perf_counter()
+        first_token = None
+        
+        try:
+            stream = await self.chat_policy.call(lambda timeout: self._open_stream(route, prompt, call_sid, timeout))
+            try:
+                # Closing the stream aborts the request, so a cancelled reply stops generating
+                # server-side before its slot is handed to the next request
+                async with stream:
+                    async for chunk in stream:
+                        raise_if_cancelled()
+                        if not chunk.choices:
+                            continue
+                        token = chunk.choices[0].delta.content
+                        if token:
+                            if not parts:
+                                first_token = time.perf_counter() - started
+                                metrics.observe("llm_first_token", first_token)
+                            parts.append(token)
+                            yield token
+            finally:
+                self.http.scheduler.release()
+            raise_if_cancelled()
+            metrics.observe("llm_complete", time.perf_counter() - started)
+            if first_token is not None:
+                self._account(route, prompt, "".join(parts), first_token)
+                        
+        except Exception as e:
+            print(f"OpenAI API error: {e}")
+            metrics.increment("provider_errors", provider="openai", operation="chat")
+            if not parts:
+                parts.append(FALLBACK_RESPONSE)
+                yield FALLBACK_RESPONSE
+        
+        # Add assistant response to conversation
+        if record:
+            self.add_assistant_message("".join(parts), call_sid)
+    
+    def truncate_response(self, call_sid: str, spoken_text: str):
+        """Replace the latest assistant reply with the part the caller actually heard"""
+        conversation = self.conversations.get(call_sid)
+        if not conversation or not conversation.messages:
+            return
+        history = conversation.messages
+        if history[-1]["role"] == "assistant":
+            history.pop()
+        if spoken_text:
+            history.append({"role": "assistant", "content": spoken_text})
+        self._save(call_sid, conversation)
     
-    def clear_conversation(self, call_sid: str):
-        if call_sid in self.conversations:
-            del self.conversations[call_sid]
\ No newline at end of file
+    async def clear_conversation(self, call_sid: str):
+        """The call is over: drop its history here and in the session store"""
+        conversation = self.conversations.pop(call_sid, None)
+        if conversation:
+            if conversation.summarizing:
+                conversation.summarizing.cancel()
+            # Let an in-flight save land first, so it cannot recreate the entry after the delete
+            conversation.dirty = False
+            if conversation.saving:
+                await asyncio.gather(conversation.saving, return_exceptions=True)
+        try:
+            await self.store.delete_conversation(call_sid)
+        except Exception as e:
+            print(f"Session store delete error: {e}")
+            metrics.increment("session_store_errors", operation="delete")
@@ -0,0 +1,212 @@
+import asyncio
+import functools
+import os
+import random
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+import httpx
+import openai
+
+from utils.env_loader import load_env
+from utils.metrics import Histogram, metrics
+
+load_env(override=True)
+
+T = TypeVar("T")
+
+# Successful attempts needed before the hedge delay is trusted
+HEDGE_MIN_SAMPLES = 20
+# Retry backoff: full jitter over an exponentially growing cap
+BACKOFF_BASE = 0.1
+BACKOFF_CAP = 2.0
+
+
+class CircuitOpenError(Exception):
+    """A provider operation was refused because its circuit breaker is open"""
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Transport errors, timeouts and 5xx are worth another attempt; other 4xx are not.
+    
+    Only one layer retries a 429: ProviderClient has already retried it after
+    its Retry-After, but the OpenAI SDK's requests (max_retries=0) bypass
+    that loop and are retried here.
+    """
+    if isinstance(error, (httpx.TransportError, openai.APIConnectionError, asyncio.TimeoutError)):
+        return True
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures and refuses calls for `reset_timeout` seconds.
+
+    After that a single probe is let through: success closes the circuit, a
+    failure opens it for another `reset_timeout`.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 15.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.reset_timeout else "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.probing:
+            self.probing = True
+            return True
+        return False
+
+    def success(self):
+        if self.opened_at is not None:
+            print(f"🟢 Circuit {self.name} closed")
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        metrics.set_gauge("circuit_open", 0, circuit=self.name)
+
+    def failure(self):
+        self.failures += 1
+        if self.probing or (self.opened_at is None and self.failures >= self.failure_threshold):
+            print(f"🔴 Circuit {self.name} open after {self.failures} failures")
+            self.opened_at = time.monotonic()
+            self.probing = False
+            metrics.set_gauge("circuit_open", 1, circuit=self.name)
+
+
+class ResiliencePolicy:
+    """Deadline-aware retries, optional hedging and a circuit breaker for one provider operation.
+
+    `call(attempt)` runs `attempt(timeout)` until it succeeds, the error is
+    not retryable, or the next backoff would overrun the deadline. With
+    hedging, an attempt still running after the recent p95 latency gets a
+    duplicate, and whichever finishes first wins.
+    """
+
+    def __init__(self, name: str, deadline: float = 10.0, retries: int = 2, hedge: bool = False,
+                 hedge_quantile: float = 0.95, hedge_min_delay: float = 0.05,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.name = name
+        self.deadline = deadline
+        self.retries = retries
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_delay = hedge_min_delay
+        self.breaker = breaker or CircuitBreaker(name)
+        # Latency of successful attempts, for the hedge delay
+        self.latency = Histogram(window=256)
+
+    def hedge_delay(self) -> Optional[float]:
+        if not self.hedge or self.latency.count < HEDGE_MIN_SAMPLES:
+            return None
+        return max(self.hedge_min_delay, self.latency.quantiles((self.hedge_quantile,))[self.hedge_quantile])
+
+    async def _timed(self, attempt: Callable[[float], Awaitable[T]], timeout: float) -> T:
+        started = time.perf_counter()
+        result = await attempt(timeout)
+        self.latency.observe(time.perf_counter() - started)
+        return result
+
+    async def _attempt(self, attempt: Callable[[float], Awaitable[T]], timeout: float,
+                       discard: Optional[Callable[[T], None]]) -> T:
+        """One attempt, duplicated once if it is still running after the hedge delay"""
+        delay = self.hedge_delay()
+        if delay is None or delay >= timeout:
+            return await self._timed(attempt, timeout)
+
+        tasks = [asyncio.create_task(self._timed(attempt, timeout))]
+        winner: Optional[asyncio.Task] = None
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                metrics.increment("hedged_requests", circuit=self.name)
+                tasks.append(asyncio.create_task(self._timed(attempt, timeout - delay)))
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        winner = task
+                        if task is not tasks[0]:
+                            metrics.increment("hedge_wins", circuit=self.name)
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if task is winner:
+                    continue
+                if task.done():
+                    self._drop(task, discard)
+                else:
+                    # A loser that completes after all must still have its result released
+                    task.cancel()
+                    task.add_done_callback(functools.partial(self._drop, discard=discard))
+
+    @staticmethod
+    def _drop(task: asyncio.Task, discard: Optional[Callable] = None):
+        """Release the result of an attempt nobody is waiting for"""
+        if task.cancelled():
+            return
+        if task.exception() is None and discard:
+            discard(task.result())
+
+    async def call(self, attempt: Callable[[float], Awaitable[T]],
+                   discard: Optional[Callable[[T], None]] = None) -> T:
+        """Run `attempt(timeout)` under the policy; `discard` releases results of losing hedges"""
+        if not self.breaker.allow():
+            metrics.increment("circuit_rejections", circuit=self.name)
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline
+        for retry in range(self.retries + 1):
+            try:
+                result = await self._attempt(attempt, deadline - loop.time(), discard)
+            except asyncio.CancelledError:
+                # A cancelled probe proves nothing; let the next call probe instead
+                self.breaker.probing = False
+                raise
+            except Exception as e:
+                self.breaker.failure()
+                backoff = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** retry))
+                if retry == self.retries or not is_retryable(e) or loop.time() + backoff >= deadline:
+                    raise
+                if not self.breaker.allow():
+                    raise CircuitOpenError(f"{self.name} circuit is open") from e
+                metrics.increment("provider_retries", circuit=self.name)
+                print(f"🔁 {self.name} attempt {retry + 1} failed ({e}), retrying in {backoff * 1000:.0f} ms")
+                await asyncio.sleep(backoff)
+            else:
+                self.breaker.success()
+                return result
+
+
+def provider_policy(name: str, hedge: bool = False) -> ResiliencePolicy:
+    """Policy for operation `name` (e.g. "elevenlabs_tts") from the PROVIDER_*, HEDGE_* and CIRCUIT_* settings"""
+    breaker = CircuitBreaker(name, int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5")),
+                             float(os.getenv("CIRCUIT_RESET_SECONDS", "15")))
+    return ResiliencePolicy(
+        name,
+        deadline=float(os.getenv(f"{name.upper()}_DEADLINE", os.getenv("PROVIDER_DEADLINE_SECONDS", "10"))),
+        retries=int(os.getenv("PROVIDER_RETRIES", "2")),
+        hedge=hedge and os.getenv("HEDGE_ENABLED", "true").lower() != "false",
+        hedge_quantile=float(os.getenv("HEDGE_QUANTILE", "0.95")),
+        hedge_min_delay=int(os.getenv("HEDGE_MIN_DELAY_MS", "50")) / 1000,
+        breaker=breaker,
+    )
@@ -0,0 +1,134 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from utils.metrics import metrics
+
+# Queue for requests that belong to no call: cache warming, summaries
+BACKGROUND = ""
+
+
+class ProviderScheduler:
+    """Admits one provider's requests under a concurrency cap and a token-bucket rate limit.
+
+    Requests that cannot start right away wait in per-call queues, and free
+    slots go to those queues round-robin, so a call with many sentences to
+    synthesize cannot starve a call waiting on its first. A 429 from the
+    provider pauses admission for its Retry-After.
+    """
+
+    def __init__(self, name: str, max_in_flight: int, rate: float = 0.0, burst: Optional[int] = None,
+                 queue_stage: str = "provider_queue"):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        # Latency stage the time spent waiting is recorded under
+        self.queue_stage = queue_stage
+        # Requests per second, 0 for no rate limit; the bucket holds a second's worth unless `burst` says otherwise
+        self.rate = rate
+        self.burst = (burst or max(1, int(rate))) if rate > 0 else 0
+        self.tokens = float(self.burst)
+        self.refilled_at = time.monotonic()
+        self.paused_until = 0.0
+        self.in_flight = 0
+        self.waiting = 0
+        # call_sid -> waiting futures, in round-robin order
+        self.queues: "OrderedDict[str, deque]" = OrderedDict()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def _refill(self, now: float):
+        if self.rate > 0:
+            self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+
+    def _delay(self) -> float:
+        """Seconds until the next request may start, as far as the rate limit is concerned"""
+        now = time.monotonic()
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.rate <= 0:
+            return 0.0
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def _start(self):
+        if self.rate > 0:
+            self.tokens -= 1
+        self.in_flight += 1
+
+    def _dispatch(self):
+        """Hand free slots to waiting calls in turn"""
+        while self.queues and self.in_flight < self.max_in_flight:
+            delay = self._delay()
+            if delay > 0:
+                if self._timer is None:
+                    self._timer = asyncio.get_running_loop().call_later(delay, self._wake)
+                return
+            call_sid, queue = next(iter(self.queues.items()))
+            future = queue.popleft()
+            if not queue:
+                del self.queues[call_sid]
+            if future.done():
+                # Cancelled while waiting; the call keeps its turn
+                continue
+            if queue:
+                self.queues.move_to_end(call_sid)
+            self._start()
+            future.set_result(None)
+        self._report()
+
+    def _wake(self):
+        self._timer = None
+        self._dispatch()
+
+    def _report(self):
+        metrics.set_gauge("provider_queue_depth", self.waiting, provider=self.name)
+        metrics.set_gauge("provider_in_flight", self.in_flight, provider=self.name)
+
+    async def acquire(self, call_sid: Optional[str] = None):
+        """Wait for this call's turn and a free slot"""
+        if not self.queues and self.in_flight < self.max_in_flight and self._delay() <= 0:
+            self._start()
+            self._report()
+            metrics.observe(self.queue_stage, 0.0)
+            return
+        future = asyncio.get_running_loop().create_future()
+        self.queues.setdefault(call_sid or BACKGROUND, deque()).append(future)
+        self.waiting += 1
+        started = time.perf_counter()
+        try:
+            self._dispatch()
+            await future
+        except asyncio.CancelledError:
+            # Granted just as the waiter was cancelled: hand the slot on
+            if future.done() and not future.cancelled():
+                self.release()
+            future.cancel()
+            raise
+        finally:
+            self.waiting -= 1
+            self._report()
+        metrics.observe(self.queue_stage, time.perf_counter() - started)
+
+    def release(self):
+        self.in_flight -= 1
+        self._dispatch()
+
+    def occupy(self):
+        """Count a slot taken without queuing (e.g. an inbound call), so admission leaves room for it"""
+        self.in_flight += 1
+        self._report()
+
+    def throttle(self, retry_after: float):
+        """The provider answered 429: hold every queued request for `retry_after` seconds"""
+        self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+        metrics.increment("provider_throttled", provider=self.name)
+
+    @asynccontextmanager
+    async def slot(self, call_sid: Optional[str] = None) -> AsyncIterator[None]:
+        await self.acquire(call_sid)
+        try:
+            yield
+        finally:
+            self.release()
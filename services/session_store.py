@@ -0,0 +1,193 @@
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from utils.env_loader import load_env
+
+load_env(override=True)
+
+KEY_PREFIX = "voice_agent"
+
+
+class SessionStore:
+    """Per-call state shared by every worker: conversation history and call metadata.
+
+    Conversations are opaque JSON-serializable dicts, written after each turn
+    and expired `ttl` seconds after their last write. Call metadata is a flat
+    dict merged field by field, so the Twilio webhook and the media stream can
+    each add what they know even when they land on different workers.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+
+    async def load_conversation(self, call_sid: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    async def save_conversation(self, call_sid: str, state: Dict):
+        raise NotImplementedError
+
+    async def delete_conversation(self, call_sid: str):
+        raise NotImplementedError
+
+    async def update_call(self, call_sid: str, fields: Dict[str, Any]):
+        raise NotImplementedError
+
+    async def get_call(self, call_sid: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def end_call(self, call_sid: str):
+        raise NotImplementedError
+
+    async def active_calls(self) -> int:
+        """Calls in progress across all workers using this store"""
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class MemorySessionStore(SessionStore):
+    """In-process store, for a single worker. Entries expire lazily, oldest write first."""
+
+    def __init__(self, ttl: float):
+        super().__init__(ttl)
+        # call_sid -> (expires_at, value), least recently written first
+        self.conversations: "OrderedDict[str, tuple]" = OrderedDict()
+        self.calls: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def _expire(self, entries: OrderedDict):
+        now = time.monotonic()
+        while entries:
+            expires_at, _ = next(iter(entries.values()))
+            if expires_at > now:
+                break
+            entries.popitem(last=False)
+
+    def _put(self, entries: OrderedDict, call_sid: str, value):
+        self._expire(entries)
+        entries.pop(call_sid, None)
+        entries[call_sid] = (time.monotonic() + self.ttl, value)
+
+    def _get(self, entries: OrderedDict, call_sid: str):
+        self._expire(entries)
+        entry = entries.get(call_sid)
+        return entry[1] if entry else None
+
+    async def load_conversation(self, call_sid: str) -> Optional[Dict]:
+        return self._get(self.conversations, call_sid)
+
+    async def save_conversation(self, call_sid: str, state: Dict):
+        self._put(self.conversations, call_sid, state)
+
+    async def delete_conversation(self, call_sid: str):
+        self.conversations.pop(call_sid, None)
+
+    async def update_call(self, call_sid: str, fields: Dict[str, Any]):
+        call = dict(self._get(self.calls, call_sid) or {})
+        call.update(fields)
+        self._put(self.calls, call_sid, call)
+
+    async def get_call(self, call_sid: str) -> Optional[Dict[str, Any]]:
+        return self._get(self.calls, call_sid)
+
+    async def end_call(self, call_sid: str):
+        self.calls.pop(call_sid, None)
+
+    async def active_calls(self) -> int:
+        self._expire(self.calls)
+        return len(self.calls)
+
+
+class RedisSessionStore(SessionStore):
+    """Redis-backed store, shared by workers on any number of hosts.
+
+    Conversations are JSON strings with an expiry. Call metadata is a hash of
+    JSON-encoded fields, and a sorted set scored by last update counts the
+    calls in progress, so calls of a crashed worker age out after `ttl`.
+    """
+
+    def __init__(self, url: str, ttl: float, timeout: float = 2.0):
+        super().__init__(ttl)
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("SESSION_STORE=redis requires the redis package (pip install redis)") from e
+        # A stalled store must fail fast instead of holding up calls
+        self.redis = redis.from_url(url, decode_responses=True,
+                                    socket_timeout=timeout, socket_connect_timeout=timeout)
+        self.calls_key = f"{KEY_PREFIX}:calls"
+
+    @staticmethod
+    def _conversation_key(call_sid: str) -> str:
+        return f"{KEY_PREFIX}:conversation:{call_sid}"
+
+    @staticmethod
+    def _call_key(call_sid: str) -> str:
+        return f"{KEY_PREFIX}:call:{call_sid}"
+
+    async def load_conversation(self, call_sid: str) -> Optional[Dict]:
+        raw = await self.redis.get(self._conversation_key(call_sid))
+        return json.loads(raw) if raw else None
+
+    async def save_conversation(self, call_sid: str, state: Dict):
+        await self.redis.set(self._conversation_key(call_sid), json.dumps(state), ex=int(self.ttl))
+
+    async def delete_conversation(self, call_sid: str):
+        await self.redis.delete(self._conversation_key(call_sid))
+
+    async def update_call(self, call_sid: str, fields: Dict[str, Any]):
+        key = self._call_key(call_sid)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hset(key, mapping={name: json.dumps(value) for name, value in fields.items()})
+            pipe.expire(key, int(self.ttl))
+            pipe.zadd(self.calls_key, {call_sid: time.time()})
+            await pipe.execute()
+
+    async def get_call(self, call_sid: str) -> Optional[Dict[str, Any]]:
+        fields = await self.redis.hgetall(self._call_key(call_sid))
+        return {name: json.loads(value) for name, value in fields.items()} or None
+
+    async def end_call(self, call_sid: str):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.delete(self._call_key(call_sid))
+            pipe.zrem(self.calls_key, call_sid)
+            await pipe.execute()
+
+    async def active_calls(self) -> int:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.zremrangebyscore(self.calls_key, "-inf", time.time() - self.ttl)
+            pipe.zcard(self.calls_key)
+            _, count = await pipe.execute()
+        return count
+
+    async def close(self):
+        await self.redis.aclose()
+
+
+_store: Optional[SessionStore] = None
+
+
+def get_session_store() -> SessionStore:
+    """Return the process-wide session store, created from SESSION_STORE on first use"""
+    global _store
+    if _store is None:
+        backend = os.getenv("SESSION_STORE", "memory").lower()
+        ttl = float(os.getenv("CONVERSATION_TTL_SECONDS", "3600"))
+        if backend == "redis":
+            _store = RedisSessionStore(os.getenv("REDIS_URL", "redis://localhost:6379/0"), ttl,
+                                       float(os.getenv("SESSION_STORE_TIMEOUT", "2")))
+        elif backend == "memory":
+            _store = MemorySessionStore(ttl)
+        else:
+            raise ValueError(f"Unknown SESSION_STORE {backend!r}, expected 'memory' or 'redis'")
+    return _store
+
+
+async def close_session_store():
+    global _store
+    if _store is not None:
+        await _store.close()
+        _store = None
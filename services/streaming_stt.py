@@ -0,0 +1,63 @@
+import base64
+import json
+import time
+from collections import deque
+from typing import AsyncIterator, Optional, Tuple, Union
+
+import websockets
+
+from utils.audio import SAMPLE_RATE
+from utils.metrics import metrics
+
+PARTIAL = "partial"
+FINAL = "final"
+
+
+class StreamingSTTSession:
+    """One call's persistent realtime speech-to-text connection.
+
+    Audio is pushed as it arrives, so by the time the caller stops talking
+    most of it is already transcribed. `send_audio(..., commit=True)` marks
+    the end of an utterance; `transcripts()` yields (PARTIAL, text) updates
+    while the caller speaks and one (FINAL, text) per commit, in order.
+    """
+
+    def __init__(self, url: str, api_key: str):
+        self.url = url
+        self.api_key = api_key
+        self.ws: Optional[websockets.WebSocketClientProtocol] = None
+        # Send times of commits still waiting for their final transcript
+        self._commits: deque = deque()
+
+    async def connect(self, timeout: float = 5.0):
+        self.ws = await websockets.connect(self.url, extra_headers={"xi-api-key": self.api_key},
+                                           open_timeout=timeout, max_size=2 ** 20)
+
+    async def send_audio(self, mulaw: Union[bytes, bytearray, memoryview], commit: bool = False):
+        await self.ws.send(json.dumps({
+            "message_type": "input_audio_chunk",
+            "audio_base_64": base64.b64encode(mulaw).decode("ascii"),
+            "commit": commit,
+            "sample_rate": SAMPLE_RATE
+        }))
+        if commit:
+            self._commits.append(time.perf_counter())
+
+    async def transcripts(self) -> AsyncIterator[Tuple[str, str]]:
+        async for raw in self.ws:
+            message = json.loads(raw)
+            kind = message.get("message_type")
+            if kind == "partial_transcript":
+                yield PARTIAL, message.get("text", "")
+            elif kind == "committed_transcript":
+                if self._commits:
+                    # Only the tail of the utterance is left to transcribe once it is committed
+                    metrics.observe("stt", time.perf_counter() - self._commits.popleft())
+                yield FINAL, message.get("text", "").strip()
+            elif kind and "error" in kind:
+                print(f"❌ ElevenLabs streaming STT error: {message}")
+                metrics.increment("provider_errors", provider="elevenlabs", operation="stt_stream")
+
+    async def close(self):
+        if self.ws:
+            await self.ws.close()
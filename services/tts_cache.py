@@ -0,0 +1,160 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from utils.metrics import metrics
+
+# Acknowledgements played while a slow reply is still being prepared
+ACKNOWLEDGEMENT_PHRASES = [
+    "One moment.",
+    "Let me check that for you.",
+    "Sure.",
+    "Okay.",
+]
+
+# Short phrases synthesized at startup so they never wait on the provider
+FILLER_PHRASES = [
+    *ACKNOWLEDGEMENT_PHRASES,
+    "Could you repeat that, please?",
+]
+
+
+def normalize_text(text: str) -> str:
+    """Canonical form of TTS input, so spacing and Unicode variants share one cache entry"""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+class TTSCache:
+    """Synthesized audio cache: an in-memory LRU over an optional content-addressed directory.
+
+    Entries are keyed by a SHA-256 of the normalized text and every request
+    parameter that changes the audio (voice, model, voice settings, output
+    format). Only entries stored with `disk=True` go to the directory; disk
+    reads and writes run in a worker thread and are best effort, so a full or
+    read-only disk costs a cache miss, never a reply. The directory is pruned
+    by modification time once it grows past `max_disk_bytes`.
+    """
+
+    def __init__(self, max_memory_bytes: int, directory: Optional[str] = None, max_disk_bytes: int = 0):
+        self.max_memory_bytes = max_memory_bytes
+        self.memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self.memory_bytes = 0
+        self.directory = Path(directory) if directory else None
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.misses = 0
+        self._disk_lock = threading.Lock()
+        self._disk_bytes: Optional[int] = None
+
+    @staticmethod
+    def key(text: str, **params) -> str:
+        payload = json.dumps({"text": normalize_text(text), **params}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str, disk: bool = True) -> Optional[bytes]:
+        audio = self.memory.get(key)
+        if audio is not None:
+            self.memory.move_to_end(key)
+            self._record(True, "memory")
+            return audio
+
+        if self.directory and disk:
+            audio = await asyncio.to_thread(self._read, key)
+            if audio is not None:
+                self._remember(key, audio)
+                self._record(True, "disk")
+                return audio
+
+        self._record(False)
+        return None
+
+    async def put(self, key: str, audio: bytes, disk: bool = True):
+        if not audio:
+            return
+        self._remember(key, audio)
+        if self.directory and disk:
+            await asyncio.to_thread(self._write, key, audio)
+
+    def _record(self, hit: bool, tier: str = ""):
+        if hit:
+            self.hits += 1
+            metrics.increment("tts_cache_hits", tier=tier)
+        else:
+            self.misses += 1
+            metrics.increment("tts_cache_misses")
+        metrics.set_gauge("tts_cache_hit_ratio", self.hits / (self.hits + self.misses))
+
+    def _remember(self, key: str, audio: bytes):
+        if len(audio) > self.max_memory_bytes:
+            return
+        previous = self.memory.pop(key, None)
+        if previous is not None:
+            self.memory_bytes -= len(previous)
+        self.memory[key] = audio
+        self.memory_bytes += len(audio)
+        while self.memory_bytes > self.max_memory_bytes:
+            _, evicted = self.memory.popitem(last=False)
+            self.memory_bytes -= len(evicted)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.audio"
+
+    def _read(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            audio = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            print(f"⚠️ TTS cache read failed, synthesizing instead: {e}")
+            metrics.increment("tts_cache_errors", operation="read")
+            return None
+        # Refresh the modification time so pruning drops the least recently used files
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return audio
+
+    def _write(self, key: str, audio: bytes):
+        try:
+            self._store(key, audio)
+        except OSError as e:
+            print(f"⚠️ TTS cache write failed, keeping the audio in memory only: {e}")
+            metrics.increment("tts_cache_errors", operation="write")
+
+    def _store(self, key: str, audio: bytes):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename, so a crash never leaves a truncated entry behind
+        temporary = path.with_suffix(f".{threading.get_ident()}.tmp")
+        try:
+            temporary.write_bytes(audio)
+            os.replace(temporary, path)
+        except OSError:
+            temporary.unlink(missing_ok=True)
+            raise
+
+        with self._disk_lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(entry.stat().st_size for entry in self.directory.glob("*/*.audio"))
+            else:
+                self._disk_bytes += len(audio)
+            if self.max_disk_bytes and self._disk_bytes > self.max_disk_bytes:
+                self._prune()
+
+    def _prune(self):
+        """Delete the least recently used files until the directory is back under 90% of its limit"""
+        entries = sorted(self.directory.glob("*/*.audio"), key=lambda entry: entry.stat().st_mtime)
+        for entry in entries:
+            if self._disk_bytes <= self.max_disk_bytes * 0.9:
+                break
+            size = entry.stat().st_size
+            entry.unlink(missing_ok=True)
+            self._disk_bytes -= size
@@ -1,74 +1,124 @@
+import base64
+import hashlib
+import hmac
 import os
-from twilio.rest import Client
+import httpx
+from functools import lru_cache
 from twilio.twiml.voice_response import VoiceResponse
-from typing import Optional
+from typing import Iterable, Optional, Tuple
+from xml.sax.saxutils import escape
+from services.http_client import get_provider_client
 from utils.env_loader import load_env
 
 load_env(override=True)
 
+GREETING = "Hello! I'm your AI voice assistant. How can I help you today?"
+
+# Stands in for the call SID while the TwiML template is rendered once at startup
+CALL_SID_PLACEHOLDER = "__CALL_SID__"
+ATTRIBUTE_ENTITIES = {'"': "&quot;"}
+
+
+@lru_cache(maxsize=64)
+def _url_mac(auth_token: str, url: str) -> "hmac.HMAC":
+    """HMAC-SHA1 keyed with the auth token, already fed the webhook URL; copied for each request"""
+    return hmac.new(auth_token.encode(), url.encode(), hashlib.sha1)
+
+
 class TwilioService:
     def __init__(self):
         self.account_sid = os.getenv("TWILIO_ACCOUNT_SID")
         self.auth_token = os.getenv("TWILIO_AUTH_TOKEN")
         self.phone_number = os.getenv("TWILIO_PHONE_NUMBER")
         self.webhook_url = os.getenv("WEBHOOK_URL", "http://localhost:8000")
+        # Play the greeting as cached agent-voice audio over the media stream instead of <Say>
+        self.stream_greeting = os.getenv("STREAM_GREETING", "true").lower() != "false"
+        # Check X-Twilio-Signature on webhooks
+        self.validate_signatures = os.getenv("TWILIO_VALIDATE_SIGNATURE", "false").lower() == "true"
         
         if not all([self.account_sid, self.auth_token, self.phone_number]):
             raise ValueError("Twilio credentials (TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, TWILIO_PHONE_NUMBER) are required")
         
-        self.client = Client(self.account_sid, self.auth_token)
+        # Twilio REST over the shared non-blocking client; TWILIO_API_BASE_URL points it at a local stand-in
+        self.api_url = f"{os.getenv('TWILIO_API_BASE_URL', 'https://api.twilio.com')}/2010-04-01/Accounts/{self.account_sid}"
+        self.http = get_provider_client("twilio")
+        self.stream_url = self._stream_url()
+        print(f"🌐 WebSocket URL for streaming: {self.stream_url}/{{call_sid}}")
+        self.twiml_head, self.twiml_tail = self._compile_twiml()
     
-    async def make_call(self, to_number: str) -> str:
-        """Initiate a call to the specified number"""
+    async def make_call(self, to_number: str, status_callback: bool = False, timeout: Optional[int] = None) -> str:
+        """Initiate a call to the specified number.
+        
+        With `status_callback`, Twilio reports the final status (completed, busy, no-answer, failed)
+        to `/call-status`. Call creation is not retried: a request that timed out may still have dialed.
+        """
+        data = {
+            "To": to_number,
+            "From": self.phone_number,
+            "Url": f"{self.webhook_url}/twiml",
+            "Method": "POST"
+        }
+        if status_callback:
+            data["StatusCallback"] = f"{self.webhook_url}/call-status"
+            data["StatusCallbackMethod"] = "POST"
+        if timeout:
+            # Seconds Twilio lets the call ring before giving up with no-answer
+            data["Timeout"] = str(timeout)
         try:
-            call = self.client.calls.create(
-                to=to_number,
-                from_=self.phone_number,
-                url=f"{self.webhook_url}/twiml",
-                method="POST"
-            )
-            return call.sid
+            response = await self.http.post(f"{self.api_url}/Calls.json", data=data,
+                                            auth=(self.account_sid, self.auth_token))
+            response.raise_for_status()
+            return response.json()["sid"]
+        except httpx.HTTPStatusError as e:
+            raise Exception(f"Failed to initiate call: {e.response.status_code} {e.response.text}")
         except Exception as e:
             raise Exception(f"Failed to initiate call: {str(e)}")
     
-    def generate_twiml_response(self, call_sid: str) -> str:
-        """Generate TwiML response to start media streaming"""
+    def _stream_url(self) -> str:
+        """Media stream URL without the call SID, from WEBSOCKET_URL or derived from the webhook URL"""
+        websocket_url = os.getenv("WEBSOCKET_URL")
+        if websocket_url:
+            return f"{websocket_url}/ws"
+        # Always use wss:// for ngrok and production
+        webhook_domain = self.webhook_url.replace('http://', '').replace('https://', '')
+        return f"wss://{webhook_domain}/ws"
+
+    def _compile_twiml(self) -> Tuple[str, str]:
+        """Render the webhook's TwiML once, split around the call SID"""
         response = VoiceResponse()
         
         # Start the conversation
-        response.say("Hello! I'm your AI voice assistant. How can I help you today?")
+        if not self.stream_greeting:
+            response.say(GREETING)
         
-        # Get WebSocket URL from environment or construct it
-        websocket_url = os.getenv("WEBSOCKET_URL")
-        
-        if not websocket_url:
-            # Construct WebSocket URL from webhook URL
-            webhook_domain = self.webhook_url.replace('http://', '').replace('https://', '')
-            # Always use wss:// for ngrok and production
-            websocket_url = f"wss://{webhook_domain}/ws/{call_sid}"
-        else:
-            # Use provided WebSocket URL and append call_sid
-            websocket_url = f"{websocket_url}/ws/{call_sid}"
-        
-        print(f"🌐 WebSocket URL for streaming: {websocket_url}")
-        
-        # Start media streaming
-        start = response.start()
-        start.stream(
-            url=websocket_url,
-            track="inbound_track"  # Only capture user's audio
-        )
-        
-        # Keep the call active with a long pause
-        response.pause(length=3600)  # 1 hour to keep call active
+        # Bidirectional media stream: caller audio in, agent audio out.
+        # <Connect> keeps the call up for as long as the stream is open.
+        connect = response.connect()
+        connect.stream(url=f"{self.stream_url}/{CALL_SID_PLACEHOLDER}")
         
-        return str(response)
+        head, tail = str(response).split(CALL_SID_PLACEHOLDER)
+        return head, tail
+    
+    def generate_twiml_response(self, call_sid: str) -> str:
+        """Generate TwiML response to start media streaming"""
+        return f"{self.twiml_head}{escape(call_sid, ATTRIBUTE_ENTITIES)}{self.twiml_tail}"
+    
+    def signature_valid(self, url: str, params: Iterable[Tuple[str, str]], signature: Optional[str]) -> bool:
+        """Check a webhook's X-Twilio-Signature: base64 HMAC-SHA1 of the URL and its sorted form parameters"""
+        if not signature:
+            return False
+        mac = _url_mac(self.auth_token, url).copy()
+        for name, value in sorted(set(params)):
+            mac.update(f"{name}{value}".encode())
+        return hmac.compare_digest(base64.b64encode(mac.digest()).decode(), signature)
     
-    def end_call(self, call_sid: str):
+    async def end_call(self, call_sid: str):
         """End an active call"""
         try:
-            call = self.client.calls(call_sid).update(status="completed")
-            return call.status
+            response = await self.http.post(f"{self.api_url}/Calls/{call_sid}.json", data={"Status": "completed"},
+                                            auth=(self.account_sid, self.auth_token))
+            response.raise_for_status()
+            return response.json().get("status")
         except Exception as e:
             print(f"Error ending call: {e}")
             return None
\ No newline at end of file
@@ -0,0 +1,97 @@
+"""Worker pool for CPU-bound audio jobs, so encoding a burst of utterances does not stall every call's socket.
+
+AUDIO_EXECUTOR selects where jobs run:
+
+- ``thread`` (default): a thread pool. The NumPy codec releases the GIL in
+  its gathers, so the event loop keeps serving frames while a job runs.
+- ``process``: a process pool, for heavier pure-Python or transcoding work
+  that holds the GIL. Arguments and results are pickled across.
+- ``inline``: on the event loop, as before.
+
+Jobs on less than AUDIO_OFFLOAD_MIN_BYTES of input always run inline: for a
+single 20 ms frame the hand-off costs more than the work.
+"""
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Optional, TypeVar
+
+from utils.env_loader import load_env
+from utils.metrics import metrics
+
+load_env(override=True)
+
+T = TypeVar("T")
+
+EXECUTOR_KINDS = ("thread", "process", "inline")
+
+
+def _noop():
+    return None
+
+
+class AudioExecutor:
+    """Runs audio jobs on a thread or process pool, or inline below a size threshold"""
+
+    def __init__(self, kind: str = "thread", workers: Optional[int] = None, min_bytes: int = 16000):
+        if kind not in EXECUTOR_KINDS:
+            raise ValueError(f"Unknown AUDIO_EXECUTOR {kind!r}, expected one of {', '.join(EXECUTOR_KINDS)}")
+        self.kind = kind
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self.min_bytes = min_bytes
+        self.pool: Optional[Executor] = None
+        if kind == "thread":
+            self.pool = ThreadPoolExecutor(self.workers, thread_name_prefix="audio")
+        elif kind == "process":
+            # Forking a process that already runs the event loop and HTTP clients is unsafe
+            self.pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def warm(self):
+        """Start the pool's workers now rather than on the first utterance"""
+        if self.pool is not None:
+            for _ in range(self.workers):
+                self.pool.submit(_noop)
+
+    async def run(self, fn: Callable[..., T], data, *args) -> T:
+        """Run `fn(data, *args)` off the event loop when `data` is large enough to be worth it.
+
+        Memoryviews are copied before dispatch, since the ring buffer they point
+        into keeps being written while the job waits for a worker.
+        """
+        if self.pool is None or len(data) < self.min_bytes:
+            return fn(data, *args)
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        try:
+            return await loop.run_in_executor(self.pool, fn, data, *args)
+        finally:
+            metrics.observe("audio_job", loop.time() - started)
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+
+_executor: Optional[AudioExecutor] = None
+
+
+def get_audio_executor() -> AudioExecutor:
+    """Return the process-wide audio executor, created from AUDIO_EXECUTOR on first use"""
+    global _executor
+    if _executor is None:
+        workers = os.getenv("AUDIO_EXECUTOR_WORKERS", "")
+        _executor = AudioExecutor(os.getenv("AUDIO_EXECUTOR", "thread").lower(),
+                                  int(workers) if workers else None,
+                                  int(os.getenv("AUDIO_OFFLOAD_MIN_BYTES", "16000")))
+    return _executor
+
+
+def shutdown_audio_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown()
+        _executor = None
@@ -0,0 +1,223 @@
+import asyncio
+import bisect
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Pipeline stages timed per turn, in seconds
+STAGES = {
+    "frame_ingest": "Decoding one inbound media frame into the ring buffer and running VAD over it",
+    "endpoint_queue": "VAD end of speech until the utterance is picked up for processing",
+    "stt": "Speech-to-text request",
+    "llm_first_token": "LLM request start until the first token",
+    "llm_complete": "LLM request start until the full response",
+    "llm_first_token_canned": "Routing a turn to a canned reply, which stands in for the first token",
+    "llm_first_token_small": "LLM request start until the first token, for turns routed to the small model",
+    "llm_first_token_full": "LLM request start until the first token, for turns routed to the full model",
+    "tts_first_byte": "TTS request start until the first audio byte",
+    "tts_complete": "TTS request start until all audio was received",
+    "first_audio": "End of caller speech until the first reply audio byte is ready",
+    "first_frame": "End of caller speech until the first reply frame is sent to Twilio",
+    "perceived_first_frame": "End of caller speech until the first frame the caller hears, filler audio included",
+    "playback": "End of caller speech until Twilio reports the reply finished playing",
+    "event_loop_lag": "How late the event loop wakes up from a timed sleep",
+    "speculation_saved": "LLM time saved by committing a speculative reply",
+    "session_store": "Writing a call's history to the session store",
+    "provider_queue": "Time a provider request waited for the scheduler to admit it",
+    "dialer_queue": "Time a campaign number waited for the dialer's calls-per-second and concurrent-call caps",
+    "audio_job": "Audio job handed to the worker pool, from dispatch until its result is back on the event loop",
+    "analytics_write": "Writing one batch of call and turn rows to the analytics store, on its writer thread",
+}
+
+COUNTERS = {
+    "calls": "Calls that connected a media stream",
+    "turns": "Caller turns that produced a transcript",
+    "dropped_utterances": "Utterances dropped because processing fell behind",
+    "barge_ins": "Replies interrupted by the caller",
+    "tts_chars_wasted": "Synthesized characters the caller never heard because of barge-in",
+    "tts_chars_saved": "Characters never sent to TTS because of barge-in",
+    "provider_errors": "Failed provider requests",
+    "prompt_tokens": "Estimated prompt tokens sent to the LLM",
+    "llm_routes": "Replies by route (canned, small, full) and the rule that picked it",
+    "llm_route_prompt_tokens": "Estimated prompt tokens of completed replies, by route",
+    "llm_route_completion_tokens": "Estimated completion tokens of completed replies, by route",
+    "llm_route_cost_usd": "Estimated LLM cost of completed replies in USD, by route, at the routing rules' prices",
+    "conversation_summaries": "Older turns folded into a call's running summary",
+    "conversations_evicted": "Call histories evicted by the TTL or the LRU cap",
+    "tts_cache_hits": "TTS requests answered from the audio cache, by tier",
+    "tts_cache_misses": "TTS requests that had to be synthesized",
+    "tts_cache_errors": "TTS disk cache reads and writes that failed, by operation",
+    "tts_chars_cached": "Characters served from the TTS cache instead of the provider",
+    "speculations": "LLM replies started on a partial transcript",
+    "speculation_hits": "Speculative replies committed because the final transcript matched",
+    "speculation_misses": "Speculative replies discarded",
+    "speculation_wasted_tokens": "Estimated prompt and completion tokens spent on discarded speculations",
+    "session_store_errors": "Failed session store operations",
+    "provider_throttled": "HTTP 429 responses that paused a provider's scheduler",
+    "provider_retries": "Provider attempts retried after a retryable failure, by operation",
+    "hedged_requests": "Duplicate provider requests sent because the first was slower than the recent p95",
+    "hedge_wins": "Hedged requests that finished before the original",
+    "circuit_rejections": "Provider calls refused at once because the operation's circuit was open",
+    "stt_upload_bytes": "Audio bytes uploaded to batch STT",
+    "stt_skipped_utterances": "Utterances holding only noise, dropped before STT",
+    "dialer_numbers_queued": "Phone numbers queued by outbound campaigns",
+    "dialer_calls": "Campaign calls by outcome (completed, no_answer, busy, failed, canceled)",
+    "twilio_signature_rejected": "Twilio webhooks refused because X-Twilio-Signature did not match, by endpoint",
+    "recorded_calls": "Media streams recorded with CALL_RECORDING",
+    "recording_bytes": "Bytes appended to call recordings",
+    "recording_dropped_bytes": "Recording bytes dropped because the writer fell too far behind",
+    "recording_errors": "Call recordings stopped by a write error",
+    "analytics_rows": "Call and turn rows written to the analytics store",
+    "analytics_dropped_rows": "Analytics rows dropped because the writer fell too far behind",
+    "analytics_errors": "Failed analytics batch writes",
+    "fillers": "Slow turns bridged with filler audio, by kind (clip: acknowledgement then comfort noise; noise)",
+}
+
+GAUGES = {
+    "active_calls": "Calls with an open media stream on this worker",
+    "cluster_active_calls": "Calls in progress across all workers sharing the session store",
+    "tts_cache_hit_ratio": "Share of TTS requests answered from the audio cache",
+    "speculation_hit_ratio": "Share of speculative replies that were committed",
+    "provider_queue_depth": "Provider requests waiting for the scheduler, by provider",
+    "provider_in_flight": "Provider requests in progress, by provider",
+    "circuit_open": "1 while a provider operation's circuit breaker is open",
+}
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUANTILES = (0.5, 0.95, 0.99)
+PREFIX = "voice_agent"
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Cumulative Prometheus buckets, plus a window of recent samples for p50/p95/p99"""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS, window: int = 1024):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.recent: deque = deque(maxlen=window)
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.recent.append(value)
+
+    def quantiles(self, quantiles: Tuple[float, ...] = QUANTILES) -> Dict[float, float]:
+        if not self.recent:
+            return {}
+        ordered = sorted(self.recent)
+        return {q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] for q in quantiles}
+
+
+class Metrics:
+    """Process-wide latency histograms, counters and gauges, rendered in Prometheus text format"""
+
+    def __init__(self, window: Optional[int] = None):
+        self.window = window or int(os.getenv("METRICS_WINDOW", "1024"))
+        self.histograms: Dict[str, Histogram] = {}
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.gauges: Dict[Tuple[str, Labels], float] = {}
+        self.reset()
+
+    def observe(self, stage: str, seconds: float):
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            histogram = self.histograms[stage] = Histogram(window=self.window)
+        histogram.observe(seconds)
+
+    @contextmanager
+    def span(self, stage: str) -> Iterator[None]:
+        """Time the body of a `with` block as one sample of `stage`"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def increment(self, name: str, amount: float = 1, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def set_gauge(self, name: str, value: float, **labels: str):
+        self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Count and p50/p95/p99 per stage, for logs and benchmarks"""
+        result = {}
+        for stage, histogram in self.histograms.items():
+            if not histogram.count:
+                continue
+            entry = {"count": histogram.count}
+            for q, value in histogram.quantiles().items():
+                entry[f"p{int(q * 100)}"] = value
+            result[stage] = entry
+        return result
+
+    def reset(self):
+        # Known stages are exported from the start, so a stage that never ran shows up as zero
+        self.histograms = {stage: Histogram(window=self.window) for stage in STAGES}
+        self.counters.clear()
+        self.gauges.clear()
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines: List[str] = []
+
+        name = f"{PREFIX}_stage_latency_seconds"
+        lines.append(f"# HELP {name} Latency of each call pipeline stage")
+        lines.append(f"# TYPE {name} histogram")
+        for stage, histogram in sorted(self.histograms.items()):
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound:g}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {histogram.sum:.6f}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {histogram.count}')
+
+        # Quantiles over the recent window, so dashboards get p95/p99 without histogram_quantile()
+        name = f"{PREFIX}_stage_latency_quantile_seconds"
+        lines.append(f"# HELP {name} Recent p50/p95/p99 latency of each call pipeline stage")
+        lines.append(f"# TYPE {name} gauge")
+        for stage, histogram in sorted(self.histograms.items()):
+            for q, value in histogram.quantiles().items():
+                lines.append(f'{name}{{stage="{stage}",quantile="{q:g}"}} {value:.6f}')
+
+        for counter in sorted({key[0] for key in self.counters}):
+            name = f"{PREFIX}_{counter}_total"
+            lines.append(f"# HELP {name} {COUNTERS.get(counter, counter)}")
+            lines.append(f"# TYPE {name} counter")
+            for (key, labels), value in sorted(self.counters.items()):
+                if key == counter:
+                    label_text = ",".join(f'{label}="{text}"' for label, text in labels)
+                    lines.append(f"{name}{{{label_text}}} {value:g}" if label_text else f"{name} {value:g}")
+
+        for gauge in sorted({key[0] for key in self.gauges}):
+            name = f"{PREFIX}_{gauge}"
+            lines.append(f"# HELP {name} {GAUGES.get(gauge, gauge)}")
+            lines.append(f"# TYPE {name} gauge")
+            for (key, labels), value in sorted(self.gauges.items()):
+                if key == gauge:
+                    label_text = ",".join(f'{label}="{text}"' for label, text in labels)
+                    lines.append(f"{name}{{{label_text}}} {value:g}" if label_text else f"{name} {value:g}")
+
+        return "\n".join(lines) + "\n"
+
+
+# Shared by the services, call sessions and the /metrics route
+metrics = Metrics()
+
+
+async def monitor_event_loop(interval: float = 0.1):
+    """Sample event-loop lag until cancelled; anything blocking the loop delays every call's audio"""
+    loop = asyncio.get_running_loop()
+    while True:
+        scheduled = loop.time() + interval
+        await asyncio.sleep(interval)
+        metrics.observe("event_loop_lag", max(0.0, loop.time() - scheduled))
@@ -0,0 +1,293 @@
+"""Append-only call recordings: the inbound Twilio event stream, every provider exchange and turn latencies.
+
+With CALL_RECORDING on, each media stream is written to
+``CALL_RECORDING_DIR/<call_sid>.rec``: MAGIC, then records of a HEADER
+(kind, time since the recording started in 0.1 ms, payload length) and a
+payload. Inbound media payloads are the raw mu-law frames; every other
+payload is compact JSON. Provider requests are tagged to a call through
+the `current_recording` context variable, which the tasks of a call
+inherit, and captured by `RecordingTransport` under each provider's HTTP
+client. Headers are never recorded. Text bodies are recorded in full up to
+64 KB. Audio bodies are recorded only as their size and chunk timings.
+
+Records are buffered on the event loop and appended by a single writer
+thread every CALL_RECORDING_FLUSH_MS or 64 KB, so a slow disk never
+stalls a call. If the writer falls more than 8 MB behind, records are
+dropped and counted. Recordings hold caller audio, transcripts and
+prompts: store them like call recordings.
+
+`benchmarks/replay.py` feeds a recording back through the app against stubbed providers.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import re
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Iterator, List, NamedTuple, Optional
+
+import httpx
+
+from utils.env_loader import load_env
+from utils.metrics import metrics
+
+load_env(override=True)
+
+RECORDING_ENABLED = os.getenv("CALL_RECORDING", "false").lower() == "true"
+RECORDING_DIR = os.getenv("CALL_RECORDING_DIR", "recordings")
+FLUSH_INTERVAL = int(os.getenv("CALL_RECORDING_FLUSH_MS", "1000")) / 1000
+
+MAGIC = b"VAREC\x01"
+HEADER = struct.Struct("<BII")
+TICKS_PER_SECOND = 10000
+
+# Record kinds
+META = 0      # JSON: call SID, wall-clock start, pipeline settings
+MEDIA = 1     # raw inbound mu-law frame
+EVENT = 2     # JSON: any other inbound Twilio event (start, mark, stop, dtmf)
+PROVIDER = 3  # JSON: one provider request and its response timing
+TURN = 4      # JSON: a turn's reply latencies
+
+FLUSH_BYTES = 64 * 1024
+MAX_BACKLOG_BYTES = 8 * 1024 * 1024
+BODY_LIMIT = 64 * 1024
+
+# Settings that shape the pipeline, saved so a replay can run under the same ones
+CONFIG_PREFIXES = ("VAD_", "STT_", "FILLER_", "STREAMING_", "SPECULATIVE_", "BARGE_IN_", "PLAYBACK_", "HISTORY_",
+                   "HEDGE_", "PROVIDER_", "CIRCUIT_", "AUDIO_", "STREAM_GREETING", "TTS_CACHE_ENABLED",
+                   "ELEVENLABS_VOICE_ID", "MODEL_ROUTING")
+SECRET_MARKERS = ("KEY", "TOKEN", "SECRET", "PASSWORD", "URL")
+
+current_recording: ContextVar[Optional["CallRecorder"]] = ContextVar("current_recording", default=None)
+
+
+class Record(NamedTuple):
+    kind: int
+    at: float
+    payload: bytes
+
+
+def recorded_config() -> dict:
+    return {name: value for name, value in os.environ.items()
+            if name.startswith(CONFIG_PREFIXES) and not any(marker in name for marker in SECRET_MARKERS)}
+
+
+def provider_path(path: str) -> str:
+    """Request path below the provider's versioned base URL, the part a replay matches on"""
+    return path.split("/v1", 1)[-1]
+
+
+def body_fingerprint(body: bytes, content_type: str) -> str:
+    """Stable hash of a request body; multipart boundaries are random per request, so they are left out"""
+    boundary = re.search(r"boundary=([^;]+)", content_type or "")
+    if boundary:
+        body = body.replace(boundary.group(1).strip('"').encode(), b"")
+    return hashlib.sha1(body).hexdigest()[:16]
+
+
+_writer: Optional[ThreadPoolExecutor] = None
+
+
+def _writer_pool() -> ThreadPoolExecutor:
+    """One thread for every recording, so each file's appends land in order"""
+    global _writer
+    if _writer is None:
+        _writer = ThreadPoolExecutor(1, thread_name_prefix="recorder")
+    return _writer
+
+
+class CallRecorder:
+    """Buffers one call's records on the event loop and appends them to its file off the loop"""
+
+    def __init__(self, path: Path, call_sid: str, flush_interval: float = FLUSH_INTERVAL):
+        self.path = path
+        self.loop = asyncio.get_running_loop()
+        self.started = self.loop.time()
+        self.flush_interval = flush_interval
+        self.buffer = bytearray()
+        self.backlog = 0
+        self.failed = False
+        self.closed = False
+        self.timer = self.loop.call_later(flush_interval, self._tick)
+        self._json(META, {"call_sid": call_sid, "started_at": time.time(), "config": recorded_config()})
+        metrics.increment("recorded_calls")
+
+    def offset(self, at: float) -> float:
+        """Loop time `at` as seconds into the recording"""
+        return round(at - self.started, 4)
+
+    def _append(self, kind: int, payload: bytes):
+        if self.closed or self.failed:
+            return
+        if self.backlog + len(self.buffer) > MAX_BACKLOG_BYTES:
+            metrics.increment("recording_dropped_bytes", HEADER.size + len(payload))
+            return
+        ticks = int((self.loop.time() - self.started) * TICKS_PER_SECOND)
+        self.buffer += HEADER.pack(kind, ticks, len(payload))
+        self.buffer += payload
+        if len(self.buffer) >= FLUSH_BYTES:
+            self.flush()
+
+    def _json(self, kind: int, value: dict):
+        self._append(kind, json.dumps(value, separators=(",", ":")).encode())
+
+    def inbound(self, message: dict):
+        """An event received from Twilio"""
+        if message.get("event") == "media":
+            self._append(MEDIA, base64.b64decode(message["media"]["payload"]))
+        else:
+            self._json(EVENT, message)
+
+    def provider(self, exchange: dict):
+        self._json(PROVIDER, exchange)
+
+    def turn(self, **fields):
+        self._json(TURN, fields)
+
+    def flush(self):
+        """Hand the buffered records to the writer thread"""
+        if not self.buffer:
+            return
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        self.backlog += len(data)
+        future = self.loop.run_in_executor(_writer_pool(), self._write, data)
+        future.add_done_callback(lambda done: self._written(done, len(data)))
+
+    def _write(self, data: bytes):
+        # Runs on the writer thread; opening per flush keeps no descriptor per live call
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "ab") as file:
+            if file.tell() == 0:
+                file.write(MAGIC)
+            file.write(data)
+
+    def _written(self, future: asyncio.Future, size: int):
+        self.backlog -= size
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            if not self.failed:
+                print(f"❌ Call recording {self.path} failed: {future.exception()}")
+            self.failed = True
+            metrics.increment("recording_errors")
+        else:
+            metrics.increment("recording_bytes", size)
+
+    def _tick(self):
+        self.flush()
+        if not self.closed:
+            self.timer = self.loop.call_later(self.flush_interval, self._tick)
+
+    async def close(self):
+        """Write out what is buffered; returns once it is on disk"""
+        if self.closed:
+            return
+        self.timer.cancel()
+        self.flush()
+        self.closed = True
+        # The writer runs jobs in order, so this no-op finishes after the last append
+        await self.loop.run_in_executor(_writer_pool(), lambda: None)
+
+
+def open_call_recording(call_sid: str) -> Optional[CallRecorder]:
+    """Start recording a call when CALL_RECORDING is on"""
+    if not RECORDING_ENABLED:
+        return None
+    name = re.sub(r"[^A-Za-z0-9_.-]", "_", call_sid)
+    return CallRecorder(Path(RECORDING_DIR) / f"{name}.rec", call_sid)
+
+
+def read_recording(path) -> Iterator[Record]:
+    """Records of a recording file, in order; a tail cut short by a crash is skipped"""
+    data = Path(path).read_bytes()
+    if not data.startswith(MAGIC):
+        raise ValueError(f"{path} is not a call recording")
+    position = len(MAGIC)
+    while position + HEADER.size <= len(data):
+        kind, ticks, length = HEADER.unpack_from(data, position)
+        position += HEADER.size
+        if position + length > len(data):
+            break
+        yield Record(kind, ticks / TICKS_PER_SECOND, data[position:position + length])
+        position += length
+
+
+class _RecordingStream(httpx.AsyncByteStream):
+    """Passes a response body through, noting chunk timings (and text bodies) for the recording"""
+
+    def __init__(self, stream, recorder: CallRecorder, exchange: dict, started: float, keep_body: bool):
+        self.stream = stream
+        self.recorder = recorder
+        self.exchange = exchange
+        self.started = started
+        self.chunks: List[List] = []
+        self.body: Optional[List[bytes]] = [] if keep_body else None
+        self.size = 0
+        self.complete = False
+        self.recorded = False
+
+    async def __aiter__(self):
+        async for chunk in self.stream:
+            self.chunks.append([round(self.recorder.loop.time() - self.started, 4), len(chunk)])
+            if self.body is not None and self.size + len(chunk) <= BODY_LIMIT:
+                self.body.append(chunk)
+            self.size += len(chunk)
+            yield chunk
+        self.complete = True
+
+    async def aclose(self):
+        try:
+            await self.stream.aclose()
+        finally:
+            if not self.recorded:
+                self.recorded = True
+                self.exchange.update(duration=round(self.recorder.loop.time() - self.started, 4), bytes=self.size,
+                                     chunks=self.chunks, complete=self.complete)
+                if self.body is not None:
+                    self.exchange["body"] = b"".join(self.body).decode("utf-8", errors="replace")
+                self.recorder.provider(self.exchange)
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """Wraps a provider client's transport; requests made for a recorded call go into its recording"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, provider: str):
+        self.transport = transport
+        self.provider = provider
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        recorder = current_recording.get()
+        if recorder is None:
+            return await self.transport.handle_async_request(request)
+        content_type = request.headers.get("content-type", "")
+        # Multipart uploads are streams that can be read more than once; JSON bodies are already bytes
+        body = request.content if isinstance(request.stream, httpx.ByteStream) else \
+            b"".join([chunk async for chunk in request.stream])
+        exchange = {"provider": self.provider, "method": request.method, "path": request.url.path,
+                    "query": request.url.query.decode("ascii", errors="replace"),
+                    "fingerprint": body_fingerprint(body, content_type), "request_bytes": len(body)}
+        if content_type.startswith("application/json") and len(body) <= BODY_LIMIT:
+            exchange["request"] = body.decode("utf-8", errors="replace")
+        started = recorder.loop.time()
+        exchange["at"] = recorder.offset(started)
+        try:
+            response = await self.transport.handle_async_request(request)
+        except BaseException as e:
+            exchange.update(error=type(e).__name__, duration=round(recorder.loop.time() - started, 4))
+            recorder.provider(exchange)
+            raise
+        response_type = response.headers.get("content-type", "")
+        exchange.update(status=response.status_code, content_type=response_type,
+                        headers_after=round(recorder.loop.time() - started, 4))
+        keep_body = response_type.startswith(("application/json", "text/"))
+        response.stream = _RecordingStream(response.stream, recorder, exchange, started, keep_body)
+        return response
+
+    async def aclose(self):
+        await self.transport.aclose()
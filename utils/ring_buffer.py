@@ -0,0 +1,68 @@
+import binascii
+from typing import Union
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+
+class AudioRingBuffer:
+    """Fixed-capacity byte ring for one call's inbound audio.
+
+    Positions are absolute stream offsets, so VAD and the STT upload can refer
+    to an utterance as a (start, end) range instead of copying it out. Every
+    write is mirrored into a second copy of the ring, which makes any range of
+    up to `capacity` bytes available as one contiguous zero-copy memoryview.
+    Memory per call is fixed at 2 x capacity.
+    """
+
+    def __init__(self, capacity: int):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self._buffer = bytearray(2 * capacity)
+        self._view = memoryview(self._buffer)
+        self.write_position = 0
+
+    @property
+    def oldest_position(self) -> int:
+        """Oldest stream offset that has not been overwritten yet"""
+        return max(0, self.write_position - self.capacity)
+
+    def write(self, data: BytesLike) -> int:
+        """Append audio, returning the stream offset it was written at"""
+        if len(data) > self.capacity:
+            self.write_position += len(data) - self.capacity
+            data = memoryview(data)[-self.capacity:]
+
+        start = self.write_position
+        offset = start % self.capacity
+        if offset + len(data) <= self.capacity:
+            self._copy(offset, data)
+        else:
+            data = memoryview(data)
+            first = self.capacity - offset
+            self._copy(offset, data[:first])
+            self._copy(0, data[first:])
+        self.write_position += len(data)
+        return start
+
+    def _copy(self, offset: int, data: BytesLike):
+        # Same-length slice assignment copies in place without temporary objects
+        self._buffer[offset:offset + len(data)] = data
+        self._buffer[self.capacity + offset:self.capacity + offset + len(data)] = data
+
+    def write_base64(self, payload: Union[str, bytes]) -> int:
+        """Decode a base64 media payload and append it"""
+        # binascii has no decode-into API; the decoded frame is copied once into the ring
+        return self.write(binascii.a2b_base64(payload))
+
+    def holds(self, start: int) -> bool:
+        """Whether audio from `start` onwards is still in the ring"""
+        return start >= self.oldest_position
+
+    def view(self, start: int, end: int) -> memoryview:
+        """Zero-copy view of stream offsets [start, end)"""
+        if start < self.oldest_position or end > self.write_position or start > end:
+            raise IndexError(f"range [{start}, {end}) is not in the buffer "
+                             f"[{self.oldest_position}, {self.write_position})")
+        offset = start % self.capacity
+        return self._view[offset:offset + (end - start)]
@@ -0,0 +1,80 @@
+"""Pre-upload stage for batch STT: trim non-speech, skip noise-only utterances and encode compactly.
+
+An utterance from the VAD carries pre-roll and up to a hangover of silence,
+and callers' bumps and rustles sometimes pass the endpointer as a short
+"utterance" of their own. Before upload, the audio is cut to its outermost
+frames above the call's speech threshold (plus a little padding so word
+edges survive), and an utterance without one continuous voiced stretch of
+STT_MIN_SPEECH_MS is not sent at all.
+
+STT_UPLOAD_FORMAT picks the container: ``mulaw`` (default) wraps the
+original 8 kHz mu-law bytes in a WAV header, half the size of ``pcm``
+16-bit WAV and with no decoding; the provider transcodes either.
+"""
+import os
+from typing import Optional, Tuple, Union
+
+import numpy as np
+
+from utils.audio import FRAME_BYTES, FRAME_MS, mulaw_to_wav, mulaw_wav
+from utils.env_loader import load_env
+from utils.vad import frame_features
+
+load_env(override=True)
+
+UPLOAD_FORMATS = ("mulaw", "pcm")
+
+
+def speech_span(mulaw: Union[bytes, memoryview], threshold_db: float, zcr_max: float = 0.5,
+                min_speech_frames: int = 8, pad_frames: int = 5) -> Optional[Tuple[int, int]]:
+    """Byte range of `mulaw` worth transcribing, or None if it holds no run of voiced frames long enough"""
+    energy_db, zcr = frame_features(mulaw)
+    loud = energy_db > threshold_db
+    voiced = loud & (zcr < zcr_max)
+    # Longest run of consecutive voiced frames: clicks and bumps are loud but brief
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], voiced.astype(np.int8), [0]))))
+    if not len(edges) or (edges[1::2] - edges[::2]).max() < min_speech_frames:
+        return None
+    # Trim on energy alone, so quiet fricatives at the word edges stay in
+    loud_frames = np.flatnonzero(loud)
+    first = max(0, int(loud_frames[0]) - pad_frames)
+    last = min(len(loud), int(loud_frames[-1]) + 1 + pad_frames)
+    # A trailing partial frame goes with the end of the utterance
+    end = len(mulaw) if last == len(loud) else last * FRAME_BYTES
+    return first * FRAME_BYTES, end
+
+
+class STTUpload:
+    """Turns an utterance's mu-law audio into the WAV uploaded for batch STT"""
+
+    def __init__(self, trim: Optional[bool] = None, upload_format: Optional[str] = None,
+                 min_speech_ms: Optional[int] = None, pad_ms: Optional[int] = None, zcr_max: Optional[float] = None):
+        self.trim = trim if trim is not None else os.getenv("STT_TRIM_SILENCE", "true").lower() != "false"
+        self.upload_format = (upload_format or os.getenv("STT_UPLOAD_FORMAT", "mulaw")).lower()
+        if self.upload_format not in UPLOAD_FORMATS:
+            raise ValueError(f"Unknown STT_UPLOAD_FORMAT {self.upload_format!r}, "
+                             f"expected one of {', '.join(UPLOAD_FORMATS)}")
+        self.min_speech_frames = (min_speech_ms if min_speech_ms is not None
+                                  else int(os.getenv("STT_MIN_SPEECH_MS", "160"))) // FRAME_MS
+        self.pad_frames = (pad_ms if pad_ms is not None else int(os.getenv("STT_TRIM_PAD_MS", "100"))) // FRAME_MS
+        self.zcr_max = zcr_max if zcr_max is not None else float(os.getenv("VAD_ZCR_MAX", "0.5"))
+
+    def prepare(self, mulaw: Union[bytes, memoryview], threshold_db: float) -> Optional[bytes]:
+        """WAV to upload, or None when the utterance is only noise; runs on the audio executor"""
+        if self.trim:
+            span = speech_span(mulaw, threshold_db, self.zcr_max, self.min_speech_frames, self.pad_frames)
+            if span is None:
+                return None
+            mulaw = mulaw[span[0]:span[1]]
+        return mulaw_wav(mulaw) if self.upload_format == "mulaw" else mulaw_to_wav(mulaw)
+
+
+_upload: Optional[STTUpload] = None
+
+
+def get_stt_upload() -> STTUpload:
+    """Return the process-wide pre-upload stage, configured from the STT_* settings on first use"""
+    global _upload
+    if _upload is None:
+        _upload = STTUpload()
+    return _upload
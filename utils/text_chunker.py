@@ -0,0 +1,46 @@
+import re
+from typing import List
+
+# Sentence ends need the following whitespace, so "3.5" or "e.g." mid-token never splits
+SENTENCE_END = re.compile(r"[.!?…]+[\"')\]]*\s+")
+CLAUSE_END = re.compile(r"[,;:—]\s+")
+
+
+class SentenceChunker:
+    """Split streamed LLM tokens into sentences (or long clauses) ready for TTS.
+
+    Clauses are only cut once `min_clause_chars` have accumulated, so the first
+    chunk reaches TTS early without producing choppy one-word fragments.
+    """
+
+    def __init__(self, min_clause_chars: int = 40, min_sentence_chars: int = 8):
+        self.min_clause_chars = min_clause_chars
+        self.min_sentence_chars = min_sentence_chars
+        self.buffer = ""
+
+    def push(self, token: str) -> List[str]:
+        """Add a token and return any chunks it completed"""
+        self.buffer += token
+        chunks = []
+        while True:
+            cut = self._find_cut()
+            if cut is None:
+                return chunks
+            chunk, self.buffer = self.buffer[:cut].strip(), self.buffer[cut:]
+            if chunk:
+                chunks.append(chunk)
+
+    def _find_cut(self):
+        for match in SENTENCE_END.finditer(self.buffer):
+            if match.end() >= self.min_sentence_chars:
+                return match.end()
+        if len(self.buffer) >= self.min_clause_chars:
+            matches = list(CLAUSE_END.finditer(self.buffer))
+            if matches:
+                return matches[-1].end()
+        return None
+
+    def flush(self) -> str:
+        """Return whatever text is left once the stream ends"""
+        chunk, self.buffer = self.buffer.strip(), ""
+        return chunk
@@ -0,0 +1,158 @@
+import os
+from typing import List, Optional, Tuple, Union
+
+import numpy as np
+
+from utils.audio import FRAME_BYTES, FRAME_MS, MULAW_TO_PCM16
+
+MULAW_TO_FLOAT32 = MULAW_TO_PCM16.astype(np.float32)
+
+SPEECH_START = "speech_start"
+SPEECH_PAUSE = "speech_pause"
+UTTERANCE = "utterance"
+
+
+def frame_features(mulaw: Union[bytes, memoryview], frame_bytes: int = FRAME_BYTES) -> Tuple[np.ndarray, np.ndarray]:
+    """Return per-frame energy (dBFS) and zero-crossing rate for whole frames of mu-law audio"""
+    frame_count = len(mulaw) // frame_bytes
+    codes = np.frombuffer(mulaw, dtype=np.uint8, count=frame_count * frame_bytes).reshape(frame_count, frame_bytes)
+    frames = MULAW_TO_FLOAT32[codes]
+
+    power = np.einsum("ij,ij->i", frames, frames) / (frame_bytes * 32768.0 * 32768.0)
+    energy_db = 10.0 * np.log10(power + 1e-10)
+
+    # The mu-law sign bit is the sample sign, so crossings come straight from the codes
+    signs = codes >= 0x80
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (frame_bytes - 1)
+    return energy_db, zcr
+
+
+class VoiceActivityDetector:
+    """Energy / zero-crossing endpointer that turns a stream of frames into utterances.
+
+    Speech starts after `speech_start_ms` of consecutive voiced frames and ends
+    after `hangover_ms` of silence; utterances longer than `max_utterance_ms`
+    are cut so STT latency stays bounded. A shorter `pause_ms` of silence
+    reports the speech so far, so work can start before the turn is over. The energy threshold follows the
+    background noise floor so a noisy line does not count as permanent speech.
+
+    The detector holds no audio: it tracks absolute stream offsets and reports
+    utterances as (start, end) byte ranges into the caller's buffer.
+    """
+
+    def __init__(self,
+                 energy_threshold_db: Optional[float] = None,
+                 snr_margin_db: Optional[float] = None,
+                 zcr_max: Optional[float] = None,
+                 speech_start_ms: Optional[int] = None,
+                 hangover_ms: Optional[int] = None,
+                 max_utterance_ms: Optional[int] = None,
+                 min_utterance_ms: Optional[int] = None,
+                 pre_roll_ms: Optional[int] = None,
+                 pause_ms: Optional[int] = None):
+        def setting(value, env_name, default, cast=int):
+            if value is not None:
+                return value
+            return cast(os.getenv(env_name, default))
+
+        self.energy_threshold_db = setting(energy_threshold_db, "VAD_ENERGY_THRESHOLD_DB", "-42", float)
+        self.snr_margin_db = setting(snr_margin_db, "VAD_SNR_MARGIN_DB", "10", float)
+        self.zcr_max = setting(zcr_max, "VAD_ZCR_MAX", "0.5", float)
+        self.speech_start_frames = max(1, setting(speech_start_ms, "VAD_SPEECH_START_MS", "60") // FRAME_MS)
+        self.hangover_frames = max(1, setting(hangover_ms, "VAD_HANGOVER_MS", "700") // FRAME_MS)
+        self.max_utterance_frames = setting(max_utterance_ms, "VAD_MAX_UTTERANCE_MS", "15000") // FRAME_MS
+        self.min_utterance_frames = setting(min_utterance_ms, "VAD_MIN_UTTERANCE_MS", "200") // FRAME_MS
+        self.pre_roll_bytes = setting(pre_roll_ms, "VAD_PRE_ROLL_MS", "200") // FRAME_MS * FRAME_BYTES
+        self.pause_frames = max(1, setting(pause_ms, "VAD_PAUSE_MS", "300") // FRAME_MS)
+
+        self.noise_floor_db = -70.0
+        self.in_speech = False
+        # Stream offset of the next frame to classify
+        self.position = 0
+        self._utterance_start = 0
+        self._last_end = 0
+        self._voiced_run = 0
+        self._silent_run = 0
+        self._voiced_frames = 0
+
+    def speech_threshold_db(self) -> float:
+        """Energy above which a frame may be speech, following the line's noise floor"""
+        return max(self.energy_threshold_db, self.noise_floor_db + self.snr_margin_db)
+
+    def classify(self, energy_db: np.ndarray, zcr: np.ndarray) -> np.ndarray:
+        """Vectorized per-frame speech decision"""
+        threshold = self.speech_threshold_db()
+        loud = energy_db > threshold
+        # High zero-crossing frames near the threshold are hiss, not voicing
+        return loud & ((zcr < self.zcr_max) | (energy_db > threshold + self.snr_margin_db))
+
+    def feed(self, audio: Union[bytes, memoryview]) -> List[Tuple[str, Optional[Tuple[int, int]]]]:
+        """Classify the whole frames of `audio`, which must begin at `self.position`.
+
+        Returns (SPEECH_START, None), (SPEECH_PAUSE, (start, end)) and
+        (UTTERANCE, (start, end)) events; a trailing partial frame is left for
+        the next call.
+        """
+        usable = len(audio) - len(audio) % FRAME_BYTES
+        if not usable:
+            return []
+
+        energy_db, zcr = frame_features(audio[:usable])
+        voiced = self.classify(energy_db, zcr)
+
+        events: List[Tuple[str, Optional[Tuple[int, int]]]] = []
+        for index in range(len(voiced)):
+            self.position += FRAME_BYTES
+            if self.in_speech:
+                self._speech_frame(bool(voiced[index]), events)
+            else:
+                self._idle_frame(bool(voiced[index]), float(energy_db[index]), events)
+        return events
+
+    def _idle_frame(self, voiced: bool, energy_db: float, events: list):
+        if not voiced:
+            self._voiced_run = 0
+            # Track the background level only while nobody is talking
+            self.noise_floor_db = 0.95 * self.noise_floor_db + 0.05 * energy_db
+            return
+
+        self._voiced_run += 1
+        if self._voiced_run >= self.speech_start_frames:
+            self.in_speech = True
+            onset = self.position - self._voiced_run * FRAME_BYTES
+            self._utterance_start = max(self._last_end, onset - self.pre_roll_bytes)
+            self._voiced_frames = self._voiced_run
+            self._silent_run = 0
+            events.append((SPEECH_START, None))
+
+    def _speech_frame(self, voiced: bool, events: list):
+        if voiced:
+            self._voiced_frames += 1
+            self._silent_run = 0
+        else:
+            self._silent_run += 1
+
+        if self._silent_run == self.pause_frames < self.hangover_frames and \
+                self._voiced_frames >= self.min_utterance_frames:
+            events.append((SPEECH_PAUSE, (self._utterance_start, self.position)))
+        if self._silent_run >= self.hangover_frames:
+            self._emit(events)
+            self.in_speech = False
+            self._voiced_run = 0
+        elif self.position - self._utterance_start >= self.max_utterance_frames * FRAME_BYTES:
+            self._emit(events)
+
+    def _emit(self, events: list):
+        if self._voiced_frames >= self.min_utterance_frames:
+            events.append((UTTERANCE, (self._utterance_start, self.position)))
+        self._utterance_start = self._last_end = self.position
+        self._voiced_frames = 0
+        self._silent_run = 0
+
+    def flush(self) -> Optional[Tuple[int, int]]:
+        """Return the range of any in-progress utterance, e.g. when the call stops"""
+        events: list = []
+        if self.in_speech:
+            self._emit(events)
+            self.in_speech = False
+        return events[0][1] if events else None